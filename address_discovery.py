@@ -0,0 +1,191 @@
+"""
+اكتشاف عنوان الاتصال الخارجي
+يحدد العنوان مرة واحدة عند البدء من واجهات الشبكة المحلية (بدون أي اتصال شبكي)، ويخزنه مع مدة صلاحية ويحدثه في الخلفية؛ الاستعلام العام (ipify) يتم في الخلفية فقط عند عدم وجود عنوان عام محلي
+"""
+
+import os
+import socket
+import ipaddress
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# مدة صلاحية العنوان المخزن بالثواني
+ADDRESS_TTL = float(os.environ.get("VNC_ADDRESS_TTL", "600"))
+
+# عنوان ثابت يتجاوز الاكتشاف (مثلاً اسم النطاق المنشور)
+PUBLIC_ADDRESS = os.environ.get("VNC_PUBLIC_ADDRESS", "")
+
+# الاستعلام عن العنوان العام عبر الإنترنت في الخلفية (0 لتعطيله)
+PUBLIC_LOOKUP = os.environ.get("VNC_PUBLIC_LOOKUP", "1") == "1"
+PUBLIC_LOOKUP_URL = os.environ.get("VNC_PUBLIC_LOOKUP_URL", "https://api.ipify.org?format=text")
+
+def _classify(address):
+    """تصنيف عنوان IPv4: public أو private أو None للعناوين غير الصالحة للاتصال"""
+    try:
+        ip = ipaddress.IPv4Address(address)
+    except ValueError:
+        return None
+    if ip.is_loopback or ip.is_link_local or ip.is_unspecified or ip.is_multicast:
+        return None
+    return 'private' if ip.is_private else 'public'
+
+def local_addresses():
+    """عناوين IPv4 للواجهات المحلية مرتبة: العامة أولاً ثم الخاصة"""
+    candidates = []
+    try:
+        import psutil
+        stats = psutil.net_if_stats()
+        for name, addresses in psutil.net_if_addrs().items():
+            if name in stats and not stats[name].isup:
+                continue
+            for address in addresses:
+                if address.family == socket.AF_INET:
+                    candidates.append(address.address)
+    except Exception as e:
+        logger.debug(f"تعذر تعداد الواجهات عبر psutil: {e}")
+
+    if not candidates:
+        try:
+            import netifaces
+            for name in netifaces.interfaces():
+                for address in netifaces.ifaddresses(name).get(netifaces.AF_INET, []):
+                    candidates.append(address['addr'])
+        except Exception:
+            pass
+
+    ranked = []
+    for address in dict.fromkeys(candidates):
+        kind = _classify(address)
+        if kind:
+            ranked.append((kind != 'public', address, kind))
+    return [(address, kind) for _, address, kind in sorted(ranked)]
+
+def route_address():
+    """عنوان الواجهة التي يمر عبرها المسار الافتراضي (connect على UDP لا يرسل أي حزمة)"""
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.connect(("8.8.8.8", 80))
+            return sock.getsockname()[0]
+    except OSError:
+        return None
+
+def lookup_public_address(timeout=5):
+    """استعلام العنوان العام عبر الإنترنت (للخيط الخلفي فقط)"""
+    import urllib.request
+    with urllib.request.urlopen(PUBLIC_LOOKUP_URL, timeout=timeout) as response:
+        address = response.read().decode().strip()
+    return address if _classify(address) == 'public' else None
+
+class AddressDiscovery:
+    """عنوان الاتصال المخزن: القراءة فورية دائماً والتحديث في الخلفية"""
+
+    def __init__(self, ttl=ADDRESS_TTL):
+        self.ttl = ttl
+        self.address = None
+        self.source = None
+        self.updated_at = 0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def start(self):
+        """التحديد الأولي من الواجهات المحلية ثم استكمال البحث في الخلفية"""
+        with self._lock:
+            if self.updated_at:
+                return self
+        address, source, _ = self._resolve_local()
+        if address:
+            self._set(address, source)
+        self._refresh_async()
+        return self
+
+    def get(self):
+        """العنوان الحالي دون أي اتصال شبكي (يُجدول تحديثاً خلفياً إن انتهت صلاحيته)"""
+        if not self.updated_at:
+            self.start()
+        elif time.monotonic() - self.updated_at > self.ttl:
+            self._refresh_async()
+        return self.address
+
+    def info(self):
+        """العنوان ومصدره وعمره"""
+        with self._lock:
+            return {
+                'address': self.address,
+                'source': self.source,
+                'age_seconds': round(time.monotonic() - self.updated_at, 1) if self.updated_at else None
+            }
+
+    def _set(self, address, source):
+        with self._lock:
+            changed = address != self.address
+            self.address = address
+            self.source = source
+            self.updated_at = time.monotonic()
+        if changed:
+            logger.info(f"🌐 عنوان الاتصال: {address} ({source})")
+
+    def _resolve_local(self):
+        """تحديد العنوان بدون اتصال شبكي: متغير البيئة ثم الواجهات ثم المسار الافتراضي
+        يعيد (العنوان، المصدر، هل هو عام) دون تعديل الحالة"""
+        if PUBLIC_ADDRESS:
+            return PUBLIC_ADDRESS, 'env', True
+
+        addresses = local_addresses()
+        if addresses and addresses[0][1] == 'public':
+            return addresses[0][0], 'interface', True
+
+        # عنوان خاص: نفضل عنوان المسار الافتراضي إن كان بين الواجهات
+        routed = route_address()
+        private = [address for address, _ in addresses]
+        if routed and (routed in private or not private):
+            return routed, 'route', False
+        if private:
+            return private[0], 'interface', False
+        return None, None, False
+
+    def _refresh_async(self):
+        """تحديث خلفي واحد في كل مرة"""
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh, daemon=True, name="address-discovery").start()
+
+    def _refresh(self):
+        """حساب العنوان كاملاً ثم تعيينه مرة واحدة، فلا يظهر العنوان الخاص مؤقتاً بين عنوانين عامين"""
+        try:
+            address, source, is_public = self._resolve_local()
+            if not is_public and PUBLIC_LOOKUP:
+                try:
+                    looked_up = lookup_public_address()
+                except Exception as e:
+                    looked_up = None
+                    logger.debug(f"تعذر الاستعلام عن العنوان العام: {e}")
+                if looked_up:
+                    address, source = looked_up, 'lookup'
+                else:
+                    # فشل الاستعلام: نبقي نتيجة الاستعلام السابقة بدل الرجوع للعنوان الخاص
+                    with self._lock:
+                        if self.source == 'lookup':
+                            address, source = self.address, self.source
+            if address:
+                self._set(address, source)
+        except Exception as e:
+            logger.error(f"خطأ في اكتشاف العنوان: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+                self.updated_at = time.monotonic()
+
+# المتغير العام - سيتم تهيئته عند الحاجة
+address_discovery = None
+
+def get_address_discovery():
+    """الحصول على خدمة اكتشاف العنوان المشتركة"""
+    global address_discovery
+    if address_discovery is None:
+        address_discovery = AddressDiscovery()
+    return address_discovery
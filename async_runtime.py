@@ -0,0 +1,77 @@
+"""
+بيئة التشغيل غير المتزامنة
+اختيار نمط gevent/eventlet وتفعيل monkey patching، وتنفيذ الاستدعاءات الحاجزة (psutil، SQLite) في مجمع خيوط حقيقي حتى لا تتوقف حلقة الأحداث
+"""
+
+import os
+import sys
+import logging
+from importlib.util import find_spec
+
+logger = logging.getLogger(__name__)
+
+# النمط المطلوب: auto أو gevent أو eventlet أو threading
+ASYNC_MODE = os.environ.get("VNC_ASYNC_MODE", "auto")
+
+SUPPORTED_MODES = ("gevent", "eventlet", "threading")
+
+def detect_async_mode(requested=None):
+    """اختيار أفضل نمط متاح على هذا المضيف"""
+    requested = requested or ASYNC_MODE
+    if requested != "auto":
+        if requested not in SUPPORTED_MODES:
+            raise ValueError(f"نمط غير مدعوم: {requested}")
+        return requested
+    for mode in ("gevent", "eventlet"):
+        if find_spec(mode) is not None:
+            return mode
+    return "threading"
+
+def patch_runtime(mode):
+    """تفعيل monkey patching (يجب استدعاؤها قبل استيراد Flask والتطبيق)"""
+    if mode == "gevent":
+        from gevent import monkey
+        monkey.patch_all()
+    elif mode == "eventlet":
+        import eventlet
+        eventlet.monkey_patch()
+    logger.info(f"⚙️ نمط التشغيل: {mode}")
+    return mode
+
+def active_async_mode():
+    """النمط المفعل فعلياً في هذه العملية (يشمل عمال gunicorn من نوع gevent/eventlet)"""
+    if "gevent" in sys.modules:
+        from gevent import monkey
+        if monkey.is_module_patched("socket"):
+            return "gevent"
+    if "eventlet" in sys.modules:
+        from eventlet import patcher
+        if patcher.is_monkey_patched("socket"):
+            return "eventlet"
+    return "threading"
+
+def run_blocking(func, *args, **kwargs):
+    """تنفيذ استدعاء حاجز خارج حلقة الأحداث وانتظار نتيجته تعاونياً"""
+    mode = active_async_mode()
+    if mode == "gevent":
+        import gevent
+        return gevent.get_hub().threadpool.apply(func, args, kwargs)
+    if mode == "eventlet":
+        from eventlet import tpool
+        return tpool.execute(func, *args, **kwargs)
+    return func(*args, **kwargs)
+
+def serve_app(app, host="0.0.0.0", port=5000, socketio=None):
+    """تشغيل تطبيق Flask بخادم يناسب النمط المفعل بدلاً من خادم التطوير"""
+    mode = active_async_mode()
+    if socketio is not None:
+        socketio.run(app, host=host, port=port, allow_unsafe_werkzeug=mode == "threading")
+    elif mode == "gevent":
+        from gevent.pywsgi import WSGIServer
+        WSGIServer((host, port), app, log=None).serve_forever()
+    elif mode == "eventlet":
+        import eventlet
+        from eventlet import wsgi
+        wsgi.server(eventlet.listen((host, port)), app, log_output=False)
+    else:
+        app.run(host=host, port=port, debug=False, threaded=True)
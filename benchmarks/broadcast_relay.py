@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Broadcast Relay Benchmark - ثبات تكلفة المصدر مع زيادة المشاهدين
+يشغل مصدراً اصطناعياً وشجرة مرحلات محلية (كل مرحل عملية مستقلة) ثم مراحل بأعداد مشاهدين متزايدة موزعين على المرحلات الطرفية،
+بعضهم بطيء بمعدل قراءة محدود، ويقيس: معالج المصدر وعرضه النطاقي في كل مرحلة (يجب أن يبقيا ثابتين)، وصول كل الفروقات
+للمشاهدين السريعين مع تطابق CRC للإطارات المفكوكة، وانتقال البطيئين إلى الإطارات المفتاحية فقط
+
+الاستخدام:
+    python benchmarks/broadcast_relay.py
+    python benchmarks/broadcast_relay.py --viewers 20,100,400 --fanout 2,2 --seconds 10
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+SCRIPT = str(ROOT / "broadcast_relay.py")
+
+class Node:
+    """عملية من الشجرة مع آخر سطر إحصاءات JSON كتبته"""
+
+    def __init__(self, *args, env=None):
+        self.process = subprocess.Popen([sys.executable, SCRIPT, *args], cwd=ROOT, env=env,
+                                        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        self.port = None
+        self.stats = None
+        self._ready = threading.Event()
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self):
+        for line in self.process.stdout:
+            message = json.loads(line)
+            if 'listening' in message:
+                self.port = message['listening']
+                self._ready.set()
+            else:
+                self.stats = message
+
+    def address(self):
+        if not self._ready.wait(10):
+            raise RuntimeError("لم تبدأ العقدة الاستماع")
+        return f"127.0.0.1:{self.port}"
+
+    def wait_stats(self, timeout=10):
+        """انتظار سطر إحصاءات جديد"""
+        previous = self.stats
+        deadline = time.monotonic() + timeout
+        while self.stats is previous and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return self.stats
+
+    def stop(self):
+        self.process.kill()
+        self.process.wait()
+
+def build_tree(source, fanout, env):
+    """مرحلات بمستويات: fanout=(2, 2) يعني مرحلين تحت المصدر وتحت كل منهما مرحلان"""
+    level = [source]
+    relays = []
+    for width in fanout:
+        children = []
+        for parent in level:
+            for _ in range(width):
+                children.append(Node("relay", "--upstream", parent.address(), "--port", "0",
+                                     "--host", "127.0.0.1", "--stats-interval", "1", env=env))
+        relays += children
+        level = children
+    return relays, level
+
+def run_phase(source, leaves, count, slow, args, env):
+    viewers = []
+    for i, leaf in enumerate(leaves):
+        share = count // len(leaves) + (i < count % len(leaves))
+        slow_share = slow // len(leaves) + (i < slow % len(leaves))
+        viewers.append(Node("viewers", "--upstream", leaf.address(), "--count", str(share),
+                            "--slow", str(slow_share), "--slow-rate", str(args.slow_rate),
+                            "--decode", "1", "--stats-interval", "1", env=env))
+    demoted = sum(leaf.wait_stats()['demotions'] for leaf in leaves)
+    # انتظار انضمام الجميع ثم القياس على نافذة ثابتة
+    time.sleep(args.warmup)
+    before = source.wait_stats()
+    started = time.monotonic()
+    time.sleep(args.seconds)
+    after = source.wait_stats()
+    elapsed = time.monotonic() - started
+    demotions = sum(leaf.wait_stats()['demotions'] for leaf in leaves) - demoted
+    totals = [v.wait_stats() for v in viewers]
+    for viewer in viewers:
+        viewer.stop()
+    return {
+        'viewers': count,
+        'slow_viewers': slow,
+        'source_cpu_percent': round((after['cpu_s'] - before['cpu_s']) / elapsed * 100, 2),
+        'source_kbps': round((after['bytes_out'] - before['bytes_out']) / elapsed / 1024, 1),
+        'source_downstream': after['downstream'],
+        'connected': sum(t['viewers'] for t in totals),
+        'fast_deltas': sum(t['fast']['deltas'] for t in totals),
+        'fast_skipped': sum(t['fast']['skipped'] for t in totals),
+        'fast_latency_median_ms': max(t['fast']['latency_median_ms'] or 0 for t in totals),
+        'slow_keyframes': sum(t['slow']['keyframes'] for t in totals),
+        'slow_skipped': sum(t['slow']['skipped'] for t in totals),
+        'leaf_demotions': demotions,
+        'decoded': sum(t['decoded'] for t in totals),
+        'checksum_errors': sum(t['checksum_errors'] for t in totals),
+    }
+
+def main():
+    """البرنامج الرئيسي"""
+    parser = argparse.ArgumentParser(description="قياس شجرة مرحلات البث")
+    parser.add_argument("--size", default="1280x720")
+    parser.add_argument("--fps", type=float, default=15)
+    parser.add_argument("--viewers", default="20,100,300")
+    parser.add_argument("--slow-percent", type=float, default=3)
+    parser.add_argument("--slow-rate", type=float, default=8 * 1024, help="بايت/ث للمشاهد البطيء")
+    parser.add_argument("--fanout", default="2,2", help="عدد المرحلات تحت كل عقدة في كل مستوى")
+    parser.add_argument("--queue-kb", type=int, default=256)
+    parser.add_argument("--seconds", type=float, default=8)
+    parser.add_argument("--warmup", type=float, default=3)
+    parser.add_argument("--max-growth", type=float, default=1.5, help="أقصى نسبة لتكلفة المصدر بين أكبر وأصغر مرحلة")
+    args = parser.parse_args()
+
+    key_file = tempfile.NamedTemporaryFile(prefix="broadcast-key-")
+    key_file.write(os.urandom(16))
+    key_file.flush()
+    env = dict(os.environ, VNC_RELAY_QUEUE_KB=str(args.queue_kb), VNC_RELAY_RECOVER_AFTER="30",
+               VNC_BROADCAST_KEY_FILE=key_file.name)
+    source = Node("source", "--synthetic", args.size, "--fps", str(args.fps), "--checksum",
+                  "--port", "0", "--host", "127.0.0.1", "--stats-interval", "1", env=env)
+    relays = []
+    phases = []
+    try:
+        relays, leaves = build_tree(source, [int(n) for n in args.fanout.split(",")], env)
+        for count in (int(n) for n in args.viewers.split(",")):
+            slow = max(1, round(count * args.slow_percent / 100))
+            phases.append(run_phase(source, leaves, count, slow, args, env))
+            print(json.dumps(phases[-1], ensure_ascii=False), file=sys.stderr)
+    finally:
+        for node in relays + [source]:
+            node.stop()
+
+    results = {'size': args.size, 'fps': args.fps, 'relays': len(relays), 'leaves': len(leaves), 'phases': phases}
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+    failed = []
+    # هامش نقطة مئوية واحدة للمعالج لأن القيم صغيرة وتتأثر بالجدولة
+    cpu = [p['source_cpu_percent'] for p in phases]
+    if max(cpu) > min(cpu) * args.max_growth + 1:
+        failed.append(f"معالج المصدر نما مع المشاهدين: {cpu}")
+    kbps = [p['source_kbps'] for p in phases]
+    if max(kbps) > min(kbps) * args.max_growth:
+        failed.append(f"عرض المصدر النطاقي نما مع المشاهدين: {kbps}")
+    for phase in phases:
+        if phase['connected'] != phase['viewers']:
+            failed.append(f"اتصل {phase['connected']} من {phase['viewers']} مشاهد")
+        if phase['fast_skipped'] or phase['checksum_errors']:
+            failed.append(f"فاتت فروقات أو فشل CRC لمشاهدين سريعين عند {phase['viewers']} مشاهد")
+        if not phase['leaf_demotions']:
+            failed.append(f"لم ينتقل أي مشاهد بطيء للإطارات المفتاحية عند {phase['viewers']} مشاهد")
+    for message in failed:
+        print(f"❌ {message}", file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
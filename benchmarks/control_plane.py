@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Control Plane Benchmark - قياس أداء المستوى التحكمي بدون X
+يستبدل Xvfb وx11vnc وتطبيقات سطح المكتب ببدائل محلية (benchmarks/fakes/fake_x.py) ويقيس:
+    زمن وإنتاجية مسارات الحالة، البدء البارد للحزمة، إعادة التشغيل بعد الانهيار،
+    إنتاجية كتابة السجلات، توزيع Socket.IO على N عميل، زمن ترميز لقطة الشاشة،
+    واستهلاك مسار الالتقاط للمعالج عند الخمول وزمن وصول التغيير
+ثم يقارن النتائج بخط أساس محفوظ ويفشل عند التراجع
+
+الاستخدام:
+    python benchmarks/control_plane.py
+    python benchmarks/control_plane.py --quick --output results.json
+    python benchmarks/control_plane.py --save-baseline          # تحديث benchmarks/baseline.json
+    python benchmarks/control_plane.py --only status --only fanout --tolerance 0.3
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import platform
+import argparse
+import tempfile
+import statistics
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+FAKE_X = Path(__file__).resolve().parent / "fakes" / "fake_x.py"
+BASELINE_FILE = Path(__file__).resolve().parent / "baseline.json"
+
+# البرامج التي تُستبدل بالبدائل المحلية
+FAKE_PROGRAMS = ('Xvfb', 'x11vnc', 'openbox', 'xterm', 'firefox-esr', 'firefox',
+                 'chromium', 'chromium-browser', 'xsetroot', 'pcmanfm', 'lxterminal')
+
+SCENARIOS = ('status', 'cold_start', 'restart', 'logs', 'fanout', 'screenshot', 'capture')
+
+# المقاييس التي تكون القيمة الأعلى فيها أفضل
+HIGHER_IS_BETTER = ('rps', 'per_sec')
+
+def setup_environment(workdir):
+    """بيئة معزولة: البدائل أولاً في PATH، وقاعدة بيانات ومجلدات جلسات مؤقتة"""
+    bin_dir = workdir / "bin"
+    bin_dir.mkdir()
+    for program in FAKE_PROGRAMS:
+        (bin_dir / program).symlink_to(FAKE_X)
+    home = workdir / "home"
+    home.mkdir()
+
+    os.environ.update({
+        'PATH': f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}",
+        'HOME': str(home),
+        'DATABASE_URL': f"sqlite:///{workdir}/bench.db",
+        'VNC_SESSIONS_DIR': str(workdir / "sessions"),
+        'VNC_BUS_DIR': str(workdir / "bus"),
+        'VNC_FRAMEBUFFER_DIR': str(workdir / "fb"),
+        'VNC_POOL_BASE_DISPLAY': os.environ.get('VNC_POOL_BASE_DISPLAY', '90'),
+        'VNC_POOL_WARM': '0',
+        'VNC_STATUS_INTERVAL': '3600',
+        'VNC_PUBLIC_LOOKUP': '0',
+        'SOCKETIO_MESSAGE_QUEUE': '',
+    })
+    sys.path.insert(0, str(ROOT))
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def free_display(start=90):
+    number = start
+    while Path(f"/tmp/.X11-unix/X{number}").exists() or Path(f"/tmp/.X{number}-lock").exists():
+        number += 1
+    return f":{number}"
+
+def percentile(samples, pct):
+    values = sorted(samples)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+def latency_summary(samples):
+    """ملخص بالملي ثانية مع الإنتاجية التسلسلية"""
+    return {
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+        'rps': round(len(samples) / sum(samples), 1) if sum(samples) else None
+    }
+
+def timed_calls(func, count, warmup=5):
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(count):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+# ---- السيناريوهات ----
+
+def bench_status(app, sizes):
+    """زمن وإنتاجية مسارات الحالة"""
+    client = app.test_client()
+    results = {}
+    for path in ('/api/status', '/api/status/changes', '/api/vnc/status', '/api/real-vnc/status'):
+        def request_status():
+            response = client.get(path)
+            assert response.status_code == 200, f"{path}: {response.status_code}"
+        results[path] = latency_summary(timed_calls(request_status, sizes['requests']))
+    return results
+
+def bench_cold_start(app, sizes):
+    """البدء البارد لحزمة vnc_native وحزمة multi_vnc_manager بالبدائل المحلية"""
+    from vnc_native import VNCManager
+    from multi_vnc_manager import MultiVNCManager
+
+    native, multi = [], []
+    for _ in range(sizes['starts']):
+        vnc = VNCManager(display=free_display(), vnc_port=free_port())
+        started = time.perf_counter()
+        ok = vnc.start_all()
+        native.append(time.perf_counter() - started)
+        vnc.stop_all(grace_period=1)
+        assert ok, "فشل بدء vnc_native"
+
+        manager = MultiVNCManager(display=free_display())
+        for config in manager.vnc_configs.values():
+            config['port'] = free_port()
+        started = time.perf_counter()
+        ok = (manager.setup_vnc_password() and manager.start_xvfb()
+              and manager.start_desktop_applications() and manager.start_all_vnc_servers())
+        multi.append(time.perf_counter() - started)
+        manager.stop_all(grace_period=1)
+        assert ok, "فشل بدء multi_vnc_manager"
+
+    return {
+        'vnc_native': {'median_ms': round(statistics.median(native) * 1000, 1)},
+        'multi_vnc': {'median_ms': round(statistics.median(multi) * 1000, 1)}
+    }
+
+def bench_restart(app, sizes):
+    """زمن إعادة تشغيل x11vnc بعد انهياره حتى يعود المنفذ"""
+    from vnc_native import VNCManager
+
+    vnc = VNCManager(display=free_display(), vnc_port=free_port())
+    assert vnc.start_xvfb() and vnc.start_x11vnc(), "فشل بدء الحزمة"
+    samples = []
+    try:
+        for _ in range(sizes['starts']):
+            vnc.x11vnc_process.send_signal(signal.SIGKILL)
+            vnc.x11vnc_process.wait()
+            started = time.perf_counter()
+            assert vnc.start_x11vnc(), "فشلت إعادة التشغيل"
+            samples.append(time.perf_counter() - started)
+    finally:
+        vnc.stop_all(grace_period=1)
+    return {'x11vnc': {'median_ms': round(statistics.median(samples) * 1000, 1)}}
+
+def bench_logs(app, sizes):
+    """إنتاجية كتابة السجلات في قاعدة البيانات"""
+    from models import SystemLog
+
+    with app.app_context():
+        started = time.perf_counter()
+        for i in range(sizes['logs']):
+            SystemLog.log('INFO', 'benchmark', f"سجل قياس {i}", component='benchmark')
+        elapsed = time.perf_counter() - started
+    return {'system_log': {'writes_per_sec': round(sizes['logs'] / elapsed, 1)}}
+
+def bench_fanout(app, sizes):
+    """زمن توزيع حدث على غرفة الحالة مع N عميل"""
+    from flask_app import socketio
+    from status_broadcaster import STATUS_ROOM
+
+    clients = [socketio.test_client(app) for _ in range(sizes['clients'])]
+    try:
+        for client in clients:
+            client.get_received()
+        payload = {'from': 1, 'version': 2, 'ops': [
+            {'op': 'replace', 'path': '/system_info/performance/cpu_percent', 'value': 12.5},
+            {'op': 'replace', 'path': '/system_info/performance/memory_percent', 'value': 48.1}
+        ]}
+        samples = timed_calls(lambda: socketio.emit('benchmark_fanout', payload, to=STATUS_ROOM),
+                              sizes['emits'], warmup=0)
+        delivered = sum(1 for client in clients for packet in client.get_received()
+                        if packet['name'] == 'benchmark_fanout')
+    finally:
+        for client in clients:
+            client.disconnect()
+
+    expected = sizes['clients'] * sizes['emits']
+    assert delivered == expected, f"وصل {delivered} من {expected}"
+    return {f"clients_{sizes['clients']}": {
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'deliveries_per_sec': round(delivered / sum(samples), 1)
+    }}
+
+def bench_screenshot(app, sizes):
+    """زمن إنشاء وترميز لقطة الشاشة"""
+    client = app.test_client()
+
+    def screenshot():
+        response = client.get('/api/vnc/screenshot')
+        assert response.status_code == 200
+
+    return {'png': latency_summary(timed_calls(screenshot, sizes['screenshots'], warmup=1))}
+
+def bench_capture(app, sizes):
+    """مسار الالتقاط: المعالج عند الخمول وزمن ظهور منطقة متغيرة في الإطار"""
+    import mmap
+    import psutil
+    from performance_profiles import PROFILES, xvfb_flags
+    from process_groups import ProcessGroup, wait_for_display
+    from screen_capture import CaptureStage
+
+    results = {}
+    process = psutil.Process()
+    for profile in PROFILES:
+        display = free_display()
+        group = ProcessGroup(f"bench-capture:{display}")
+        xvfb = group.spawn(["Xvfb", display, "-screen", "0", "1024x768x24", *xvfb_flags(display)])
+        try:
+            assert wait_for_display(display, timeout=10, process=xvfb), "لم يبدأ Xvfb البديل"
+            stage = CaptureStage(display, profile)
+            deadline = time.monotonic() + 5
+            while not stage.available and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert stage.start(), "تعذر بدء الالتقاط"
+
+            # الخمول: لا تغيير في الإطار
+            cpu_before = sum(process.cpu_times()[:2])
+            time.sleep(sizes['idle_seconds'])
+            idle_cpu = (sum(process.cpu_times()[:2]) - cpu_before) / sizes['idle_seconds']
+
+            # زمن ظهور التغيير: الكتابة في ملف الإطار ثم انتظار إصدار جديد
+            samples = []
+            with open(stage.path, 'r+b') as f, mmap.mmap(f.fileno(), 0) as fb:
+                offset = stage.framebuffer.header['pixel_offset']
+                for i in range(sizes['damages']):
+                    version = stage.version
+                    row = (i * 37) % stage.height
+                    started = time.perf_counter()
+                    fb[offset + row * stage.framebuffer.stride:offset + row * stage.framebuffer.stride + 400] = bytes([i % 255 + 1]) * 400
+                    while stage.version == version and time.perf_counter() - started < 5:
+                        time.sleep(0.001)
+                    samples.append(time.perf_counter() - started)
+            stage.stop()
+            results[profile] = {
+                'source': stage.source.name,
+                'idle_cpu_pct': round(idle_cpu * 100, 2),
+                'damage_p50_ms': round(percentile(samples, 50) * 1000, 1),
+                'damage_max_ms': round(max(samples) * 1000, 1),
+            }
+        finally:
+            group.stop(grace_period=1)
+    return results
+
+BENCHMARKS = {
+    'status': bench_status,
+    'cold_start': bench_cold_start,
+    'restart': bench_restart,
+    'logs': bench_logs,
+    'fanout': bench_fanout,
+    'screenshot': bench_screenshot,
+    'capture': bench_capture,
+}
+
+# ---- المقارنة بخط الأساس ----
+
+def flatten(results, prefix=''):
+    """تحويل النتائج المتداخلة إلى مفاتيح مسطحة (status./api/status.p50_ms)"""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+def compare(metrics, baseline, tolerance, noise_ms):
+    """التراجعات مقارنة بخط الأساس: أسوأ بأكثر من النسبة المسموحة (مع تجاهل فروق الملي ثانية الصغيرة)"""
+    regressions = []
+    for name, expected in baseline.items():
+        actual = metrics.get(name)
+        if actual is None or not expected:
+            continue
+        if name.endswith(HIGHER_IS_BETTER):
+            worse = actual < expected * (1 - tolerance)
+        else:
+            worse = actual > expected * (1 + tolerance) and actual - expected > noise_ms
+        if worse:
+            regressions.append({'metric': name, 'baseline': expected, 'actual': actual,
+                                'change': f"{(actual - expected) / expected:+.0%}"})
+    return regressions
+
+def main():
+    """البرنامج الرئيسي"""
+    parser = argparse.ArgumentParser(description="قياس أداء المستوى التحكمي مع بدائل محلية لـ X")
+    parser.add_argument("--only", action="append", choices=SCENARIOS, help="تشغيل سيناريو محدد فقط")
+    parser.add_argument("--quick", action="store_true", help="أحجام صغيرة للتشغيل السريع")
+    parser.add_argument("--clients", type=int, default=100, help="عدد عملاء Socket.IO لاختبار التوزيع")
+    parser.add_argument("--output", help="حفظ النتائج بصيغة JSON")
+    parser.add_argument("--baseline", default=str(BASELINE_FILE))
+    parser.add_argument("--save-baseline", action="store_true", help="حفظ النتائج كخط أساس جديد")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="نسبة التراجع المسموحة (0.5 = 50%%)")
+    parser.add_argument("--noise-ms", type=float, default=1.0, help="فروق الزمن الأصغر من هذا تُتجاهل")
+    args = parser.parse_args()
+
+    sizes = {'requests': 300, 'starts': 5, 'logs': 500, 'clients': args.clients, 'emits': 50, 'screenshots': 20,
+             'idle_seconds': 3, 'damages': 20}
+    if args.quick:
+        sizes.update(requests=50, starts=2, logs=100, clients=min(args.clients, 20), emits=10, screenshots=5,
+                     idle_seconds=1, damages=5)
+
+    with tempfile.TemporaryDirectory(prefix="vnc-bench-") as tmp:
+        setup_environment(Path(tmp))
+
+        import logging
+        logging.basicConfig(level=logging.WARNING)
+        logging.disable(logging.INFO)
+
+        from flask_app import create_app
+        app = create_app()
+
+        results = {}
+        try:
+            for name in args.only or SCENARIOS:
+                started = time.perf_counter()
+                try:
+                    results[name] = BENCHMARKS[name](app, sizes)
+                except Exception as e:
+                    results[name] = {'error': str(e)}
+                print(f"{'❌' if 'error' in results[name] else '✅'} {name} ({time.perf_counter() - started:.1f}s)",
+                      file=sys.stderr)
+        finally:
+            from display_pool import get_display_pool
+            get_display_pool().shutdown()
+
+    metrics = flatten(results)
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+            'sizes': sizes,
+            'timestamp': int(time.time())
+        },
+        'results': results,
+        'metrics': metrics
+    }
+
+    failed = [name for name, result in results.items() if 'error' in result]
+    regressions = []
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'meta': report['meta'], 'metrics': metrics}, f, ensure_ascii=False, indent=2)
+        print(f"💾 تم حفظ خط الأساس في {args.baseline}", file=sys.stderr)
+    elif Path(args.baseline).exists():
+        with open(args.baseline) as f:
+            baseline = json.load(f)['metrics']
+        regressions = compare(metrics, baseline, args.tolerance, args.noise_ms)
+        report['regressions'] = regressions
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    for regression in regressions:
+        print(f"⚠️ تراجع {regression['metric']}: {regression['baseline']} → {regression['actual']} ({regression['change']})",
+              file=sys.stderr)
+    sys.exit(1 if failed or regressions else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Fake X - بدائل محلية لـ Xvfb وx11vnc وتطبيقات سطح المكتب
+ملف واحد يُربط برموز باسم كل برنامج؛ السلوك يتحدد من اسم الاستدعاء:
+    Xvfb :N      ينشئ مقبس العرض /tmp/.X11-unix/XN وملف القفل (وملف إطار XWD عند ‎-fbdir) ثم ينتظر الإيقاف
+    x11vnc       يفتح -rfbport ويرد بتحية RFB على كل اتصال
+    غير ذلك      عملية خاملة حتى الإيقاف (openbox، xterm، firefox...)
+
+التأخير المحاكي لبدء التشغيل بالثواني: FAKE_XVFB_DELAY وFAKE_X11VNC_DELAY
+"""
+
+import os
+import sys
+import time
+import struct
+import signal
+import socket
+import threading
+from pathlib import Path
+
+def wait_forever(cleanup=None):
+    """الانتظار حتى SIGTERM/SIGINT ثم التنظيف"""
+    def stop(signum, frame):
+        if cleanup:
+            cleanup()
+        os._exit(0)
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    while True:
+        signal.pause()
+
+XWD_WINDOW_NAME = b"Xvfb main window\0"
+
+def write_framebuffer(path, geometry):
+    """ملف إطار بصيغة XWD كما يكتبه Xvfb مع ‎-fbdir (ترويسة MSB أولاً، 32 بت BGRX)"""
+    width, height = (int(v) for v in geometry.split("x")[:2])
+    header_size = 100 + len(XWD_WINDOW_NAME)
+    header = struct.pack(">25I", header_size, 7, 2, 24, width, height, 0, 0, 32, 0, 32, 32,
+                         width * 4, 4, 0xFF0000, 0x00FF00, 0x0000FF, 8, 256, 0,
+                         width, height, 0, 0, 0)
+    with open(path, "wb") as f:
+        f.write(header + XWD_WINDOW_NAME)
+        f.truncate(header_size + width * 4 * height)
+
+def fake_xvfb(args):
+    display = next((a for a in args if a.startswith(":")), ":99").lstrip(":")
+    time.sleep(float(os.environ.get("FAKE_XVFB_DELAY", "0")))
+
+    socket_dir = Path("/tmp/.X11-unix")
+    socket_dir.mkdir(mode=0o1777, exist_ok=True)
+    socket_path = socket_dir / f"X{display}"
+    lock_path = Path(f"/tmp/.X{display}-lock")
+    if socket_path.exists() or lock_path.exists():
+        sys.stderr.write(f"Fatal server error: display :{display} in use\n")
+        sys.exit(1)
+
+    lock_path.write_text(f"{os.getpid():>10}\n")
+    framebuffer = None
+    if "-fbdir" in args:
+        geometry = args[args.index("-screen") + 2] if "-screen" in args else "1280x1024x24"
+        framebuffer = Path(args[args.index("-fbdir") + 1]) / "Xvfb_screen0"
+        write_framebuffer(framebuffer, geometry)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(str(socket_path))
+    server.listen(16)
+
+    def cleanup():
+        server.close()
+        socket_path.unlink(missing_ok=True)
+        lock_path.unlink(missing_ok=True)
+        if framebuffer:
+            framebuffer.unlink(missing_ok=True)
+
+    wait_forever(cleanup)
+
+def fake_x11vnc(args):
+    port = int(args[args.index("-rfbport") + 1]) if "-rfbport" in args else 5900
+    time.sleep(float(os.environ.get("FAKE_X11VNC_DELAY", "0")))
+
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(("0.0.0.0", port))
+    server.listen(64)
+
+    def serve():
+        while True:
+            client, _ = server.accept()
+            try:
+                client.sendall(b"RFB 003.008\n")
+            except OSError:
+                pass
+            finally:
+                client.close()
+
+    threading.Thread(target=serve, daemon=True).start()
+    wait_forever(server.close)
+
+def main():
+    name = Path(sys.argv[0]).name
+    if name == "Xvfb":
+        fake_xvfb(sys.argv[1:])
+    elif name == "x11vnc":
+        fake_x11vnc(sys.argv[1:])
+    else:
+        wait_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Import Time - قياس زمن البدء البارد
+يشغل كل سيناريو في عملية Python جديدة عدة مرات (كما يحدث عند بدء عامل gunicorn) ويعرض الوسيط، مع أثقل الوحدات حسب -X importtime
+
+الاستخدام:
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --repeat 10 --top 15
+    python benchmarks/import_time.py --root /path/to/other/checkout   # للمقارنة مع نسخة أخرى
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+sys.path.insert(0, str(ROOT))
+from import_profiler import heaviest, profile_imports
+
+# السيناريو: الشيفرة المقاسة داخل العملية الجديدة
+SCENARIOS = {
+    'import main': "import main",
+    'import app': "import app",
+    'import flask_app': "import flask_app",
+    'import vnc_manager': "import vnc_manager",
+    'create_app()': "import flask_app; flask_app.create_app()",
+}
+
+PROBE = """
+import sys, time, json
+started = time.perf_counter()
+exec(compile(sys.argv[1], '<scenario>', 'exec'))
+elapsed = time.perf_counter() - started
+print(json.dumps({'seconds': elapsed, 'modules': len(sys.modules), 'threads': __import__('threading').active_count()}))
+"""
+
+def run_scenario(root, code, env):
+    """تشغيل سيناريو واحد في عملية جديدة"""
+    result = subprocess.run([sys.executable, "-c", PROBE, code], cwd=root, env=env,
+                            capture_output=True, text=True, timeout=120)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "فشل")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def measure(root, code, repeat, env):
+    """الوسيط والأدنى لعدة تشغيلات باردة"""
+    samples = [run_scenario(root, code, env) for _ in range(repeat)]
+    times = [s['seconds'] for s in samples]
+    return {
+        'median_ms': round(statistics.median(times) * 1000, 1),
+        'min_ms': round(min(times) * 1000, 1),
+        'modules': samples[-1]['modules'],
+        'threads': samples[-1]['threads']
+    }
+
+def heaviest_imports(root, entry, top, env):
+    """أثقل الوحدات حسب الزمن التراكمي من -X importtime"""
+    return heaviest(profile_imports(entry, cwd=root, env=env), top)
+
+def main():
+    """البرنامج الرئيسي"""
+    parser = argparse.ArgumentParser(description="قياس زمن الاستيراد والبدء البارد")
+    parser.add_argument("--root", default=str(ROOT), help="مجلد المشروع المراد قياسه")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="تشغيل سيناريو محدد فقط")
+    parser.add_argument("--output", help="حفظ النتائج بصيغة JSON")
+    args = parser.parse_args()
+
+    # قاعدة بيانات مؤقتة وبدون تسخين شاشات حتى لا يلمس القياس بيئة التشغيل
+    env = dict(os.environ, DATABASE_URL="sqlite://", VNC_POOL_WARM="0", PYTHONDONTWRITEBYTECODE="")
+
+    results = {}
+    for name in args.scenario or SCENARIOS:
+        try:
+            results[name] = measure(args.root, SCENARIOS[name], args.repeat, env)
+        except Exception as e:
+            results[name] = {'error': str(e)}
+
+    report = {
+        'root': args.root,
+        'python': sys.version.split()[0],
+        'scenarios': results,
+        'heaviest_imports': heaviest_imports(args.root, 'app', args.top, env)
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Multi Worker Harness - تشغيل عدة عمال محلياً عبر ناقل الرسائل
+يشغل عدة نسخ من لوحة التحكم على منافذ مختلفة تتشارك SOCKETIO_MESSAGE_QUEUE، ثم يتحقق من أن emit من عامل واحد يصل إلى العملاء المتصلين بكل العمال
+
+الاستخدام:
+    python benchmarks/multi_worker_harness.py --workers 3
+    python benchmarks/multi_worker_harness.py --queue redis://localhost:6379/0
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+from pathlib import Path
+
+import websockets
+
+ROOT = Path(__file__).resolve().parent.parent
+
+sys.path.insert(0, str(ROOT))
+from process_groups import wait_for_port
+
+def start_workers(count, base_port, queue, workdir):
+    """تشغيل العمال كعمليات منفصلة"""
+    env = dict(
+        os.environ,
+        SOCKETIO_MESSAGE_QUEUE=queue,
+        VNC_BUS_DIR=str(workdir),
+        DATABASE_URL=f"sqlite:///{workdir}/harness.db",
+        VNC_STATUS_INTERVAL="1",
+        VNC_POOL_WARM="0"
+    )
+    workers = []
+    for i in range(count):
+        port = base_port + i
+        log = open(workdir / f"worker-{port}.log", 'w')
+        process = subprocess.Popen(
+            [sys.executable, str(ROOT / "serve.py"), "control", "--host", "127.0.0.1", "--port", str(port)],
+            cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT
+        )
+        workers.append((port, process))
+    for port, process in workers:
+        if not wait_for_port(port, timeout=30, process=process):
+            raise RuntimeError(f"العامل على المنفذ {port} لم يبدأ (راجع {workdir}/worker-{port}.log)")
+    return workers
+
+async def listen(port, events, received, ready):
+    """عميل Socket.IO على عامل واحد يسجل الأحداث المستلمة"""
+    async with websockets.connect(f"ws://127.0.0.1:{port}/socket.io/?EIO=4&transport=websocket") as ws:
+        await ws.recv()
+        await ws.send("40")
+        while not (await ws.recv()).startswith("40"):
+            pass
+        ready.set()
+        while True:
+            packet = await ws.recv()
+            if packet == "2":
+                await ws.send("3")
+            elif packet.startswith("42"):
+                event = json.loads(packet[2:])[0]
+                if event in events:
+                    received.setdefault(port, {}).setdefault(event, time.monotonic())
+
+async def run_check(ports, timeout):
+    """التحقق من وصول الأحداث لكل العمال"""
+    received = {}
+    readiness = [asyncio.Event() for _ in ports]
+    events = {'vnc_status_changed', 'status_delta', 'status_snapshot'}
+    tasks = [asyncio.create_task(listen(port, events, received, ready))
+             for port, ready in zip(ports, readiness)]
+    await asyncio.wait_for(asyncio.gather(*(ready.wait() for ready in readiness)), timeout)
+
+    # emit من مسار API على العامل الأول فقط
+    started = time.monotonic()
+    request = urllib.request.Request(f"http://127.0.0.1:{ports[0]}/api/vnc/stop", method="POST", data=b"")
+    await asyncio.to_thread(urllib.request.urlopen, request, timeout=timeout)
+
+    deadline = started + timeout
+    while time.monotonic() < deadline:
+        if all('vnc_status_changed' in received.get(port, {})
+               and received[port].keys() & {'status_delta', 'status_snapshot'} for port in ports):
+            break
+        await asyncio.sleep(0.05)
+
+    for task in tasks:
+        task.cancel()
+
+    return {
+        str(port): {
+            'api_emit_ms': round((received[port]['vnc_status_changed'] - started) * 1000, 2)
+                           if 'vnc_status_changed' in received.get(port, {}) else None,
+            'status_received': any(e in received.get(port, {}) for e in ('status_delta', 'status_snapshot'))
+        }
+        for port in ports
+    }
+
+def main():
+    """البرنامج الرئيسي"""
+    parser = argparse.ArgumentParser(description="تشغيل عدة عمال والتحقق من توزيع الأحداث بينهم")
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--base-port", type=int, default=5100)
+    parser.add_argument("--queue", default=None, help="عنوان الطابور (افتراضياً ناقل Unix محلي)")
+    parser.add_argument("--timeout", type=float, default=15)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="vnc-harness-") as tmp:
+        workdir = Path(tmp)
+        queue = args.queue or f"unix://{workdir}/bus"
+        workers = start_workers(args.workers, args.base_port, queue, workdir)
+        try:
+            results = asyncio.run(run_check([port for port, _ in workers], args.timeout))
+        finally:
+            for _, process in workers:
+                process.terminate()
+            for _, process in workers:
+                process.wait(timeout=10)
+
+    print(json.dumps({'queue': queue, 'workers': results}, ensure_ascii=False, indent=2))
+    ok = all(r['api_emit_ms'] is not None and r['status_received'] for r in results.values())
+    print("✅ وصلت الأحداث لكل العمال" if ok else "❌ لم تصل الأحداث لكل العمال")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
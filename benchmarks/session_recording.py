@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Session Recording Benchmark - تكلفة التسجيل وسرعة القفز في التشغيل
+يولد جلسة اصطناعية (كتابة وتمرير طرفية وتبديل نوافذ أحياناً) بمعدل الالتقاط، يمرر الإطارات على TileDiffer كما تفعل مرحلة الالتقاط،
+ثم يقيس: زمن المعالج للتسجيل كنسبة من زمن الجلسة الحقيقي (الهدف < 5% من نواة)، حجم الملف، زمن القفز العشوائي والمتتابع،
+ومطابقة الإطارات المفكوكة للأصل
+
+الاستخدام:
+    python benchmarks/session_recording.py
+    python benchmarks/session_recording.py --seconds 120 --fps 15 --keyframe-interval 5
+"""
+
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from session_recorder import SessionPlayer, SessionRecorder
+from tile_diff import TileDiffer
+
+BYTES_PER_PIXEL = 4
+PIXEL_FORMAT = {'bits_per_pixel': 32, 'depth': 24, 'big_endian': False,
+                'red_mask': 0xFF0000, 'green_mask': 0xFF00, 'blue_mask': 0xFF}
+
+def desktop(width, height, rng):
+    """سطح مكتب بخلفية مسطحة ونافذة طرفية نصها عشوائي"""
+    frame = np.zeros((height, width, BYTES_PER_PIXEL), dtype=np.uint8)
+    frame[:] = (165, 110, 58, 0)
+    terminal = (slice(100, height - 100), slice(200, width // 2 + 200))
+    frame[terminal] = 0
+    frame[terminal][rng.random((height - 200, width // 2)) < 0.2] = (0, 255, 0, 0)
+    return frame, terminal
+
+def typing(frame, terminal, rng):
+    y, x = int(rng.integers(120, frame.shape[0] - 120)), int(rng.integers(220, frame.shape[1] // 2))
+    frame[y:y + 14, x:x + 8] = rng.integers(0, 255, BYTES_PER_PIXEL)
+
+def scroll(frame, terminal, rng, lines=15):
+    """تمرير محتوى الطرفية للأعلى وإضافة سطور جديدة في الأسفل"""
+    window = frame[terminal]
+    window[:-lines] = window[lines:].copy()
+    window[-lines:] = 0
+    window[-lines:][rng.random((lines, window.shape[1])) < 0.2] = (0, 255, 0, 0)
+
+def switch_window(frame, terminal, rng):
+    """تبديل نافذة: الشاشة كلها تتغير إلى سطح مكتب آخر"""
+    other, _ = desktop(frame.shape[1], frame.shape[0], rng)
+    other[:, :, :3] = other[:, :, 2::-1]
+    frame[:] = other
+
+# احتمال كل نشاط في كل إطار ملتقط (والباقي خمول لا يصل للمسجل أصلاً)
+ACTIVITY = (('typing', typing, 0.3), ('scroll', scroll, 0.05), ('switch_window', switch_window, 0.003))
+
+def session_events(rng):
+    """نشاط نموذجي لكل إطار: كتابة غالباً، تمرير أحياناً، وتبديل نافذة نادر"""
+    roll = rng.random()
+    for name, mutate, probability in ACTIVITY:
+        if roll < probability:
+            return name, mutate
+        roll -= probability
+    return 'idle', None
+
+def record(path, width, height, seconds, fps, keyframe_interval, checkpoints):
+    rng = np.random.default_rng(7)
+    frame, terminal = desktop(width, height, rng)
+    differ = TileDiffer(bytes_per_pixel=BYTES_PER_PIXEL)
+    rows = frame.reshape(height, -1)
+    differ.diff(rows)
+    recorder = SessionRecorder(path, width, height, width * BYTES_PER_PIXEL, BYTES_PER_PIXEL, PIXEL_FORMAT,
+                               keyframe_interval=keyframe_interval)
+
+    # ساعة محاكاة: الطوابع الزمنية بمعدل الالتقاط دون انتظار حقيقي
+    recorder.started = 0.0
+    recorder.record(rows, 0, None, now=0.0)
+    expected = {}
+    per_event = {}
+    cpu = 0.0
+    frames = int(seconds * fps)
+    for i in range(1, frames + 1):
+        event, mutate = session_events(rng)
+        if mutate is not None:
+            mutate(frame, terminal, rng)
+        update = differ.diff(rows)
+        if not update['rects'] and not update['copies']:
+            continue
+        now = i / fps
+        started = time.process_time()
+        recorder.record(rows, i, update, now=now)
+        elapsed = time.process_time() - started
+        cpu += elapsed
+        per_event.setdefault(event, []).append(elapsed)
+        if i in checkpoints:
+            expected[now] = rows.copy()
+    recorder.close()
+    return {
+        'frames': frames,
+        'chunks': recorder.chunks,
+        'keyframes': recorder.keyframes,
+        'size_mb': round(recorder.bytes_written / 1024 / 1024, 2),
+        'cpu_s': round(cpu, 3),
+        'cpu_percent': round(cpu / seconds * 100, 2),
+        'per_event_ms': {name: round(statistics.median(samples) * 1000, 2) for name, samples in per_event.items()},
+    }, expected
+
+def seek_benchmark(path, duration, expected, seeks, rng):
+    player = SessionPlayer(path)
+    exact = all(np.array_equal(player.seek(t), frame) for t, frame in sorted(expected.items(), reverse=True))
+
+    samples = []
+    for t in rng.uniform(0, duration, seeks):
+        started = time.perf_counter()
+        player.seek(float(t))
+        samples.append(time.perf_counter() - started)
+
+    # تشغيل متتابع: كل خطوة تكمل من الموقع الحالي
+    sequential = []
+    for t in np.arange(0, duration, 1 / 15):
+        started = time.perf_counter()
+        player.seek(float(t))
+        sequential.append(time.perf_counter() - started)
+    player.close()
+    return {
+        'exact': exact,
+        'random_seek_median_ms': round(statistics.median(samples) * 1000, 2),
+        'random_seek_max_ms': round(max(samples) * 1000, 2),
+        'sequential_step_median_ms': round(statistics.median(sequential) * 1000, 3),
+    }
+
+def main():
+    """البرنامج الرئيسي"""
+    parser = argparse.ArgumentParser(description="قياس تكلفة تسجيل الجلسات وسرعة القفز")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--seconds", type=float, default=60)
+    parser.add_argument("--fps", type=float, default=15)
+    parser.add_argument("--keyframe-interval", type=float, default=10)
+    parser.add_argument("--seeks", type=int, default=50)
+    parser.add_argument("--max-cpu-percent", type=float, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(3)
+    frames = int(args.seconds * args.fps)
+    checkpoints = set(int(i) for i in rng.integers(1, frames, 8))
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "bench.vrec"
+        recording, expected = record(path, args.width, args.height, args.seconds, args.fps,
+                                     args.keyframe_interval, checkpoints)
+        playback = seek_benchmark(path, args.seconds, expected, args.seeks, rng)
+
+    results = {'resolution': f"{args.width}x{args.height}", 'record': recording, 'playback': playback}
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+    failed = []
+    if recording['cpu_percent'] > args.max_cpu_percent:
+        failed.append(f"تكلفة التسجيل {recording['cpu_percent']}% > {args.max_cpu_percent}%")
+    if not playback['exact']:
+        failed.append("الإطارات المفكوكة لا تطابق الأصل")
+    for message in failed:
+        print(f"❌ {message}", file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
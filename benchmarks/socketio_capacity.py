@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Socket.IO Capacity - اختبار حمل اتصالات WebSocket المتزامنة
+يفتح عدداً كبيراً من عملاء Socket.IO (بروتوكول Engine.IO v4 مباشرة عبر websockets) ويقيس زمن الاتصال ووصول أول حالة وعدد العملاء المستقرين لكل عامل
+
+الاستخدام:
+    python serve.py control --port 5000 &
+    python benchmarks/socketio_capacity.py --url ws://127.0.0.1:5000 --clients 2000 --hold 30
+"""
+
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+
+import websockets
+
+def percentile(values, pct):
+    """قيمة المئين من قائمة مرتبة"""
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return round(values[index] * 1000, 2)
+
+class Stats:
+    """إحصائيات التشغيل"""
+
+    def __init__(self):
+        self.connect_times = []
+        self.first_status_times = []
+        self.connected = 0
+        self.peak_connected = 0
+        self.failed = 0
+        self.dropped = 0
+        self.messages = 0
+        self.errors = {}
+
+    def error(self, e):
+        name = type(e).__name__
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+async def run_client(url, stats, stop_event):
+    """عميل Socket.IO واحد: اتصال، انتظار أول حالة، ثم البقاء متصلاً مع الرد على ping"""
+    started = time.monotonic()
+    connected = False
+    try:
+        async with websockets.connect(f"{url}/socket.io/?EIO=4&transport=websocket",
+                                      open_timeout=30, ping_interval=None) as ws:
+            # 0{...} فتح Engine.IO ثم 40 اتصال Socket.IO
+            packet = await ws.recv()
+            if not packet.startswith("0"):
+                raise ConnectionError(f"حزمة فتح غير متوقعة: {packet[:20]}")
+            await ws.send("40")
+            while not (packet := await ws.recv()).startswith("40"):
+                pass
+
+            stats.connect_times.append(time.monotonic() - started)
+            stats.connected += 1
+            stats.peak_connected = max(stats.peak_connected, stats.connected)
+            connected = True
+
+            got_status = False
+            while not stop_event.is_set():
+                try:
+                    packet = await asyncio.wait_for(ws.recv(), timeout=1)
+                except asyncio.TimeoutError:
+                    continue
+                if packet == "2":
+                    await ws.send("3")
+                elif packet.startswith("42"):
+                    stats.messages += 1
+                    if not got_status and '"status_' in packet[:20]:
+                        got_status = True
+                        stats.first_status_times.append(time.monotonic() - started)
+    except Exception as e:
+        if connected:
+            stats.dropped += 1
+        else:
+            stats.failed += 1
+        stats.error(e)
+    finally:
+        if connected:
+            stats.connected -= 1
+
+async def run(url, clients, ramp, hold):
+    """تشغيل العملاء بمعدل تصاعد محدد ثم الإبقاء عليهم لمدة hold"""
+    stats = Stats()
+    stop_event = asyncio.Event()
+    tasks = []
+    started = time.monotonic()
+
+    for i in range(clients):
+        tasks.append(asyncio.create_task(run_client(url, stats, stop_event)))
+        if ramp:
+            await asyncio.sleep(1 / ramp)
+    ramp_duration = time.monotonic() - started
+
+    await asyncio.sleep(hold)
+    held = stats.connected
+    stop_event.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    return {
+        'url': url,
+        'clients': clients,
+        'ramp_duration': round(ramp_duration, 2),
+        'hold_seconds': hold,
+        'peak_connected': stats.peak_connected,
+        'held_connected': held,
+        'failed': stats.failed,
+        'dropped': stats.dropped,
+        'messages': stats.messages,
+        'errors': stats.errors,
+        'connect_ms': {
+            'mean': round(statistics.mean(stats.connect_times) * 1000, 2) if stats.connect_times else None,
+            'p50': percentile(stats.connect_times, 50),
+            'p95': percentile(stats.connect_times, 95),
+            'p99': percentile(stats.connect_times, 99)
+        },
+        'first_status_ms': {
+            'p50': percentile(stats.first_status_times, 50),
+            'p95': percentile(stats.first_status_times, 95)
+        }
+    }
+
+def main():
+    """البرنامج الرئيسي"""
+    parser = argparse.ArgumentParser(description="اختبار سعة اتصالات Socket.IO المتزامنة")
+    parser.add_argument("--url", default="ws://127.0.0.1:5000")
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--ramp", type=float, default=200, help="عملاء جدد في الثانية (0 = دفعة واحدة)")
+    parser.add_argument("--hold", type=float, default=15, help="مدة بقاء العملاء متصلين بالثواني")
+    parser.add_argument("--output", help="حفظ النتائج بصيغة JSON")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args.url, args.clients, args.ramp, args.hold))
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    # الفشل إن لم يبق كل العملاء متصلين
+    sys.exit(0 if result['held_connected'] == args.clients else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Stream Mode Benchmark - منطق التبديل بين المربعات والفيديو على حركة اصطناعية
+يولد تتابعات تحديثات الالتقاط (نسبة الشاشة المتغيرة لكل تحديث) لسيناريوهات نموذجية ويمررها على ModeSelector بساعة محاكاة،
+ثم يقيس: عدد التبديلات، الوقت في الوضع الخاطئ، زمن الدخول في الفيديو، والعرض النطاقي التقديري مقارنة بالمربعات دائماً
+
+الاستخدام:
+    python benchmarks/stream_mode.py
+    python benchmarks/stream_mode.py --set enter_fraction=0.1 --set exit_after=5
+"""
+
+import sys
+import json
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from video_stream import ModeSelector, VIDEO_FPS
+
+# نموذج تكلفة تقريبي: بايتات JPEG لكل بكسل متغير، وبايتات كل إطار فيديو بمعدل 2 ميغابت/ث
+SCREEN_PIXELS = 1920 * 1080
+TILE_BYTES_PER_PIXEL = 0.35
+VIDEO_BYTES_PER_FRAME = 2_000_000 / 8 / VIDEO_FPS
+
+def segment(kind, seconds, rate, fraction):
+    """مقطع من الحركة: (النوع المتوقع، المدة، تحديثات/ث، نسبة الشاشة المتغيرة)"""
+    return (kind, seconds, rate, fraction)
+
+SCENARIOS = {
+    'typing': [segment('tiles', 60, 5, 0.01)],
+    'terminal_scroll_bursts': [segment('tiles', 8, 3, 0.01), segment('tiles', 2, 20, 0.4)] * 6,
+    'window_video_640x360': [segment('tiles', 10, 2, 0.01), segment('video', 40, 30, 0.111), segment('tiles', 10, 1, 0.01)],
+    'fullscreen_video': [segment('tiles', 5, 2, 0.02), segment('video', 50, 25, 1.0), segment('tiles', 5, 0, 0)],
+    'mixed_session': [segment('tiles', 20, 5, 0.01), segment('video', 20, 30, 0.5),
+                      segment('tiles', 20, 0, 0), segment('video', 15, 24, 0.2), segment('tiles', 15, 4, 0.02)],
+    'flicker_3s': [segment('video', 3, 30, 0.5), segment('tiles', 3, 0, 0)] * 10,
+}
+
+def timeline(segments):
+    """أحداث التحديث المحاكاة: (الزمن، النسبة، الوضع المتوقع)"""
+    events = []
+    start = 0.0
+    for kind, seconds, rate, fraction in segments:
+        if rate:
+            step = 1.0 / rate
+            t = start
+            while t < start + seconds:
+                events.append((t, fraction, kind))
+                t += step
+        start += seconds
+    return events, start
+
+def expected_at(segments, t):
+    start = 0.0
+    for kind, seconds, _, _ in segments:
+        if t < start + seconds:
+            return kind
+        start += seconds
+    return segments[-1][0]
+
+def run(name, segments, settings):
+    selector = ModeSelector(settings, video_available=True)
+    events, duration = timeline(segments)
+    tick = 0.1
+    wrong = 0.0
+    video_time = 0.0
+    entries = []
+    tiles_bytes = sum(fraction * SCREEN_PIXELS * TILE_BYTES_PER_PIXEL for _, fraction, _ in events)
+    adaptive_bytes = 0.0
+
+    index = 0
+    now = 0.0
+    video_started_at = None
+    while now < duration:
+        # التحديثات في هذه الشريحة الزمنية، ثم تقييم دوري (كما يفعل _idle_check)
+        while index < len(events) and events[index][0] < now + tick:
+            t, fraction, _ = events[index]
+            selector.observe(t, fraction)
+            if selector.mode == 'tiles':
+                adaptive_bytes += fraction * SCREEN_PIXELS * TILE_BYTES_PER_PIXEL
+            index += 1
+        selector.evaluate(now + tick)
+
+        expected = expected_at(segments, now)
+        if expected == 'video' and video_started_at is None:
+            video_started_at = now
+        elif expected != 'video':
+            video_started_at = None
+        if selector.mode == 'video':
+            video_time += tick
+            adaptive_bytes += VIDEO_BYTES_PER_FRAME * VIDEO_FPS * tick
+            if video_started_at is not None and (not entries or entries[-1][0] != video_started_at):
+                entries.append((video_started_at, now - video_started_at))
+        if selector.mode != expected:
+            wrong += tick
+        now += tick
+
+    return {
+        'duration_s': round(duration, 1),
+        'switches': selector.switches,
+        'video_time_s': round(video_time, 1),
+        'wrong_mode_s': round(wrong, 1),
+        'enter_latency_s': round(max((latency for _, latency in entries), default=0.0), 1),
+        'tiles_only_mbit': round(tiles_bytes * 8 / 1e6, 1),
+        'adaptive_mbit': round(adaptive_bytes * 8 / 1e6, 1),
+    }
+
+def main():
+    """البرنامج الرئيسي"""
+    parser = argparse.ArgumentParser(description="قياس منطق التبديل بين المربعات والفيديو")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE", help="تعديل حد من حدود التبديل")
+    args = parser.parse_args()
+
+    settings = {}
+    for item in args.set:
+        key, value = item.split("=", 1)
+        settings[key] = float(value)
+
+    results = {name: run(name, segments, settings) for name, segments in SCENARIOS.items()}
+    print(json.dumps({'settings': {**ModeSelector(settings).settings}, 'results': results}, ensure_ascii=False, indent=2))
+
+    # لا تبديل في السيناريوهات النصية، ولا تذبذب يتجاوز تبديلين لكل مقطع فيديو
+    failed = [name for name in ('typing', 'terminal_scroll_bursts') if results[name]['switches']]
+    failed += [name for name in ('window_video_640x360', 'fullscreen_video') if results[name]['switches'] < 1]
+    for name in failed:
+        print(f"❌ {name}", file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
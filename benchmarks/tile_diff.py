@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Tile Diff Benchmark - زمن مقارنة الإطارات وكشف التمرير بدقة 1080p على نواة واحدة
+السيناريوهات: خمول، كتابة حرف، تمرير نافذة xterm، تغير الشاشة كاملة؛ يتحقق أيضاً من أن تطبيق النسخ والمستطيلات
+على الإطار السابق يعيد الإطار الحالي تماماً، وأن المعدل يكفي لـ 30 إطاراً في الثانية
+
+الاستخدام:
+    python benchmarks/tile_diff.py
+    python benchmarks/tile_diff.py --width 3840 --height 2160 --frames 50
+"""
+
+import sys
+import json
+import time
+import argparse
+import statistics
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from tile_diff import TileDiffer
+
+BYTES_PER_PIXEL = 4
+
+def desktop(width, height, rng):
+    """سطح مكتب بخلفية مسطحة ونافذة طرفية نصها عشوائي"""
+    frame = np.zeros((height, width, BYTES_PER_PIXEL), dtype=np.uint8)
+    frame[:] = (165, 110, 58, 0)
+    terminal = (slice(100, height - 100), slice(200, width // 2 + 200))
+    frame[terminal] = 0
+    text = rng.random((height - 200, width // 2)) < 0.2
+    frame[terminal][text] = (0, 255, 0, 0)
+    return frame, terminal
+
+def scroll(frame, terminal, rng, lines=15):
+    """تمرير محتوى الطرفية للأعلى وإضافة سطور جديدة في الأسفل"""
+    rows, cols = terminal
+    window = frame[rows, cols]
+    window[:-lines] = window[lines:].copy()
+    window[-lines:] = 0
+    window[-lines:][rng.random((lines, window.shape[1])) < 0.2] = (0, 255, 0, 0)
+
+def apply_update(frame, current, update):
+    """تطبيق النسخ ثم المستطيلات كما يفعل العميل"""
+    result = frame.copy()
+    for src_x, src_y, x, y, w, h in update['copies']:
+        result[y:y + h, x:x + w] = result[src_y:src_y + h, src_x:src_x + w].copy()
+    for x, y, w, h in update['rects']:
+        result[y:y + h, x:x + w] = current[y:y + h, x:x + w]
+    return result
+
+def run_scenario(name, width, height, frames, mutate):
+    rng = np.random.default_rng(1)
+    frame, terminal = desktop(width, height, rng)
+    differ = TileDiffer(bytes_per_pixel=BYTES_PER_PIXEL)
+    differ.diff(frame.reshape(height, -1))
+    client = frame.copy()
+
+    samples, copies, rects, exact = [], 0, 0, True
+    for _ in range(frames):
+        mutate(frame, terminal, rng)
+        started = time.perf_counter()
+        update = differ.diff(frame.reshape(height, -1))
+        samples.append(time.perf_counter() - started)
+        copies += len(update['copies'])
+        rects += len(update['rects'])
+        client = apply_update(client, frame, update)
+        exact = exact and np.array_equal(client, frame)
+
+    median = statistics.median(samples)
+    return {
+        'median_ms': round(median * 1000, 2),
+        'max_ms': round(max(samples) * 1000, 2),
+        'fps': round(1 / median, 1),
+        'copies_per_frame': round(copies / frames, 2),
+        'rects_per_frame': round(rects / frames, 2),
+        'exact': exact,
+    }
+
+def idle(frame, terminal, rng):
+    pass
+
+def typing(frame, terminal, rng):
+    y, x = int(rng.integers(120, frame.shape[0] - 120)), int(rng.integers(220, frame.shape[1] // 2))
+    frame[y:y + 14, x:x + 8] = rng.integers(0, 255, BYTES_PER_PIXEL)
+
+def full_change(frame, terminal, rng):
+    frame[:] = rng.integers(0, 255, frame.shape, dtype=np.uint8)
+
+SCENARIOS = {'idle': idle, 'typing': typing, 'xterm_scroll': scroll, 'full_change': full_change}
+
+def main():
+    """البرنامج الرئيسي"""
+    parser = argparse.ArgumentParser(description="قياس مقارنة الإطارات وكشف التمرير")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--frames", type=int, default=30)
+    parser.add_argument("--target-fps", type=float, default=30)
+    args = parser.parse_args()
+
+    results = {name: run_scenario(name, args.width, args.height, args.frames, mutate)
+               for name, mutate in SCENARIOS.items()}
+    print(json.dumps({'resolution': f"{args.width}x{args.height}", 'results': results}, ensure_ascii=False, indent=2))
+
+    failed = [name for name, result in results.items()
+              if not result['exact'] or (name != 'full_change' and result['fps'] < args.target_fps)]
+    if results['xterm_scroll']['copies_per_frame'] < 1:
+        failed.append('xterm_scroll (لم يُكشف التمرير)')
+    for name in failed:
+        print(f"❌ {name}", file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Tile Encoding Benchmark - قياس توسع خدمة الترميز مع عدد الأنوية
+يرمز إطارات اصطناعية تشبه سطح المكتب بدقة 1024x768 و1920x1080 و4K بعدد عمال متزايد،
+ويقارنها بترميز PIL PNG في خيط واحد (المسار القديم في web_vnc.vnc_screenshot)
+
+الاستخدام:
+    python benchmarks/tile_encoding.py
+    python benchmarks/tile_encoding.py --workers 1 --workers 2 --workers 4 --frames 20 --output tiles.json
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from tile_encoder import TileEncoder
+
+RESOLUTIONS = {
+    '1024x768': (1024, 768),
+    '1920x1080': (1920, 1080),
+    '3840x2160': (3840, 2160),
+}
+
+def synthetic_desktop(width, height, seed=0):
+    """إطار يشبه سطح مكتب: خلفية ونوافذ بألوان مسطحة ونص عشوائي الكثافة"""
+    rng = np.random.default_rng(seed)
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    frame[:] = (58, 110, 165)
+    for _ in range(12):
+        x, y = int(rng.integers(0, width - 200)), int(rng.integers(0, height - 150))
+        w, h = int(rng.integers(200, width // 2)), int(rng.integers(150, height // 2))
+        frame[y:y + h, x:x + w] = rng.integers(180, 255, 3)
+        frame[y:y + 24, x:x + w] = (40, 40, 60)
+        text = rng.random((max(0, min(h, height - y) - 30) // 2, min(w, width - x) - 20)) < 0.15
+        frame[y + 30:y + 30 + text.shape[0] * 2:2, x + 10:x + 10 + text.shape[1]][text] = 0
+    return frame
+
+def pil_png(frame):
+    """المسار المرجعي: PNG عبر PIL في خيط واحد"""
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.fromarray(frame, 'RGB').save(buffer, format='PNG')
+    return buffer.getvalue()
+
+def measure(func, frames):
+    func()
+    samples = []
+    for _ in range(frames):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    median = statistics.median(samples)
+    return {'median_ms': round(median * 1000, 1), 'fps': round(1 / median, 1)}
+
+def main():
+    """البرنامج الرئيسي"""
+    parser = argparse.ArgumentParser(description="قياس ترميز الإطارات على عدة أنوية")
+    parser.add_argument("--workers", type=int, action="append", help="عدد العمال (يتكرر)")
+    parser.add_argument("--resolution", action="append", choices=RESOLUTIONS, help="دقة محددة فقط")
+    parser.add_argument("--frames", type=int, default=10)
+    parser.add_argument("--output", help="حفظ النتائج بصيغة JSON")
+    args = parser.parse_args()
+
+    cpus = os.cpu_count() or 1
+    worker_counts = args.workers or sorted({1, 2, 4, 8, cpus} - {n for n in (2, 4, 8) if n > cpus})
+
+    results = {'cpus': cpus, 'resolutions': {}}
+    for name in args.resolution or RESOLUTIONS:
+        width, height = RESOLUTIONS[name]
+        frame = synthetic_desktop(width, height)
+        entry = {'pil_png_single_thread': measure(lambda: pil_png(frame), args.frames)}
+        for workers in worker_counts:
+            encoder = TileEncoder(workers=workers)
+            encoder.start()
+            try:
+                entry[f"workers_{workers}"] = {
+                    'png': measure(lambda: encoder.encode_png(frame), args.frames),
+                    'jpeg_tiles': measure(lambda: encoder.encode_tiles(frame, fmt='jpeg'), args.frames),
+                    'zlib_tiles': measure(lambda: encoder.encode_tiles(frame, fmt='zlib'), args.frames),
+                }
+            finally:
+                encoder.shutdown()
+            base = entry[f"workers_{worker_counts[0]}"]['png']['fps']
+            entry[f"workers_{workers}"]['png_speedup'] = round(entry[f"workers_{workers}"]['png']['fps'] / base, 2)
+            print(f"✅ {name} بـ {workers} عامل: PNG {entry[f'workers_{workers}']['png']['fps']} إطار/ث",
+                  file=sys.stderr)
+        results['resolutions'][name] = entry
+
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
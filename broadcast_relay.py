@@ -0,0 +1,610 @@
+#!/usr/bin/env python3
+"""
+Broadcast Relay - بث سطح مكتب واحد لمئات المشاهدين (للعرض فقط)
+مصدر واحد يرمز كل تحديث مرة واحدة (إطار مفتاحي zlib أو فروقات المربعات بصيغة session_recorder) وينشره لطبقة مرحلات
+توزعه على المشاهدين؛ المرحلات تمرر الرسائل كما هي دون فك، ويمكن ربطها بسلسلة عبر العمليات أو الأجهزة،
+فتبقى تكلفة المصدر (المعالج والعرض النطاقي) ثابتة مهما زاد عدد المشاهدين.
+كل مشاهد له طابور محدود بالبايتات: المشاهد البطيء الذي يتجاوزه ينتقل إلى الإطارات المفتاحية فقط بدل أن يعطل الآخرين،
+ويعود للفروقات بعد VNC_RELAY_RECOVER_AFTER ثانية دون تجاوز
+
+المصدر والمرحلات تستمع على 127.0.0.1 افتراضياً، وكل تابع يجيب أولاً تحدي HMAC بالسر المشترك (ملف كلمة مرور VNC)
+قبل أن يستلم أي إطار
+
+البروتوكول (TCP): تحدٍ VBR1 + 16 بايت عشوائية ← HMAC-SHA256 من التابع، ثم رسائل <BQdII (النوع، التسلسل، زمن المصدر، CRC32 للإطار الناتج أو 0، الطول) + البيانات
+    0 HELLO     JSON بالأبعاد وصيغة البكسل
+    1 KEYFRAME  zlib للإطار كاملاً
+    2 DELTA     فروقات (تُطبق فقط إن كان تسلسلها تالياً لآخر رسالة طُبقت)
+
+الاستخدام:
+    python broadcast_relay.py source --display :1 --port 5950
+    python broadcast_relay.py relay --upstream 127.0.0.1:5950 --port 5951
+    python broadcast_relay.py viewers --upstream 127.0.0.1:5951 --count 100 --slow 5
+    python broadcast_relay.py source --synthetic 1280x720 --port 0 --stats-interval 1
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import hmac
+import socket
+import hashlib
+import struct
+import asyncio
+import argparse
+import threading
+import statistics
+import logging
+from collections import deque
+from pathlib import Path
+
+from import_profiler import lazy_import
+
+np = lazy_import('numpy')
+
+logger = logging.getLogger(__name__)
+
+# تشغيل المصدر مع مدير الواجهات المتعددة بدلاً من x11vnc إضافي للعرض فقط
+BROADCAST_ENABLED = os.environ.get("VNC_BROADCAST", "0") == "1"
+BROADCAST_PORT = int(os.environ.get("VNC_BROADCAST_PORT", "5950"))
+BROADCAST_HOST = os.environ.get("VNC_BROADCAST_HOST", "127.0.0.1")
+
+# السر المشترك للمصادقة: ملف كلمة مرور VNC نفسه الذي تحمي به خوادم x11vnc
+KEY_FILE = os.environ.get("VNC_BROADCAST_KEY_FILE", str(Path.home() / ".vnc" / "passwd"))
+AUTH_MAGIC = b"VBR1"
+AUTH_NONCE = 16
+AUTH_TIMEOUT = 5.0
+
+KEYFRAME_INTERVAL = float(os.environ.get("VNC_BROADCAST_KEYFRAME_INTERVAL", "2"))
+QUEUE_LIMIT = int(os.environ.get("VNC_RELAY_QUEUE_KB", "1024")) * 1024
+RECOVER_AFTER = float(os.environ.get("VNC_RELAY_RECOVER_AFTER", "10"))
+CHECKSUM = os.environ.get("VNC_BROADCAST_CHECKSUM", "0") == "1"
+
+# مخزن إرسال صغير للنواة حتى يظهر بطء التابع في طابوره لا في ذاكرة النواة
+SEND_BUFFER = 64 * 1024
+
+HELLO, KEYFRAME, DELTA = 0, 1, 2
+HEADER = struct.Struct("<BQdII")
+
+def pack_message(kind, seq, payload, crc=0, timestamp=None):
+    return HEADER.pack(kind, seq, time.time() if timestamp is None else timestamp, crc, len(payload)) + payload
+
+async def read_message(reader):
+    """(النوع، التسلسل، الزمن، CRC، الرسالة كاملة، البيانات)"""
+    header = await reader.readexactly(HEADER.size)
+    kind, seq, timestamp, crc, length = HEADER.unpack(header)
+    payload = await reader.readexactly(length)
+    return kind, seq, timestamp, crc, header + payload, payload
+
+def load_key(path=KEY_FILE):
+    """السر المشترك من ملف كلمة المرور (يُستخدم كما هو بايتاتٍ)"""
+    key = Path(path).read_bytes()
+    if not key:
+        raise ValueError(f"ملف المفتاح فارغ: {path}")
+    return key
+
+def auth_digest(key, nonce):
+    return hmac.new(key, AUTH_MAGIC + nonce, hashlib.sha256).digest()
+
+async def authenticate_downstream(reader, writer, key):
+    """تحدٍّ للتابع قبل أي بيانات: يثبت معرفة السر دون إرساله"""
+    nonce = os.urandom(AUTH_NONCE)
+    writer.write(AUTH_MAGIC + nonce)
+    try:
+        answer = await asyncio.wait_for(reader.readexactly(hashlib.sha256().digest_size), AUTH_TIMEOUT)
+    except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+        return False
+    return hmac.compare_digest(answer, auth_digest(key, nonce))
+
+async def authenticate_upstream(reader, writer, key):
+    """الإجابة على تحدي المصدر أو المرحل الأعلى"""
+    challenge = await reader.readexactly(len(AUTH_MAGIC) + AUTH_NONCE)
+    if not challenge.startswith(AUTH_MAGIC):
+        raise ConnectionError("الطرف الآخر ليس مصدر بث")
+    writer.write(auth_digest(key, challenge[len(AUTH_MAGIC):]))
+
+def parse_address(address):
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+class Downstream:
+    """طابور مشاهد أو مرحل تابع: محدود بالبايتات، والمتأخر ينتقل إلى الإطارات المفتاحية فقط"""
+
+    def __init__(self, writer, limit=QUEUE_LIMIT):
+        self.writer = writer
+        self.limit = limit
+        self.pending = deque()
+        self.pending_bytes = 0
+        self.keyframes_only = False
+        self.lagged_at = 0.0
+        self.bytes_sent = 0
+        self.dropped = 0
+        self.demotions = 0
+        self._ready = asyncio.Event()
+
+    def push(self, message, kind, force=False):
+        if force:
+            self._append(message)
+            return
+        if self.keyframes_only:
+            if kind != KEYFRAME:
+                self.dropped += 1
+                return
+            # يكفي أحدث إطار مفتاحي لم يبدأ إرساله
+            self.dropped += len(self.pending)
+            self.pending.clear()
+            self.pending_bytes = 0
+            if time.monotonic() - self.lagged_at >= RECOVER_AFTER:
+                self.keyframes_only = False
+            self._append(message)
+            return
+        if self.pending_bytes + len(message) > self.limit:
+            self.dropped += len(self.pending) + 1
+            self.pending.clear()
+            self.pending_bytes = 0
+            self.keyframes_only = True
+            self.lagged_at = time.monotonic()
+            self.demotions += 1
+            if kind == KEYFRAME:
+                self._append(message)
+            return
+        self._append(message)
+
+    def _append(self, message):
+        self.pending.append(message)
+        self.pending_bytes += len(message)
+        self._ready.set()
+
+    async def run(self):
+        while True:
+            if not self.pending:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            message = self.pending.popleft()
+            self.pending_bytes -= len(message)
+            self.writer.write(message)
+            await self.writer.drain()
+            self.bytes_sent += len(message)
+
+class Fanout:
+    """نشر الرسائل لكل التابعين مع الاحتفاظ بآخر إطار مفتاحي وفروقاته للمنضمين الجدد"""
+
+    def __init__(self, key):
+        self.key = key
+        self.hello = None
+        self.gop = []
+        self.downstream = set()
+        self.messages = 0
+        self.bytes_in = 0
+        self.last_seq = 0
+        self.closed_bytes = 0
+        self.closed_dropped = 0
+        self.closed_demotions = 0
+
+    def publish(self, kind, seq, message):
+        self.messages += 1
+        self.bytes_in += len(message)
+        self.last_seq = seq
+        if kind == HELLO:
+            self.hello = message
+            self.gop = []
+        elif kind == KEYFRAME:
+            self.gop = [message]
+        elif self.gop:
+            self.gop.append(message)
+        for client in list(self.downstream):
+            client.push(message, kind, force=kind == HELLO)
+
+    async def serve(self, reader, writer):
+        """تابع جديد: المصادقة، ثم HELLO وآخر إطار مفتاحي وفروقاته، ثم البث الحي"""
+        if not await authenticate_downstream(reader, writer, self.key):
+            logger.warning(f"⚠️ رفض تابع لم يثبت السر المشترك: {writer.get_extra_info('peername')}")
+            writer.close()
+            return
+        sock = writer.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER)
+        client = Downstream(writer)
+        for message in ([self.hello] if self.hello else []) + self.gop:
+            client.push(message, None, force=True)
+        self.downstream.add(client)
+        try:
+            await client.run()
+        except (ConnectionError, asyncio.IncompleteReadError, OSError):
+            pass
+        finally:
+            self.downstream.discard(client)
+            self.closed_bytes += client.bytes_sent
+            self.closed_dropped += client.dropped
+            self.closed_demotions += client.demotions
+            writer.close()
+
+    def get_status(self):
+        clients = list(self.downstream)
+        return {
+            'downstream': len(clients),
+            'keyframes_only': sum(c.keyframes_only for c in clients),
+            'demotions': self.closed_demotions + sum(c.demotions for c in clients),
+            'dropped': self.closed_dropped + sum(c.dropped for c in clients),
+            'messages': self.messages,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.closed_bytes + sum(c.bytes_sent for c in clients),
+            'gop': len(self.gop),
+            'last_seq': self.last_seq,
+        }
+
+class BroadcastSource:
+    """المصدر: يرمز كل تحديث مرة واحدة من خيط الالتقاط ويسلمه لحلقة الأحداث"""
+
+    def __init__(self, fanout, loop, keyframe_interval=KEYFRAME_INTERVAL, checksum=CHECKSUM):
+        self.fanout = fanout
+        self.loop = loop
+        self.keyframe_interval = keyframe_interval
+        self.checksum = checksum
+        self.seq = 0
+        self.info = None
+        # () -> (الإصدار، نسخة من الإطار) مأخوذة تحت قفل كاتب الإطار
+        self.snapshot = None
+        self._version = 0
+        self._last_keyframe = 0.0
+        self._stale = False
+        self._lock = threading.Lock()
+
+    def start_stream(self, info, version, frame):
+        with self._lock:
+            self.info = info
+            self._send(HELLO, json.dumps(info).encode())
+            self._keyframe(version, frame)
+
+    def _send(self, kind, payload, frame=None):
+        self.seq += 1
+        crc = zlib.crc32(frame) if self.checksum and frame is not None else 0
+        message = pack_message(kind, self.seq, payload, crc)
+        self.loop.call_soon_threadsafe(self.fanout.publish, kind, self.seq, message)
+
+    def _keyframe(self, version, frame):
+        # يُستدعى تحت self._lock: الإصدار والتسلسل والإطار تتقدم معاً
+        self._version = version
+        self._last_keyframe = time.monotonic()
+        self._stale = False
+        self._send(KEYFRAME, zlib.compress(frame.tobytes(), 1), frame)
+
+    def publish_update(self, frame, version, update):
+        """تحديث من كاتب الإطار: فروقات، أو إطار مفتاحي عند حلول موعده"""
+        from session_recorder import encode_delta
+
+        with self._lock:
+            if version <= self._version:
+                # إطار مفتاحي سابق يتضمن هذا التحديث، وإعادة نسخ CopyRect عليه تفسد الإطار
+                return
+            if time.monotonic() - self._last_keyframe >= self.keyframe_interval:
+                self._keyframe(version, frame)
+                return
+            bpp = self.info['bytes_per_pixel']
+            pixels = [frame[y:y + h, x * bpp:(x + w) * bpp].tobytes() for x, y, w, h in update['rects']]
+            self._version = version
+            self._stale = True
+            self._send(DELTA, encode_delta(update['copies'], update['rects'], pixels), frame)
+
+    def idle_keyframe(self):
+        """إطار مفتاحي بعد السكون حتى يلحق المشاهدون المتأخرون بآخر حالة"""
+        with self._lock:
+            if not self._stale or time.monotonic() - self._last_keyframe < self.keyframe_interval:
+                return
+            version, frame = self.snapshot()
+            if frame.shape != (self.info['height'], self.info['stride']):
+                # تغيرت الدقة ولم يصل HELLO الجديد بعد
+                return
+            self._keyframe(version, frame)
+
+    def attach_stage(self, stage):
+        """ربط المصدر بمرحلة التقاط حقيقية"""
+        def snapshot():
+            with stage._lock:
+                return stage.version, stage.frame.copy()
+
+        def restart():
+            with stage._lock:
+                framebuffer = stage.framebuffer
+                info = {'width': stage.width, 'height': stage.height, 'stride': framebuffer.pixels.shape[1],
+                        'bytes_per_pixel': framebuffer.bytes_per_pixel, 'pixel_format': stage.pixel_format}
+                version, frame = stage.version, stage.frame.copy()
+            self.start_stream(info, version, frame)
+
+        def on_frame(stage, version, update):
+            try:
+                if stage.frame.shape != (self.info['height'], self.info['stride']):
+                    # أُعيد فتح ملف الإطار بدقة جديدة: HELLO جديد وإطار مفتاحي
+                    restart()
+                else:
+                    # خيط الالتقاط هو الكاتب الوحيد، فالإطار ثابت أثناء المشترك
+                    self.publish_update(stage.frame, version, update)
+            except Exception as e:
+                logger.error(f"خطأ في ترميز البث: {e}")
+
+        self.snapshot = snapshot
+        restart()
+        stage.subscribe(on_frame)
+
+class SyntheticDesktop:
+    """سطح مكتب اصطناعي (كتابة وتمرير طرفية) لاختبار الشجرة دون Xvfb"""
+
+    BYTES_PER_PIXEL = 4
+    PIXEL_FORMAT = {'bits_per_pixel': 32, 'depth': 24, 'big_endian': False,
+                    'red_mask': 0xFF0000, 'green_mask': 0xFF00, 'blue_mask': 0xFF}
+
+    def __init__(self, width, height, seed=1):
+        from tile_diff import TileDiffer
+
+        self.width = width
+        self.height = height
+        self.rng = np.random.default_rng(seed)
+        self.pixels = np.zeros((height, width, self.BYTES_PER_PIXEL), dtype=np.uint8)
+        self.pixels[:] = (165, 110, 58, 0)
+        self.terminal = (slice(height // 10, height - height // 10), slice(width // 10, width // 2))
+        window = self.pixels[self.terminal]
+        window[:] = 0
+        window[self.rng.random(window.shape[:2]) < 0.2] = (0, 255, 0, 0)
+        self.frame = self.pixels.reshape(height, -1)
+        self.differ = TileDiffer(bytes_per_pixel=self.BYTES_PER_PIXEL)
+        self.differ.diff(self.frame)
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def snapshot(self):
+        with self._lock:
+            return self.version, self.frame.copy()
+
+    def step(self):
+        """نشاط إطار واحد؛ (الإطار، الإصدار، التحديث) أو None عند الخمول"""
+        with self._lock:
+            return self._step()
+
+    def _step(self):
+        window = self.pixels[self.terminal]
+        roll = self.rng.random()
+        if roll < 0.5:
+            y, x = (int(self.rng.integers(0, n - 16)) for n in window.shape[:2])
+            window[y:y + 14, x:x + 8] = (0, 255, 0, 0)
+        elif roll < 0.6:
+            lines = 15
+            window[:-lines] = window[lines:].copy()
+            window[-lines:] = 0
+            window[-lines:][self.rng.random((lines, window.shape[1])) < 0.2] = (0, 255, 0, 0)
+        else:
+            return None
+        update = self.differ.diff(self.frame)
+        if not update['rects'] and not update['copies']:
+            return None
+        self.version += 1
+        return self.frame, self.version, update
+
+    def run(self, source, fps):
+        info = {'width': self.width, 'height': self.height, 'stride': self.width * self.BYTES_PER_PIXEL,
+                'bytes_per_pixel': self.BYTES_PER_PIXEL, 'pixel_format': self.PIXEL_FORMAT}
+        source.snapshot = self.snapshot
+        source.start_stream(info, *self.snapshot())
+        interval = 1.0 / fps
+        next_frame = time.monotonic()
+        while True:
+            result = self.step()
+            if result is not None:
+                source.publish_update(*result)
+            next_frame += interval
+            time.sleep(max(0.0, next_frame - time.monotonic()))
+
+class StreamDecoder:
+    """فك البث لدى المشاهد: الإطار المفتاحي دائماً، والفروقات فقط إن لم يفُت شيء منذ آخر رسالة"""
+
+    def __init__(self, decode=True):
+        self.decode = decode
+        self.info = None
+        self.frame = None
+        self.seq = None
+        self.applied = 0
+        self.skipped = 0
+        self.checksum_errors = 0
+
+    def feed(self, kind, seq, crc, payload):
+        from session_recorder import apply_delta
+
+        if kind == HELLO:
+            self.info = json.loads(payload)
+            self.seq = None
+            return
+        if kind == KEYFRAME:
+            if self.decode:
+                data = zlib.decompress(payload)
+                self.frame = np.frombuffer(data, np.uint8).reshape(self.info['height'], self.info['stride']).copy()
+        elif self.seq is None or seq != self.seq + 1:
+            self.skipped += 1
+            return
+        elif self.decode:
+            apply_delta(self.frame, payload, self.info['bytes_per_pixel'])
+        self.seq = seq
+        self.applied += 1
+        if self.decode and crc and zlib.crc32(self.frame) != crc:
+            self.checksum_errors += 1
+
+class SyntheticViewer:
+    """مشاهد اصطناعي: قراءة البث (بمعدل محدود للمشاهد البطيء) وقياس التأخير والفجوات"""
+
+    def __init__(self, upstream, key, decode=False, rate=None):
+        self.upstream = upstream
+        self.key = key
+        self.rate = rate
+        self.decoder = StreamDecoder(decode)
+        self.keyframes = 0
+        self.deltas = 0
+        self.bytes = 0
+        self.latencies = deque(maxlen=2000)
+
+    async def connect(self):
+        host, port = parse_address(self.upstream)
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if self.rate:
+            # مخزن استقبال صغير حتى يظهر البطء على المرحل فوراً
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 16 * 1024)
+        sock.setblocking(False)
+        await asyncio.get_running_loop().sock_connect(sock, (host, port))
+        return await asyncio.open_connection(sock=sock)
+
+    async def run(self):
+        reader, writer = await self.connect()
+        try:
+            await authenticate_upstream(reader, writer, self.key)
+            while True:
+                kind, seq, timestamp, crc, message, payload = await read_message(reader)
+                self.bytes += len(message)
+                if kind == KEYFRAME:
+                    self.keyframes += 1
+                elif kind == DELTA:
+                    self.deltas += 1
+                self.latencies.append(time.time() - timestamp)
+                self.decoder.feed(kind, seq, crc, payload)
+                if self.rate:
+                    await asyncio.sleep(len(message) / self.rate)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+async def serve_fanout(fanout, host, port):
+    server = await asyncio.start_server(fanout.serve, host, port, backlog=1024)
+    return server, server.sockets[0].getsockname()[1]
+
+async def relay_upstream(fanout, upstream, key):
+    """قراءة المرحل الأعلى وتمرير الرسائل كما هي، مع إعادة الاتصال عند الانقطاع"""
+    delay = 0.5
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection(*parse_address(upstream))
+            await authenticate_upstream(reader, writer, key)
+            logger.info(f"🔗 متصل بالمرحل الأعلى {upstream}")
+            delay = 0.5
+            while True:
+                kind, seq, _, _, message, _ = await read_message(reader)
+                fanout.publish(kind, seq, message)
+        except (ConnectionError, asyncio.IncompleteReadError, OSError) as e:
+            logger.warning(f"⚠️ انقطع الاتصال بالمرحل الأعلى {upstream}: {e}")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 5.0)
+
+async def report_stats(role, port, status, interval):
+    """سطر JSON دوري على stdout (لأدوات القياس)"""
+    while True:
+        await asyncio.sleep(interval)
+        print(json.dumps({'role': role, 'port': port, 'cpu_s': round(time.process_time(), 3), **status()}),
+              flush=True)
+
+async def run_node(args):
+    fanout = Fanout(args.key)
+    server, port = await serve_fanout(fanout, args.host, args.port)
+    print(json.dumps({'role': args.command, 'listening': port}), flush=True)
+    logger.info(f"📡 {args.command} يستمع على المنفذ {port}")
+    tasks = []
+    if args.command == 'source':
+        source = BroadcastSource(fanout, asyncio.get_running_loop(), args.keyframe_interval, args.checksum)
+        if args.synthetic:
+            width, height = (int(v) for v in args.synthetic.split("x"))
+            desktop = SyntheticDesktop(width, height)
+            threading.Thread(target=desktop.run, args=(source, args.fps), daemon=True).start()
+        else:
+            from screen_capture import get_capture_stage
+            stage = get_capture_stage(args.display)
+            if not stage.start():
+                raise RuntimeError(f"لا يوجد ملف إطار للعرض {args.display}")
+            source.attach_stage(stage)
+
+        async def idle_keyframes():
+            while True:
+                await asyncio.sleep(args.keyframe_interval)
+                await asyncio.to_thread(source.idle_keyframe)
+        tasks.append(idle_keyframes())
+    else:
+        tasks.append(relay_upstream(fanout, args.upstream, args.key))
+    if args.stats_interval:
+        tasks.append(report_stats(args.command, port, fanout.get_status, args.stats_interval))
+    async with server:
+        await asyncio.gather(server.serve_forever(), *tasks)
+
+async def run_viewers(args):
+    viewers = [SyntheticViewer(args.upstream, args.key, decode=i < args.decode,
+                               rate=args.slow_rate if i >= args.count - args.slow else None)
+               for i in range(args.count)]
+    tasks = [asyncio.create_task(v.run()) for v in viewers]
+
+    def status():
+        fast = [v for v in viewers if not v.rate]
+        slow = [v for v in viewers if v.rate]
+        latencies = [l for v in fast for l in v.latencies]
+        return {
+            'viewers': len(viewers),
+            'fast': {
+                'keyframes': sum(v.keyframes for v in fast),
+                'deltas': sum(v.deltas for v in fast),
+                'skipped': sum(v.decoder.skipped for v in fast),
+                'latency_median_ms': round(statistics.median(latencies) * 1000, 2) if latencies else None,
+                'latency_p99_ms': round(sorted(latencies)[int(len(latencies) * 0.99)] * 1000, 2) if latencies else None,
+            },
+            'slow': {
+                'count': len(slow),
+                'keyframes': sum(v.keyframes for v in slow),
+                'deltas': sum(v.deltas for v in slow),
+                'skipped': sum(v.decoder.skipped for v in slow),
+            },
+            'decoded': sum(v.decoder.applied for v in viewers if v.decoder.decode),
+            'checksum_errors': sum(v.decoder.checksum_errors for v in viewers),
+        }
+
+    reporter = report_stats('viewers', None, status, args.stats_interval or 1)
+    await asyncio.gather(reporter, *tasks)
+
+def main():
+    """البرنامج الرئيسي"""
+    parser = argparse.ArgumentParser(description="بث سطح مكتب واحد عبر شجرة مرحلات")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    source = sub.add_parser("source", help="المصدر: يرمز التحديثات مرة واحدة")
+    source.add_argument("--display", default=os.environ.get("DISPLAY", ":1"))
+    source.add_argument("--synthetic", metavar="WxH", help="سطح مكتب اصطناعي بدلاً من Xvfb")
+    source.add_argument("--fps", type=float, default=15)
+    source.add_argument("--keyframe-interval", type=float, default=KEYFRAME_INTERVAL)
+    source.add_argument("--checksum", action="store_true", default=CHECKSUM, help="CRC32 للإطار في كل رسالة")
+
+    relay = sub.add_parser("relay", help="مرحل: يمرر البث لتابعيه")
+    relay.add_argument("--upstream", required=True, metavar="HOST:PORT")
+
+    for node in (source, relay):
+        node.add_argument("--host", default=BROADCAST_HOST)
+        node.add_argument("--port", type=int, default=BROADCAST_PORT)
+        node.add_argument("--stats-interval", type=float, default=0)
+
+    viewers = sub.add_parser("viewers", help="مشاهدون اصطناعيون للاختبار")
+    viewers.add_argument("--upstream", required=True, metavar="HOST:PORT")
+    viewers.add_argument("--count", type=int, default=10)
+    viewers.add_argument("--slow", type=int, default=0, help="عدد المشاهدين البطيئين")
+    viewers.add_argument("--slow-rate", type=float, default=64 * 1024, help="بايت/ث للمشاهد البطيء")
+    viewers.add_argument("--decode", type=int, default=1, help="عدد المشاهدين الذين يفكون الإطارات فعلاً")
+    viewers.add_argument("--stats-interval", type=float, default=1)
+
+    for node in (source, relay, viewers):
+        node.add_argument("--key-file", default=KEY_FILE, help="ملف السر المشترك (كلمة مرور VNC)")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    try:
+        args.key = load_key(args.key_file)
+    except (OSError, ValueError) as e:
+        logger.error(f"❌ تعذر قراءة السر المشترك للبث: {e}")
+        sys.exit(1)
+    try:
+        asyncio.run(run_viewers(args) if args.command == "viewers" else run_node(args))
+    except KeyboardInterrupt:
+        logger.info("تم إيقاف البث")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+"""
+قناة المؤشر المنفصلة
+شكل المؤشر وموقعه يُرسلان على قناة خفيفة خاصة (مثل ترميز Cursor الزائف في RFB) ويرسمهما المتصفح فوق الشاشة،
+فلا تُسبب حركة الماوس أي تغيير في الإطار ولا إعادة ترميز: المؤشر مخفي من ملف الإطار عبر XFixes،
+كل شكل يُخزن ببصمته ويُرسل لكل عميل مرة واحدة، والموقع 6 بايتات لكل حدث
+
+الأحداث:
+    cursor_subscribe {display}      ← العميل
+    cursor_move <hh> أو {x, y}      ← العميل (حركة الماوس)
+    cursor_shape {index, hash, ...} → العميل (مرة لكل شكل)
+    cursor_pos <hhH>                → العميل (x، y، رقم الشكل)
+"""
+
+import os
+import io
+import time
+import base64
+import select
+import struct
+import hashlib
+import threading
+import logging
+
+from import_profiler import lazy_import
+
+# NumPy يُحمل عند أول شكل مؤشر فقط (الوحدة تُستورد مع إنشاء التطبيق)
+np = lazy_import('numpy')
+
+logger = logging.getLogger(__name__)
+
+# أقصى معدل لبث الموقع لكل عرض
+CURSOR_MAX_HZ = float(os.environ.get("VNC_CURSOR_MAX_HZ", "60"))
+
+# فاصل استطلاع موقع المؤشر من خادم X (الحركة من عملاء VNC الآخرين)
+CURSOR_POLL_INTERVAL = float(os.environ.get("VNC_CURSOR_POLL_INTERVAL", "0.05"))
+
+POSITION_FORMAT = "<hhH"
+MOVE_FORMAT = "<hh"
+INT16_MIN, INT16_MAX = -32768, 32767
+
+def cursor_room(display):
+    return f"cursor:{display}"
+
+def default_arrow():
+    """مؤشر سهم افتراضي (ARGB) عند عدم توفر XFixes"""
+    height, width = 19, 12
+    image = np.zeros((height, width), dtype=np.uint32)
+    for y in range(height - 3):
+        span = min(y + 1, width)
+        image[y, :span] = 0xFF000000
+        if y > 0:
+            image[y, 1:span - 1] = 0xFFFFFFFF
+    image[height - 3:, 4:7] = 0xFF000000
+    return width, height, 0, 0, image.ravel().tolist()
+
+class CursorShape:
+    """شكل مؤشر مخزن ببصمة محتواه"""
+
+    def __init__(self, index, width, height, hot_x, hot_y, argb):
+        pixels = np.asarray(argb, dtype=np.uint32).reshape(height, width)
+        self.index = index
+        self.width = width
+        self.height = height
+        self.hot_x = hot_x
+        self.hot_y = hot_y
+        self.hash = shape_hash(width, height, hot_x, hot_y, pixels)
+        self.image = self._to_png(pixels)
+
+    @staticmethod
+    def _to_png(pixels):
+        from PIL import Image
+        rgba = np.stack([(pixels >> shift) & 0xFF for shift in (16, 8, 0, 24)], axis=-1).astype(np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(rgba, 'RGBA').save(buffer, format='PNG')
+        return f"data:image/png;base64,{base64.b64encode(buffer.getvalue()).decode()}"
+
+    def to_message(self):
+        return {
+            'index': self.index,
+            'hash': self.hash,
+            'width': self.width,
+            'height': self.height,
+            'hot_x': self.hot_x,
+            'hot_y': self.hot_y,
+            'image': self.image,
+        }
+
+def shape_hash(width, height, hot_x, hot_y, pixels):
+    digest = hashlib.blake2b(struct.pack("<4H", width, height, hot_x, hot_y), digest_size=8)
+    digest.update(np.ascontiguousarray(pixels, dtype=np.uint32).tobytes())
+    return digest.hexdigest()
+
+class XFixesCursorSource:
+    """تغيرات شكل المؤشر من XFixes مع إخفائه من الإطار، وموقعه من query_pointer"""
+
+    def __init__(self, display):
+        from Xlib import display as xdisplay
+        from Xlib.ext import xfixes
+
+        self.connection = xdisplay.Display(display)
+        if not self.connection.has_extension('XFIXES'):
+            self.connection.close()
+            raise RuntimeError("امتداد XFIXES غير متوفر في خادم X")
+        self.connection.xfixes_query_version()
+        self.root = self.connection.screen().root
+        self.connection.xfixes_select_cursor_input(self.root, xfixes.XFixesDisplayCursorNotifyMask)
+        # المؤشر لا يُرسم في ملف الإطار ما دام هذا الاتصال قائماً
+        self.root.xfixes_hide_cursor()
+        self.event_type = self.connection.extension_event.DisplayCursorNotify
+        self.connection.flush()
+
+    def cursor_image(self):
+        image = self.connection.xfixes_get_cursor_image(self.root)
+        return image.width, image.height, image.xhot, image.yhot, image.cursor_image
+
+    def wait(self, timeout):
+        """انتظار تغير الشكل (True) أو انتهاء المهلة"""
+        if not self.connection.pending_events():
+            readable, _, _ = select.select([self.connection.fileno()], [], [], timeout)
+            if not readable:
+                return False
+        changed = False
+        while self.connection.pending_events():
+            event = self.connection.next_event()
+            if (event.type, getattr(event, 'sub_code', None)) == self.event_type:
+                changed = True
+        return changed
+
+    def position(self):
+        pointer = self.root.query_pointer()
+        return pointer.root_x, pointer.root_y
+
+    def move(self, x, y):
+        """تحريك المؤشر الحقيقي في خادم X"""
+        self.root.warp_pointer(x, y)
+        self.connection.flush()
+
+    def close(self):
+        try:
+            self.root.xfixes_show_cursor()
+            self.connection.close()
+        except Exception:
+            pass
+
+class CursorTracker:
+    """حالة المؤشر لعرض واحد: الأشكال المخزنة والموقع والعملاء الذين استلموا كل شكل"""
+
+    def __init__(self, display, socketio=None):
+        self.display = display
+        self.socketio = socketio
+        self.shapes = {}
+        self.current = None
+        self.x = 0
+        self.y = 0
+        self.source = None
+        self._sent = {}
+        self._last_broadcast = 0.0
+        self._pending = False
+        self._lock = threading.Lock()
+        self._thread = None
+        self._running = False
+        self.set_shape(*default_arrow())
+
+    def start(self):
+        """بدء متابعة XFixes إن كانت متاحة (مرة واحدة)"""
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+        try:
+            self.source = XFixesCursorSource(self.display)
+            self.set_shape(*self.source.cursor_image())
+        except Exception as e:
+            logger.info(f"ℹ️ XFixes غير متاح للعرض {self.display} ({e})، الموقع من إدخال العملاء فقط")
+            self.source = None
+            return
+        self._thread = threading.Thread(target=self._run, daemon=True, name=f"cursor{self.display}")
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+
+    def _run(self):
+        while self._running:
+            try:
+                if self.source.wait(CURSOR_POLL_INTERVAL):
+                    if self.set_shape(*self.source.cursor_image()):
+                        self.broadcast_shape()
+                self.update_position(*self.source.position(), from_x=True)
+            except Exception as e:
+                logger.error(f"خطأ في متابعة المؤشر {self.display}: {e}")
+                time.sleep(1)
+        self.source.close()
+
+    def set_shape(self, width, height, hot_x, hot_y, argb):
+        """تسجيل الشكل الحالي؛ True إن تغير الشكل"""
+        pixels = np.asarray(argb, dtype=np.uint32).reshape(height, width)
+        key = shape_hash(width, height, hot_x, hot_y, pixels)
+        with self._lock:
+            shape = self.shapes.get(key)
+            if shape is None:
+                shape = CursorShape(len(self.shapes), width, height, hot_x, hot_y, pixels)
+                self.shapes[key] = shape
+            changed = shape is not self.current
+            self.current = shape
+        return changed
+
+    def position_message(self):
+        """رسالة الموقع: 6 بايتات (x، y، رقم الشكل)"""
+        return struct.pack(POSITION_FORMAT, self.x, self.y, self.current.index)
+
+    def update_position(self, x, y, origin=None, from_x=False):
+        """تحديث الموقع وبثه لبقية العملاء (بحد أقصى CURSOR_MAX_HZ)؛ لا يمس الإطار"""
+        # الموقع يُحزم int16 في رسالة cursor_pos: قيمة خارج المدى من عميل تكسر البث للجميع
+        x = min(max(int(x), INT16_MIN), INT16_MAX)
+        y = min(max(int(y), INT16_MIN), INT16_MAX)
+        if (x, y) == (self.x, self.y):
+            return False
+        self.x, self.y = x, y
+        if self.source and not from_x:
+            self.source.move(x, y)
+        wait = 1.0 / CURSOR_MAX_HZ - (time.monotonic() - self._last_broadcast)
+        if wait > 0:
+            # آخر موقع فقط يُبث عند انتهاء الفاصل
+            if not self._pending:
+                self._pending = True
+                threading.Timer(wait, self._flush, args=(origin,)).start()
+            return True
+        self._last_broadcast = time.monotonic()
+        self.broadcast_position(skip_sid=origin)
+        return True
+
+    def _flush(self, origin=None):
+        self._pending = False
+        self._last_broadcast = time.monotonic()
+        self.broadcast_position(skip_sid=origin)
+
+    def broadcast_position(self, skip_sid=None):
+        if self.socketio is not None:
+            self.socketio.emit('cursor_pos', self.position_message(), to=cursor_room(self.display), skip_sid=skip_sid)
+
+    def broadcast_shape(self):
+        """إرسال الشكل الحالي لمن لم يستلمه فقط، ثم الموقع بالرقم الجديد"""
+        if self.socketio is None:
+            return
+        for sid in list(self._sent):
+            self.send_shape(sid)
+        self.broadcast_position()
+
+    def send_shape(self, sid):
+        shape = self.current
+        sent = self._sent.setdefault(sid, set())
+        if shape.hash in sent:
+            return False
+        sent.add(shape.hash)
+        self.socketio.emit('cursor_shape', shape.to_message(), to=sid)
+        return True
+
+    def subscribe(self, sid):
+        from flask_socketio import join_room
+        join_room(cursor_room(self.display), sid=sid)
+        self.send_shape(sid)
+        self.socketio.emit('cursor_pos', self.position_message(), to=sid)
+
+    def unsubscribe(self, sid):
+        self._sent.pop(sid, None)
+
+    def get_status(self):
+        return {
+            'display': self.display,
+            'source': 'xfixes' if self.source else 'client',
+            'position': [self.x, self.y],
+            'shapes': len(self.shapes),
+            'subscribers': len(self._sent),
+        }
+
+# متتبعات المؤشر مفهرسة برقم العرض
+_trackers = {}
+_trackers_lock = threading.Lock()
+
+def get_cursor_tracker(display, socketio=None):
+    """الحصول على متتبع المؤشر المشترك لعرض (وبدؤه عند الحاجة)
+    None لعرض لا يكتب Xvfb إطاره: لا تُفتح اتصالات X لعناوين يرسلها العملاء"""
+    with _trackers_lock:
+        tracker = _trackers.get(display)
+    if tracker is None:
+        from screen_capture import find_displays
+        displays = find_displays()
+        if display not in displays:
+            return None
+        # التحقق عند الإنشاء فقط، ومعه إزالة متتبعات العروض المنتهية
+        for stale in [d for d in list(_trackers) if d not in displays]:
+            forget_cursor_display(stale)
+        with _trackers_lock:
+            tracker = _trackers.setdefault(display, CursorTracker(display, socketio))
+    if socketio is not None and tracker.socketio is None:
+        tracker.socketio = socketio
+    tracker.start()
+    return tracker
+
+# العرض الذي اشترك فيه كل عميل (الصيغة الثنائية لـ cursor_move لا تحمل العرض)
+_client_displays = {}
+
+def forget_cursor_display(display):
+    """إيقاف متتبع عرض انتهى وإزالته (يُغلق اتصال XFixes عند خروج خيطه)"""
+    with _trackers_lock:
+        tracker = _trackers.pop(display, None)
+    if tracker is not None:
+        tracker.stop()
+        logger.info(f"🗑️ إزالة متتبع المؤشر للعرض {display}")
+    for sid, subscribed in list(_client_displays.items()):
+        if subscribed == display:
+            _client_displays.pop(sid, None)
+
+def default_display():
+    from screen_capture import find_active_display
+    return find_active_display() or os.environ.get("DISPLAY", ":1")
+
+def register_cursor_events(socketio):
+    """تسجيل أحداث قناة المؤشر"""
+    from flask import request
+
+    @socketio.on('cursor_subscribe')
+    def handle_cursor_subscribe(data=None):
+        display = (data or {}).get('display') or default_display()
+        tracker = get_cursor_tracker(display, socketio)
+        if tracker is None:
+            return
+        _client_displays[request.sid] = display
+        tracker.subscribe(request.sid)
+
+    @socketio.on('cursor_move')
+    def handle_cursor_move(data):
+        # الصيغة الثنائية المختصرة (4 بايتات) أو قاموس
+        if isinstance(data, (bytes, bytearray)):
+            x, y = struct.unpack(MOVE_FORMAT, bytes(data[:4]))
+            display = _client_displays.get(request.sid) or default_display()
+        else:
+            x, y = data.get('x', 0), data.get('y', 0)
+            display = data.get('display') or _client_displays.get(request.sid) or default_display()
+        tracker = get_cursor_tracker(display, socketio)
+        if tracker is not None:
+            tracker.update_position(x, y, origin=request.sid)
+
+def forget_client(sid):
+    """نسيان الأشكال المرسلة لعميل منقطع وعرضه"""
+    _client_displays.pop(sid, None)
+    for tracker in list(_trackers.values()):
+        tracker.unsubscribe(sid)
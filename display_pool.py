@@ -0,0 +1,318 @@
+"""
+مجمع الشاشات الافتراضية المسخنة مسبقاً
+يحتفظ بعدد قابل للضبط من حزم Xvfb + مدير نوافذ جاهزة، يسلمها للجلسات الجديدة فوراً ويعيد تدويرها بعد الانفصال
+"""
+
+import os
+import shutil
+import subprocess
+import threading
+import time
+import logging
+from pathlib import Path
+
+from performance_profiles import xvfb_flags
+from process_groups import get_process_group, wait_for_display
+from shutdown_coordinator import ShutdownCoordinator
+
+logger = logging.getLogger(__name__)
+
+class DisplayPoolExhausted(Exception):
+    """لا توجد سعة متاحة لشاشة جديدة"""
+
+class PooledDisplay:
+    """شاشة افتراضية من المجمع (Xvfb + مدير النوافذ)"""
+
+    def __init__(self, pool, number, group, resolution, color_depth):
+        self.pool = pool
+        self.number = number
+        self.display = f":{number}"
+        self.group = group
+        # تطبيقات الجلسة في مجموعة مستقلة تُنهى كاملة (مع أحفادها) عند الإعادة
+        self.session_group = get_process_group(f"display-pool:{number}:session")
+        self.resolution = resolution
+        self.color_depth = color_depth
+        self.xvfb_process = None
+        self.wm_process = None
+        self.session_processes = []
+        self.owner = None
+        self.leased_at = None
+
+    @property
+    def xvfb_pid(self):
+        return self.xvfb_process.pid if self.xvfb_process else None
+
+    @property
+    def wm_pid(self):
+        return self.wm_process.pid if self.wm_process else None
+
+    def is_healthy(self):
+        """هل ما زالت الحزمة الأساسية تعمل"""
+        return self.xvfb_process is not None and self.xvfb_process.poll() is None
+
+    def spawn(self, cmd, **kwargs):
+        """تشغيل عملية خاصة بالجلسة على هذه الشاشة"""
+        kwargs.setdefault('env', dict(os.environ, DISPLAY=self.display))
+        process = self.session_group.spawn(cmd, **kwargs)
+        self.session_processes.append(process)
+        return process
+
+    def release(self):
+        """إعادة الشاشة إلى المجمع"""
+        return self.pool.release(self)
+
+    def has_client_windows(self):
+        """هل بقيت نوافذ عملاء على الشاشة؛ None إن لم تتوفر أداة للفحص"""
+        env = dict(os.environ, DISPLAY=self.display)
+        for cmd in (["wmctrl", "-l"], ["xdotool", "search", "--onlyvisible", "--name", ""]):
+            if shutil.which(cmd[0]) is None:
+                continue
+            try:
+                result = subprocess.run(cmd, env=env, capture_output=True, text=True, timeout=2)
+            except (OSError, subprocess.TimeoutExpired):
+                continue
+            return bool(result.stdout.strip())
+        return None
+
+    def stop(self, grace_period=None):
+        """إيقاف الشاشة كاملة: تطبيقات الجلسة ثم Xvfb ومدير النوافذ"""
+        self.session_group.stop(grace_period)
+        return self.group.stop(grace_period)
+
+    def to_dict(self):
+        return {
+            'display': self.display,
+            'resolution': self.resolution,
+            'color_depth': self.color_depth,
+            'owner': self.owner,
+            'leased_at': self.leased_at,
+            'session_processes': sum(1 for p in self.session_processes if p.poll() is None),
+            'healthy': self.is_healthy()
+        }
+
+class DisplayPool:
+    """مجمع شاشات Xvfb مسخنة مسبقاً مع حدود مبنية على الذاكرة"""
+
+    def __init__(self):
+        self.base_display = int(os.environ.get("VNC_POOL_BASE_DISPLAY", "1"))
+        self.warm_size = int(os.environ.get("VNC_POOL_WARM", "1"))
+        self.max_displays = int(os.environ.get("VNC_POOL_MAX", "8"))
+        self.memory_per_display_mb = int(os.environ.get("VNC_DISPLAY_MEMORY_MB", "256"))
+        self.memory_reserve_mb = int(os.environ.get("VNC_POOL_RESERVE_MB", "512"))
+        self.screen_resolution = os.environ.get("VNC_POOL_RESOLUTION", "1024x768")
+        self.color_depth = int(os.environ.get("VNC_POOL_DEPTH", "24"))
+        self.window_manager = ["openbox", "--config-file", "/dev/null"]
+
+        self._lock = threading.Condition()
+        self._warm = []
+        self._leased = {}
+        self._starting = set()
+        self._refill_thread = None
+        self._running = False
+
+    # ---- السعة ----
+
+    def _memory_allows_new_display(self):
+        """التحقق من أن الذاكرة المتاحة تكفي لشاشة إضافية"""
+        try:
+            import psutil
+            available_mb = psutil.virtual_memory().available / (1024 * 1024)
+        except Exception:
+            return True
+        return available_mb - self.memory_reserve_mb >= self.memory_per_display_mb
+
+    def _has_capacity(self):
+        total = len(self._warm) + len(self._leased) + len(self._starting)
+        return total < self.max_displays and self._memory_allows_new_display()
+
+    def _next_free_number(self):
+        """أول رقم عرض غير مستخدم من المجمع أو من خوادم X أخرى"""
+        in_use = {d.number for d in self._warm} | set(self._leased) | self._starting
+        number = self.base_display
+        while (number in in_use
+               or Path(f"/tmp/.X11-unix/X{number}").exists()
+               or Path(f"/tmp/.X{number}-lock").exists()):
+            number += 1
+        return number
+
+    # ---- التشغيل ----
+
+    def _launch(self, number):
+        """تشغيل حزمة Xvfb + مدير نوافذ على العرض المحدد"""
+        started = time.monotonic()
+        group = get_process_group(f"display-pool:{number}")
+        pooled = PooledDisplay(self, number, group, self.screen_resolution, self.color_depth)
+
+        pooled.xvfb_process = group.spawn([
+            "Xvfb", pooled.display,
+            "-screen", "0", f"{self.screen_resolution}x{self.color_depth}",
+            "-ac", "+extension", "GLX", *xvfb_flags(pooled.display), "-noreset"
+        ])
+        if not wait_for_display(pooled.display, process=pooled.xvfb_process):
+            pooled.stop()
+            raise RuntimeError(f"لم يصبح العرض {pooled.display} جاهزاً")
+
+        try:
+            pooled.wm_process = group.spawn(
+                self.window_manager,
+                env=dict(os.environ, DISPLAY=pooled.display)
+            )
+        except FileNotFoundError:
+            logger.warning(f"⚠️ مدير النوافذ غير موجود: {self.window_manager[0]}")
+
+        logger.info(f"✅ شاشة مسخنة جاهزة {pooled.display} خلال {time.monotonic() - started:.2f} ثانية")
+        return pooled
+
+    def _start_display(self):
+        """حجز رقم وتشغيل شاشة جديدة خارج القفل"""
+        with self._lock:
+            if not self._has_capacity():
+                return None
+            number = self._next_free_number()
+            self._starting.add(number)
+        try:
+            return self._launch(number)
+        finally:
+            with self._lock:
+                self._starting.discard(number)
+                self._lock.notify_all()
+
+    def _refill(self):
+        """الحفاظ على عدد الشاشات المسخنة"""
+        while self._running:
+            with self._lock:
+                healthy = {d: d.is_healthy() for d in self._warm}
+                unhealthy = [d for d, ok in healthy.items() if not ok]
+                self._warm = [d for d, ok in healthy.items() if ok]
+            # إيقاف ما تبقى من الحزم المعطلة (مدير النوافذ أو Xvfb نصف الميت) خارج القفل
+            for pooled in unhealthy:
+                logger.warning(f"⚠️ إزالة العرض المعطل {pooled.display} من الشاشات المسخنة")
+                pooled.stop(0)
+            with self._lock:
+                needed = self.warm_size - len(self._warm) - len(self._starting)
+                if needed <= 0 or not self._has_capacity():
+                    self._lock.wait(timeout=5)
+                    continue
+            try:
+                pooled = self._start_display()
+            except Exception as e:
+                logger.error(f"خطأ في تسخين شاشة جديدة: {e}")
+                time.sleep(5)
+                continue
+            with self._lock:
+                if pooled is None:
+                    self._lock.wait(timeout=5)
+                    continue
+                self._warm.append(pooled)
+                self._lock.notify_all()
+
+    def is_available(self):
+        """هل يمكن تشغيل شاشات حقيقية على هذا المضيف"""
+        return shutil.which("Xvfb") is not None
+
+    def start(self):
+        """بدء التسخين المسبق في الخلفية"""
+        if not self.is_available():
+            logger.warning("⚠️ Xvfb غير متوفر، مجمع الشاشات معطل")
+            return False
+        with self._lock:
+            if self._running:
+                return True
+            self._running = True
+        self._refill_thread = threading.Thread(target=self._refill, daemon=True)
+        self._refill_thread.start()
+        logger.info(f"✅ تم بدء مجمع الشاشات ({self.warm_size} مسخنة، حد أقصى {self.max_displays})")
+        return True
+
+    # ---- الإعارة ----
+
+    def acquire(self, owner=None):
+        """الحصول على شاشة جاهزة (فورية إن وُجدت شاشة مسخنة)"""
+        with self._lock:
+            while self._warm:
+                pooled = self._warm.pop(0)
+                if pooled.is_healthy():
+                    break
+                pooled.stop(0)
+            else:
+                pooled = None
+
+        if pooled is None:
+            # بدء بارد عند نفاد الشاشات المسخنة
+            if not self.is_available():
+                raise DisplayPoolExhausted("Xvfb غير متوفر")
+            pooled = self._start_display()
+            if pooled is None:
+                raise DisplayPoolExhausted("تم بلوغ حد الشاشات أو الذاكرة المتاحة")
+
+        with self._lock:
+            pooled.owner = owner
+            pooled.leased_at = time.time()
+            self._leased[pooled.number] = pooled
+            # إيقاظ خيط التسخين لتعويض الشاشة المعارة
+            self._lock.notify_all()
+        logger.info(f"📺 تم تسليم العرض {pooled.display} للجلسة {owner or ''}")
+        return pooled
+
+    def release(self, pooled):
+        """إنهاء عمليات الجلسة وإعادة تدوير الشاشة"""
+        with self._lock:
+            self._leased.pop(pooled.number, None)
+
+        # إيقاف مجموعة الجلسة كاملة (مع الأحفاد) مع الإبقاء على Xvfb ومدير النوافذ
+        report = pooled.session_group.stop()
+        pooled.session_processes = []
+        pooled.owner = None
+        pooled.leased_at = None
+
+        # التطبيقات التي غيرت مجموعتها (setsid) تفلت من الإيقاف، فلا تُعار الشاشة وعليها نوافذ الجلسة السابقة
+        windows = pooled.has_client_windows()
+        clean = windows is False or (windows is None and pooled.session_group.cgroup is not None)
+        if not clean:
+            logger.info(f"🧹 تعذر التأكد من خلو العرض {pooled.display} من نوافذ الجلسة السابقة، لن يُعاد تدويره")
+
+        with self._lock:
+            if clean and pooled.is_healthy() and self._running and len(self._warm) < self.warm_size:
+                self._warm.append(pooled)
+                self._lock.notify_all()
+                logger.info(f"♻️ تمت إعادة تدوير العرض {pooled.display}")
+                return report
+        pooled.stop()
+        logger.info(f"🛑 تم إغلاق العرض {pooled.display}")
+        return report
+
+    def shutdown(self):
+        """إيقاف كل شاشات المجمع"""
+        with self._lock:
+            self._running = False
+            displays = self._warm + list(self._leased.values())
+            self._warm = []
+            self._leased = {}
+            self._lock.notify_all()
+        groups = [g for d in displays for g in (d.session_group, d.group)]
+        processes = [p for g in groups for p in g.processes if p.poll() is None]
+        pgids = [g.pgid for g in groups if g.pgid is not None]
+        return ShutdownCoordinator().shutdown(processes, pgids=pgids)
+
+    def get_status(self):
+        """حالة المجمع"""
+        with self._lock:
+            return {
+                'running': self._running,
+                'warm': [d.display for d in self._warm],
+                'leased': [d.to_dict() for d in self._leased.values()],
+                'starting': sorted(self._starting),
+                'warm_size': self.warm_size,
+                'max_displays': self.max_displays,
+                'memory_per_display_mb': self.memory_per_display_mb
+            }
+
+# المتغير العام - سيتم تهيئته عند الحاجة
+display_pool = None
+
+def get_display_pool():
+    """الحصول على مجمع الشاشات المشترك"""
+    global display_pool
+    if display_pool is None:
+        display_pool = DisplayPool()
+    return display_pool
@@ -1,22 +1,49 @@
 """
 تطبيق Flask الرئيسي للنظام
+المصنع الوحيد للتطبيق: الاستيراد لا ينشئ تطبيقاً ولا يشغل خيوطاً، والإضافات والمسارات تُسجل عند استدعاء create_app
 """
 
 import os
+import logging
+from pathlib import Path
+
 from flask import Flask, render_template, request, jsonify, redirect, url_for
 from flask_sqlalchemy import SQLAlchemy
 from flask_socketio import SocketIO
+from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
-import logging
+
+from async_runtime import active_async_mode, run_blocking
+from cursor_channel import forget_client, register_cursor_events
+from message_bus import message_queue_options
+from metrics import register_metrics
+from pixel_formats import forget_client_format, register_format_events
+from static_assets import register_static_assets
+from session_recorder import register_recordings
+from status_broadcaster import status_broadcaster
+from thumbnails import register_thumbnails
+from video_stream import register_stream_events
 
 logger = logging.getLogger(__name__)
 
-# قاعدة البيانات
-db = SQLAlchemy()
+BASE_DIR = Path(__file__).parent.absolute()
+RUNTIME_DIRS = [BASE_DIR / "templates", BASE_DIR / "static", BASE_DIR / "logs", BASE_DIR / "instance"]
+
+class Base(DeclarativeBase):
+    pass
+
+# قاعدة البيانات وSocket.IO (تُربط بالتطبيق داخل create_app)
+db = SQLAlchemy(model_class=Base)
 socketio = SocketIO(cors_allowed_origins="*")
 
+# التطبيق المشترك للعملية (يُنشأ عند أول طلب عبر get_app)
+_app = None
+
 def create_app():
     """إنشاء تطبيق Flask مع جميع الإعدادات"""
+    for directory in RUNTIME_DIRS:
+        directory.mkdir(exist_ok=True)
+    
     app = Flask(__name__)
     
     # الإعدادات الأساسية
@@ -33,7 +60,9 @@ def create_app():
     
     # تهيئة الإضافات
     db.init_app(app)
-    socketio.init_app(app)
+    # توزيع الأحداث بين العمال عند ضبط SOCKETIO_MESSAGE_QUEUE
+    # نمط Socket.IO يطابق ما رقعه serve.py أو عامل gunicorn، لا ما يكتشفه Flask-SocketIO من الحزم المثبتة
+    socketio.init_app(app, async_mode=active_async_mode(), **message_queue_options())
     
     # تسجيل النماذج وإنشاء الجداول
     with app.app_context():
@@ -45,11 +74,31 @@ def create_app():
         except Exception as e:
             logger.error(f"خطأ في تهيئة قاعدة البيانات: {e}")
     
+    # الكتابة المؤجلة لسجل الجلسات الحية
+    from session_registry import session_registry
+    session_registry.start_flusher(app)
+    
+    # تحديد عنوان الاتصال الخارجي مرة واحدة وتحديثه في الخلفية
+    from address_discovery import get_address_discovery
+    get_address_discovery().start()
+    
+    # زمن المسارات والمراحل على /metrics
+    register_metrics(app, db=db, socketio=socketio)
+    
+    # الملفات المبصومة وتخزين HTML الشرطي
+    register_static_assets(app)
+    
     # تسجيل المسارات
     register_routes(app)
     register_api_routes(app)
     register_websocket_events(app)
     
+    # مصغرات الجلسات الحية للوحة التحكم
+    register_thumbnails(app, socketio)
+    
+    # تسجيل الجلسات وتشغيلها
+    register_recordings(app)
+    
     # تسجيل Blueprint إضافي
     from web_vnc import register_vnc_web
     register_vnc_web(app)
@@ -57,6 +106,21 @@ def create_app():
     logger.info("✅ تم إنشاء تطبيق Flask بنجاح")
     return app
 
+def get_app():
+    """الحصول على تطبيق العملية المشترك (يُنشأ مرة واحدة)"""
+    global _app
+    if _app is None:
+        _app = create_app()
+    return _app
+
+def _in_app_context(app, func, *args):
+    """تنفيذ دالة تقرأ قاعدة البيانات داخل سياق التطبيق (خيط مجمع run_blocking بلا سياق)"""
+    with app.app_context():
+        return func(*args)
+
+def _latest_rows(model, limit):
+    return model.query.order_by(model.timestamp.desc()).limit(limit).all()
+
 def register_routes(app):
     """تسجيل مسارات الويب الرئيسية"""
     
@@ -66,8 +130,8 @@ def register_routes(app):
         from vnc_manager import get_vnc_status, get_system_info
         from real_vnc_server import get_real_vnc_status
         
-        vnc_status = get_vnc_status()
-        system_info = get_system_info()
+        vnc_status = run_blocking(get_vnc_status)
+        system_info = run_blocking(get_system_info)
         real_vnc_status = get_real_vnc_status()
         
         return render_template('index.html', 
@@ -79,11 +143,13 @@ def register_routes(app):
     def dashboard():
         """لوحة التحكم المتقدمة"""
         from vnc_manager import get_detailed_status
-        from models import VNCSession, ConnectionLog
+        from models import ConnectionLog
+        from session_registry import session_registry
         
-        status = get_detailed_status()
-        sessions = VNCSession.query.order_by(VNCSession.created_at.desc()).limit(10).all()
-        recent_logs = ConnectionLog.query.order_by(ConnectionLog.timestamp.desc()).limit(20).all()
+        status = run_blocking(get_detailed_status)
+        sessions = session_registry.recent(10)
+        # استعلامات SQLite حاجزة: خارج حلقة الأحداث في نمط gevent/eventlet
+        recent_logs = run_blocking(_in_app_context, app, _latest_rows, ConnectionLog, 20)
         
         return render_template('dashboard.html',
                              status=status,
@@ -95,13 +161,18 @@ def register_routes(app):
         """مدير التطبيقات"""
         from app_manager import get_installed_apps, get_available_apps
         
-        installed = get_installed_apps()
+        installed = run_blocking(_in_app_context, app, get_installed_apps)
         available = get_available_apps()
         
         return render_template('applications.html',
                              installed_apps=installed,
                              available_apps=available)
     
+    @app.route('/applications')
+    def applications_alias():
+        """الرابط القديم لمدير التطبيقات"""
+        return redirect(url_for('applications'))
+    
     @app.route('/settings')
     def settings():
         """إعدادات النظام"""
@@ -115,7 +186,7 @@ def register_routes(app):
         """عرض السجلات"""
         try:
             from models import SystemLog
-            logs = SystemLog.query.order_by(SystemLog.timestamp.desc()).limit(100).all()
+            logs = run_blocking(_in_app_context, app, _latest_rows, SystemLog, 100)
         except Exception as e:
             logger.error(f"خطأ في قراءة السجلات: {e}")
             logs = []
@@ -129,10 +200,11 @@ def register_api_routes(app):
         """بدء خادم VNC"""
         try:
             from vnc_manager import start_vnc_server
-            result = start_vnc_server()
+            result = run_blocking(start_vnc_server)
             
             if result['success']:
                 socketio.emit('vnc_status_changed', {'status': 'running'})
+                status_broadcaster.refresh()
                 return jsonify(result)
             else:
                 return jsonify(result), 500
@@ -146,10 +218,11 @@ def register_api_routes(app):
         """إيقاف خادم VNC"""
         try:
             from vnc_manager import stop_vnc_server
-            result = stop_vnc_server()
+            result = run_blocking(stop_vnc_server)
             
             if result['success']:
                 socketio.emit('vnc_status_changed', {'status': 'stopped'})
+                status_broadcaster.refresh()
                 return jsonify(result)
             else:
                 return jsonify(result), 500
@@ -162,13 +235,44 @@ def register_api_routes(app):
     def api_vnc_status():
         """حالة خادم VNC"""
         from vnc_manager import get_vnc_status
-        return jsonify(get_vnc_status())
+        return jsonify(run_blocking(get_vnc_status))
+    
+    @app.route('/api/status')
+    def api_status():
+        """ملخص حالة النظام من آخر لقطة مخزنة"""
+        # عملاء HTTP فقط (دون مشترك Socket.IO) يحتاجون المنتج أيضاً
+        status_broadcaster.start()
+        snapshot = status_broadcaster.get_snapshot()
+        vnc_status = snapshot['document'].get('vnc_status') or {}
+        return jsonify({
+            'status': 'running',
+            'vnc_active': bool(vnc_status.get('is_running')),
+            'system': 'ok',
+            'version': snapshot['version']
+        })
+    
+    @app.route('/api/status/changes')
+    def api_status_changes():
+        """فروقات الحالة منذ إصدار معين (304 إن لم يتغير شيء)"""
+        status_broadcaster.start()
+        since = request.args.get('since', type=int)
+        if since is None:
+            changes = status_broadcaster.get_snapshot()
+        else:
+            changes = status_broadcaster.changes_since(since)
+            if changes is None:
+                return '', 304, {'ETag': f'"{since}"'}
+        
+        response = jsonify(changes)
+        response.headers['ETag'] = f'"{changes["version"]}"'
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
     
     @app.route('/api/system/info')
     def api_system_info():
         """معلومات النظام"""
         from vnc_manager import get_system_info
-        return jsonify(get_system_info())
+        return jsonify(run_blocking(get_system_info))
     
     @app.route('/api/real-vnc/start', methods=['POST'])
     def api_start_real_vnc():
@@ -240,7 +344,7 @@ def register_api_routes(app):
             app_name = data.get('app_name')
             
             from app_manager import install_application
-            result = install_application(app_name)
+            result = run_blocking(install_application, app_name)
             
             if result['success']:
                 socketio.emit('app_installed', {'app': app_name})
@@ -253,22 +357,26 @@ def register_api_routes(app):
 
 def register_websocket_events(app):
     """تسجيل أحداث WebSocket"""
+    status_broadcaster.init_app(socketio)
+    register_cursor_events(socketio)
+    register_stream_events(socketio)
+    register_format_events(socketio)
     
     @socketio.on('connect')
     def handle_connect():
         logger.info("عميل جديد متصل")
         
-        # إرسال حالة النظام الحالية
-        from vnc_manager import get_vnc_status, get_system_info
-        socketio.emit('vnc_status_update', get_vnc_status())
-        socketio.emit('system_info_update', get_system_info())
+        # الاشتراك في غرفة الحالة واستلام آخر لقطة مخزنة دون إعادة حسابها
+        status_broadcaster.subscribe(request.sid)
     
     @socketio.on('disconnect')
     def handle_disconnect():
         logger.info("عميل منقطع")
+        forget_client(request.sid)
+        forget_client_format(request.sid)
     
     @socketio.on('request_status_update')
-    def handle_status_request():
-        from vnc_manager import get_vnc_status, get_system_info
-        socketio.emit('vnc_status_update', get_vnc_status())
-        socketio.emit('system_info_update', get_system_info())
\ No newline at end of file
+    def handle_status_request(data=None):
+        # العميل يرسل آخر إصدار لديه ليستلم الفروقات الناقصة فقط
+        since = data.get('version') if isinstance(data, dict) else None
+        status_broadcaster.send_snapshot(request.sid, since=since)
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Import Profiler - ميزانية زمن الاستيراد لنقاط الدخول
+يقيس الزمن التراكمي لكل وحدة عند استيراد نقطة دخول في عملية جديدة (-X importtime)، ويفشل عند تجاوز الميزانية أو سحب وحدة ثقيلة ممنوعة
+ويوفر lazy_import لتأجيل الوحدات الثقيلة نادرة الاستخدام حتى أول وصول إليها
+
+الاستخدام:
+    python import_profiler.py                        # كل نقاط الدخول
+    python import_profiler.py main serve --top 15
+    python import_profiler.py --check                # رمز خروج 1 عند تجاوز الميزانية
+    VNC_IMPORT_BUDGET=budget.json python import_profiler.py --check
+"""
+
+import os
+import sys
+import json
+import types
+import argparse
+import importlib
+import subprocess
+import logging
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).parent.absolute()
+
+# نقاط الدخول التي تُقاس افتراضياً
+ENTRY_POINTS = ('main', 'app', 'serve', 'run_web_interface', 'web_vnc_interface',
+                'start_multiple_interfaces', 'multi_vnc_manager', 'vnc_native')
+
+# وحدات ثقيلة لا تحتاجها نقطة الدخول قبل أن تعمل فعلاً
+HEAVY_MODULES = ('flask_sqlalchemy', 'sqlalchemy', 'flask_socketio', 'psutil', 'PIL', 'requests')
+
+# الميزانية الافتراضية: أقصى زمن تراكمي بالملي ثانية والوحدات الممنوعة عند الاستيراد
+DEFAULT_BUDGETS = {
+    'main': {'max_ms': 100, 'forbid': HEAVY_MODULES + ('flask',)},
+    'app': {'max_ms': 900, 'forbid': ('psutil', 'PIL', 'requests')},
+    'serve': {'max_ms': 100, 'forbid': HEAVY_MODULES + ('flask',)},
+    'run_web_interface': {'max_ms': 400, 'forbid': HEAVY_MODULES},
+    'web_vnc_interface': {'max_ms': 400, 'forbid': HEAVY_MODULES},
+    'start_multiple_interfaces': {'max_ms': 100, 'forbid': HEAVY_MODULES + ('flask',)},
+    'multi_vnc_manager': {'max_ms': 100, 'forbid': HEAVY_MODULES + ('flask',)},
+    'vnc_native': {'max_ms': 100, 'forbid': HEAVY_MODULES + ('flask',)},
+}
+
+class _LazyModule(types.ModuleType):
+    """وحدة تُستورد فعلياً عند أول وصول لإحدى خصائصها"""
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__['_module'] = None
+
+    def _load(self):
+        if self.__dict__['_module'] is None:
+            self.__dict__['_module'] = importlib.import_module(self.__name__)
+        return self.__dict__['_module']
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+def lazy_import(name):
+    """مرجع كسول لوحدة: لا كلفة عند الاستيراد، وخطأ ImportError يظهر عند أول استخدام فقط"""
+    module = sys.modules.get(name)
+    return module if module is not None else _LazyModule(name)
+
+def parse_importtime(output):
+    """تحويل مخرجات -X importtime إلى قائمة (الوحدة، الزمن الذاتي، الزمن التراكمي) بالملي ثانية"""
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = [p.strip() for p in line[len("import time:"):].split("|")]
+        if len(parts) != 3 or not parts[0].isdigit():
+            continue
+        rows.append({
+            'module': parts[2],
+            'self_ms': int(parts[0]) / 1000,
+            'cumulative_ms': int(parts[1]) / 1000
+        })
+    return rows
+
+def profile_imports(entry, cwd=BASE_DIR, python=sys.executable, env=None):
+    """استيراد نقطة دخول في عملية جديدة وإرجاع الزمن التراكمي لكل وحدة"""
+    # الوحدات المحملة فعلاً (importtime يسجل أيضاً محاولات الاستيراد الاختيارية الفاشلة)
+    code = f"import {entry}, sys, json; print(json.dumps(sorted(sys.modules)))"
+    result = subprocess.run([python, "-X", "importtime", "-c", code],
+                            cwd=cwd, env=env, capture_output=True, text=True, timeout=120)
+    rows = parse_importtime(result.stderr)
+    own = [row for row in rows if row['module'] == entry]
+    ok = result.returncode == 0
+    return {
+        'entry': entry,
+        'ok': ok,
+        'error': None if ok else (result.stderr.strip().splitlines() or ['فشل'])[-1],
+        'total_ms': round(own[-1]['cumulative_ms'], 1) if own else None,
+        'modules': rows,
+        'loaded': set(json.loads(result.stdout.strip().splitlines()[-1])) if ok else set()
+    }
+
+def best_profile(entry, repeat=3, **kwargs):
+    """أسرع تشغيل من عدة تشغيلات لتقليل ضجيج القياس"""
+    profiles = [profile_imports(entry, **kwargs) for _ in range(max(1, repeat))]
+    return min(profiles, key=lambda p: p['total_ms'] if p['total_ms'] is not None else float('inf'))
+
+def heaviest(profile, top=10):
+    """أثقل الوحدات حسب الزمن التراكمي"""
+    rows = sorted(profile['modules'], key=lambda row: row['cumulative_ms'], reverse=True)
+    return [{'module': row['module'], 'cumulative_ms': round(row['cumulative_ms'], 1)} for row in rows[:top]]
+
+def load_budgets(path=None):
+    """الميزانية الافتراضية مع ما يرد في ملف JSON (VNC_IMPORT_BUDGET)"""
+    budgets = {name: dict(budget) for name, budget in DEFAULT_BUDGETS.items()}
+    path = path or os.environ.get("VNC_IMPORT_BUDGET")
+    if path:
+        with open(path) as f:
+            for name, budget in json.load(f).items():
+                budgets.setdefault(name, {}).update(budget)
+    return budgets
+
+def check_budget(profile, budget):
+    """مخالفات الميزانية لنقطة دخول واحدة"""
+    if not profile['ok']:
+        return [f"فشل الاستيراد: {profile['error']}"]
+
+    violations = []
+    max_ms = budget.get('max_ms')
+    if max_ms is not None and profile['total_ms'] is not None and profile['total_ms'] > max_ms:
+        violations.append(f"الزمن {profile['total_ms']}ms يتجاوز الميزانية {max_ms}ms")
+
+    for name in budget.get('forbid', ()):
+        if name in profile['loaded']:
+            violations.append(f"استورد الوحدة الثقيلة {name}")
+    return violations
+
+def main():
+    """البرنامج الرئيسي"""
+    parser = argparse.ArgumentParser(description="قياس زمن الاستيراد لنقاط الدخول مقابل الميزانية")
+    parser.add_argument("entries", nargs="*", default=list(ENTRY_POINTS))
+    parser.add_argument("--top", type=int, default=8, help="عدد الوحدات الأثقل المعروضة لكل نقطة دخول")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--budget-file", default=None, help="ملف JSON يعدل الميزانية الافتراضية")
+    parser.add_argument("--check", action="store_true", help="رمز خروج 1 عند تجاوز الميزانية")
+    parser.add_argument("--json", action="store_true", help="طباعة التقرير بصيغة JSON")
+    args = parser.parse_args()
+
+    budgets = load_budgets(args.budget_file)
+    env = dict(os.environ, DATABASE_URL=os.environ.get("DATABASE_URL", "sqlite://"))
+
+    report = {}
+    for entry in args.entries:
+        profile = best_profile(entry, repeat=args.repeat, env=env)
+        report[entry] = {
+            'total_ms': profile['total_ms'],
+            'budget': budgets.get(entry, {}),
+            'violations': check_budget(profile, budgets.get(entry, {})),
+            'heaviest': heaviest(profile, args.top)
+        }
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        for entry, result in report.items():
+            mark = "❌" if result['violations'] else "✅"
+            limit = result['budget'].get('max_ms', '-')
+            print(f"{mark} {entry}: {result['total_ms']}ms (الميزانية {limit}ms)")
+            for violation in result['violations']:
+                print(f"    ⚠️ {violation}")
+            for row in result['heaviest']:
+                print(f"    {row['cumulative_ms']:>9.1f}ms  {row['module']}")
+
+    failed = [entry for entry, result in report.items() if result['violations']]
+    if args.check and failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,35 @@
 """
 VNC Desktop System - Entry Point
 نقطة دخول نظام VNC Desktop في بيئة Replit
+
+الاستيراد لا يشغل شيئاً: الوصول إلى main.app (كما يفعل gunicorn main:app) ينشئ التطبيق ويبدأ خدمات VNC مرة واحدة
 """
 
-import os
-import sys
-import logging
 import threading
 import time
-from pathlib import Path
+import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Import Flask app
-from app import app
+# خيط خدمات VNC (يبدأ مع أول إنشاء للتطبيق)
+vnc_thread = None
 
 def start_vnc_services():
     """تشغيل خدمات VNC في خيط منفصل"""
     try:
+        from display_pool import get_display_pool
         from vnc_native import VNCManager
         
+        # تسخين الشاشات مسبقاً حتى لا تدفع الجلسات الجديدة كلفة البدء البارد
+        get_display_pool().start()
+        
         vnc = VNCManager()
         logger.info("🚀 بدء تشغيل خدمات VNC...")
         
         if vnc.start_all():
-            logger.info("✅ تم تشغيل VNC بنجاح على المنفذ 5900")
+            logger.info(f"✅ تم تشغيل VNC بنجاح على المنفذ {vnc.vnc_port}")
             
             # مراقبة الخدمات
             while True:
@@ -41,11 +44,27 @@ def start_vnc_services():
     except Exception as e:
         logger.error(f"خطأ في خدمات VNC: {e}")
 
-# تشغيل خدمات VNC في الخلفية
-vnc_thread = threading.Thread(target=start_vnc_services, daemon=True)
-vnc_thread.start()
+def start_background_services():
+    """تشغيل خدمات VNC في الخلفية (مرة واحدة لكل عملية)"""
+    global vnc_thread
+    if vnc_thread is None:
+        vnc_thread = threading.Thread(target=start_vnc_services, daemon=True)
+        vnc_thread.start()
+    return vnc_thread
+
+def get_app():
+    """تطبيق Flask مع خدمات VNC الخلفية"""
+    from flask_app import get_app as get_flask_app
+    app = get_flask_app()
+    start_background_services()
+    return app
+
+# Export Flask app for gunicorn (main:app) بشكل كسول
+def __getattr__(name):
+    if name == 'app':
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# Export Flask app for gunicorn
 if __name__ == "__main__":
     # هذا الجزء لن يعمل مع gunicorn، ولكنه مفيد للاختبار المحلي
-    app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
+    get_app().run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,124 @@
+"""
+ناقل رسائل Socket.IO بين العمليات
+يوزع emit على كل العمال عبر Redis (أو أي طابور يدعمه python-socketio)، أو عبر ناقل محلي بمقابس Unix لعمليات المضيف الواحد
+"""
+
+import os
+import json
+import socket
+import fcntl
+import logging
+from pathlib import Path
+
+import socketio
+
+logger = logging.getLogger(__name__)
+
+# مثال: redis://localhost:6379/0 أو unix:///tmp/vnc-bus (فارغ = عملية واحدة)
+MESSAGE_QUEUE = os.environ.get("SOCKETIO_MESSAGE_QUEUE", "")
+
+# أقصى حجم لرسالة على الناقل المحلي
+MAX_DATAGRAM = 256 * 1024
+
+class UnixSocketManager(socketio.PubSubManager):
+    """ناقل محلي: لكل عامل مقبس datagram في مجلد مشترك، والنشر يرسل لكل المقابس بما فيها مقبس العامل نفسه"""
+
+    name = 'unix'
+
+    def __init__(self, path, channel='socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.directory = Path(path) / channel
+        self.directory.mkdir(parents=True, exist_ok=True)
+        os.chmod(self.directory, 0o700)
+        self.address = None
+        self.sock = None
+
+    def _socket(self):
+        # يُنشأ المقبس داخل العامل نفسه (بعد fork وبعد monkey patching)
+        if self.sock is None:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, MAX_DATAGRAM)
+        return self.sock
+
+    def initialize(self):
+        if not self.write_only:
+            self.address = self.directory / f"{os.getpid()}.sock"
+            self.address.unlink(missing_ok=True)
+            sock = self._socket()
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, MAX_DATAGRAM * 4)
+            sock.bind(str(self.address))
+        super().initialize()
+
+    def _publish(self, data):
+        payload = json.dumps(data).encode()
+        for peer in self.directory.glob("*.sock"):
+            try:
+                self._socket().sendto(payload, str(peer))
+            except (ConnectionRefusedError, FileNotFoundError):
+                # عامل منتهٍ ترك مقبسه
+                peer.unlink(missing_ok=True)
+            except OSError as e:
+                logger.warning(f"⚠️ تعذر النشر إلى {peer.name}: {e}")
+
+    def _listen(self):
+        while True:
+            yield self.sock.recv(MAX_DATAGRAM)
+
+def parse_queue_url(url):
+    """تحويل عنوان الطابور إلى معاملات SocketIO"""
+    if not url:
+        return {}
+    if url.startswith("unix://"):
+        return {'client_manager': UnixSocketManager(url[len("unix://"):])}
+    return {'message_queue': url}
+
+def message_queue_options(url=None):
+    """معاملات init_app لتفعيل التوزيع بين العمال"""
+    url = MESSAGE_QUEUE if url is None else url
+    options = parse_queue_url(url)
+    if options:
+        logger.info(f"📡 توزيع أحداث Socket.IO عبر {url}")
+    return options
+
+def create_emitter(url=None):
+    """ناشر للكتابة فقط للعمليات الخارجية (سكربتات الخلفية) يصل إلى عملاء كل العمال دون خادم ويب"""
+    url = MESSAGE_QUEUE if url is None else url
+    if not url:
+        return None
+    if url.startswith("unix://"):
+        return UnixSocketManager(url[len("unix://"):], write_only=True)
+    if url.startswith(("redis://", "rediss://")):
+        return socketio.RedisManager(url, write_only=True)
+    return socketio.KombuManager(url, write_only=True)
+
+class LeaderLock:
+    """قفل ملف يضمن أن عاملاً واحداً فقط يشغل مهمة مشتركة (مثل منتج الحالة)"""
+
+    def __init__(self, name, directory=None):
+        directory = Path(directory or os.environ.get("VNC_BUS_DIR", "/tmp/vnc-bus"))
+        directory.mkdir(parents=True, exist_ok=True)
+        self.path = directory / f"{name}.lock"
+        self._file = None
+
+    def acquire(self):
+        """محاولة غير حاجزة لتولي القيادة"""
+        if self._file:
+            return True
+        handle = open(self.path, 'a')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        self._file = handle
+        return True
+
+    @property
+    def held(self):
+        return self._file is not None
+
+    def release(self):
+        if self._file:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
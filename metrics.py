@@ -0,0 +1,333 @@
+"""
+قياس زمن المسارات الساخنة
+مدرجات تكرارية بأسلوب HDR (دقة نسبية ثابتة ~3% من الميكروثانية حتى الساعات) لكل مرحلة ومسار Flask، تُعرض على /metrics بصيغة Prometheus، مع تتبع اختياري بالعينة إلى ملف JSONL
+
+التفعيل:
+    VNC_TRACE_FILE=/tmp/vnc-trace.jsonl VNC_TRACE_SAMPLE=0.1 python serve.py control
+"""
+
+import os
+import json
+import time
+import queue
+import random
+import threading
+import functools
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ملف التتبع (فارغ = التتبع معطل) ونسبة العينة للطلبات الجذرية
+TRACE_FILE = os.environ.get("VNC_TRACE_FILE", "")
+TRACE_SAMPLE = float(os.environ.get("VNC_TRACE_SAMPLE", "1.0"))
+
+# المقاطع المعروضة لكل مدرج
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+# عدد الخانات الخطية؛ بعدها كل مضاعفة للقيمة تُقسم إلى نصف هذا العدد (دقة 1/32)
+SUB_BUCKETS = 64
+HALF_BUCKETS = SUB_BUCKETS // 2
+SUB_BITS = SUB_BUCKETS.bit_length() - 1
+
+# عائلات المقاييس ووصفها
+STAGE_FAMILY = "vnc_stage_seconds"
+HTTP_FAMILY = "vnc_http_request_seconds"
+DESCRIPTIONS = {
+    STAGE_FAMILY: "زمن مراحل المستوى التحكمي (حالة VNC، معلومات النظام، قاعدة البيانات، تشغيل العمليات، Socket.IO)",
+    HTTP_FAMILY: "زمن طلبات Flask حسب المسار",
+}
+
+def _bucket_index(value):
+    """رقم الخانة لقيمة بالميكروثانية"""
+    if value < SUB_BUCKETS:
+        return value
+    shift = value.bit_length() - SUB_BITS
+    return SUB_BUCKETS + (shift - 1) * HALF_BUCKETS + ((value >> shift) - HALF_BUCKETS)
+
+def _bucket_upper(index):
+    """الحد الأعلى لخانة بالميكروثانية"""
+    if index < SUB_BUCKETS:
+        return index
+    shift, offset = divmod(index - SUB_BUCKETS, HALF_BUCKETS)
+    shift += 1
+    return ((offset + HALF_BUCKETS + 1) << shift) - 1
+
+class Histogram:
+    """مدرج تكراري متناثر بدقة نسبية ثابتة"""
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        index = _bucket_index(max(0, int(seconds * 1_000_000)))
+        with self._lock:
+            self.counts[index] = self.counts.get(index, 0) + 1
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def quantile(self, q):
+        """قيمة المقطع بالثواني (الحد الأعلى لخانتها، بحد أقصى أكبر قيمة مسجلة)"""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            target = max(1, int(q * self.count + 0.5))
+            seen = 0
+            for index in sorted(self.counts):
+                seen += self.counts[index]
+                if seen >= target:
+                    return min(_bucket_upper(index) / 1_000_000, self.max)
+            return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': round(self.total, 6),
+            'max': round(self.max, 6),
+            **{f"p{q * 100:g}": round(self.quantile(q), 6) for q in QUANTILES}
+        }
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels, extra=None):
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape_label(value)}"' for key, value in items) + "}"
+
+class MetricsRegistry:
+    """كل مدرجات العملية مفهرسة بالعائلة والوسوم"""
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, family, **labels):
+        key = (family, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram())
+        return histogram
+
+    def observe(self, family, seconds, **labels):
+        self.histogram(family, **labels).observe(seconds)
+
+    def snapshot(self):
+        """كل المدرجات كقاموس (للوحة التحكم أو الاختبارات اليدوية)"""
+        with self._lock:
+            items = list(self._histograms.items())
+        return [
+            {'family': family, 'labels': dict(labels), **histogram.to_dict()}
+            for (family, labels), histogram in sorted(items)
+        ]
+
+    def render_prometheus(self):
+        """نص بصيغة Prometheus: summary لكل عائلة مع المقاطع وأكبر قيمة"""
+        with self._lock:
+            items = sorted(self._histograms.items())
+
+        families = {}
+        for (family, labels), histogram in items:
+            families.setdefault(family, []).append((labels, histogram))
+
+        lines = []
+        for family, series in families.items():
+            lines.append(f"# HELP {family} {DESCRIPTIONS.get(family, family)}")
+            lines.append(f"# TYPE {family} summary")
+            for labels, histogram in series:
+                for q in QUANTILES:
+                    lines.append(f"{family}{_format_labels(labels, ('quantile', q))} {histogram.quantile(q):.6f}")
+                lines.append(f"{family}_sum{_format_labels(labels)} {histogram.total:.6f}")
+                lines.append(f"{family}_count{_format_labels(labels)} {histogram.count}")
+            lines.append(f"# HELP {family}_max أكبر زمن مسجل")
+            lines.append(f"# TYPE {family}_max gauge")
+            for labels, histogram in series:
+                lines.append(f"{family}_max{_format_labels(labels)} {histogram.max:.6f}")
+        return "\n".join(lines) + "\n"
+
+# سجل مشترك للعملية
+metrics_registry = MetricsRegistry()
+
+class TraceExporter:
+    """كتابة المقاطع المأخوذة بالعينة إلى ملف JSONL من خيط خلفي"""
+
+    def __init__(self, path=TRACE_FILE, sample=TRACE_SAMPLE):
+        self.path = path
+        self.sample = sample
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.path) and self.sample > 0
+
+    def configure(self, path=None, sample=None):
+        """تغيير ملف التتبع أو نسبة العينة أثناء التشغيل"""
+        if path is not None:
+            self.path = path
+        if sample is not None:
+            self.sample = sample
+        logger.info(f"🔍 التتبع: {self.path or 'معطل'} (عينة {self.sample})")
+
+    def should_sample(self):
+        return self.enabled and random.random() < self.sample
+
+    def export(self, span):
+        if not self.enabled:
+            return
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._write_loop, daemon=True, name="trace-exporter")
+                    self._thread.start()
+        self._queue.put(span)
+
+    def _write_loop(self):
+        while True:
+            spans = [self._queue.get()]
+            while len(spans) < 1000:
+                try:
+                    spans.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with open(self.path, 'a') as f:
+                    f.writelines(json.dumps(span, ensure_ascii=False) + "\n" for span in spans)
+            except Exception as e:
+                logger.error(f"خطأ في كتابة التتبع: {e}")
+
+trace_exporter = TraceExporter()
+
+_context = threading.local()
+
+class timed:
+    """قياس زمن مرحلة: كمدير سياق (with timed('stage'):) أو كمزخرف (@timed('stage'))"""
+
+    def __init__(self, stage, family=STAGE_FAMILY, **labels):
+        self.stage = stage
+        self.family = family
+        self.labels = labels
+        self.start = None
+        self.span = None
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(self.stage, self.family, **self.labels):
+                return func(*args, **kwargs)
+        return wrapper
+
+    def __enter__(self):
+        parent = getattr(_context, 'span', None)
+        if parent is not None or trace_exporter.should_sample():
+            self.span = {
+                'trace': parent['trace'] if parent else f"{random.getrandbits(64):016x}",
+                'span': f"{random.getrandbits(32):08x}",
+                'parent': parent['span'] if parent else None,
+                'name': self.stage,
+                'start': time.time(),
+                '_parent': parent
+            }
+            _context.span = self.span
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        if self.family == STAGE_FAMILY:
+            metrics_registry.observe(self.family, elapsed, stage=self.stage, **self.labels)
+        else:
+            metrics_registry.observe(self.family, elapsed, **self.labels)
+
+        if self.span is not None:
+            _context.span = self.span.pop('_parent')
+            self.span.update({
+                'duration_ms': round(elapsed * 1000, 3),
+                'labels': {key: str(value) for key, value in self.labels.items()},
+                'error': exc_type.__name__ if exc_type else None,
+                'thread': threading.current_thread().name
+            })
+            trace_exporter.export(self.span)
+        return False
+
+def instrument_socketio(socketio):
+    """قياس زمن كل emit حسب اسم الحدث"""
+    if getattr(socketio.emit, '_timed', False):
+        return socketio
+    emit = socketio.emit
+
+    @functools.wraps(emit)
+    def timed_emit(event, *args, **kwargs):
+        with timed('socketio_emit', event=event):
+            return emit(event, *args, **kwargs)
+
+    timed_emit._timed = True
+    socketio.emit = timed_emit
+    return socketio
+
+def instrument_sqlalchemy(db):
+    """قياس زمن commit لجلسة Flask-SQLAlchemy"""
+    from sqlalchemy import event
+
+    if getattr(db, '_commit_timed', False):
+        return
+    db._commit_timed = True
+
+    def before_commit(session):
+        session.info['commit_started'] = time.perf_counter()
+
+    def after_end(session):
+        started = session.info.pop('commit_started', None)
+        if started is not None:
+            metrics_registry.observe(STAGE_FAMILY, time.perf_counter() - started, stage='db_commit')
+
+    event.listen(db.session, 'before_commit', before_commit)
+    event.listen(db.session, 'after_commit', after_end)
+    event.listen(db.session, 'after_rollback', after_end)
+
+def register_metrics(app, db=None, socketio=None):
+    """قياس زمن كل مسار Flask وإضافة /metrics"""
+    from flask import Response, g, request
+
+    @app.before_request
+    def start_request_timer():
+        g._request_timer = timed('http_request', family=HTTP_FAMILY).__enter__()
+
+    @app.after_request
+    def record_status(response):
+        g._request_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def stop_request_timer(exc=None):
+        timer = g.pop('_request_timer', None)
+        if timer is None:
+            return
+        timer.labels = {
+            'method': request.method,
+            'route': request.url_rule.rule if request.url_rule else 'unmatched',
+            'status': g.pop('_request_status', 500)
+        }
+        timer.__exit__(type(exc) if exc else None, exc, None)
+
+    @app.route('/metrics')
+    def prometheus_metrics():
+        """المقاييس بصيغة Prometheus"""
+        return Response(metrics_registry.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+    if db is not None:
+        instrument_sqlalchemy(db)
+    if socketio is not None:
+        instrument_socketio(socketio)
+
+    if trace_exporter.enabled:
+        logger.info(f"🔍 تتبع {trace_exporter.sample:.0%} من الطلبات إلى {trace_exporter.path}")
+    return metrics_registry
@@ -2,7 +2,7 @@
 نماذج قاعدة البيانات لنظام VNC
 """
 
-from app import db
+from flask_app import db
 from datetime import datetime
 import json
 
@@ -8,33 +8,54 @@ import os
 import sys
 import subprocess
 import time
-import signal
 import logging
 import threading
 from pathlib import Path
 
+from display_pool import get_display_pool
+from performance_profiles import x11vnc_flags, xvfb_flags
+from process_groups import get_process_group, wait_for_display, wait_for_port
+from session_persistence import DesktopSession
+from shutdown_coordinator import log_shutdown_report
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# المنفذ الرئيسي 5900 + رقم العرض كما في vnc_manager، وكل واجهة تالية بخطوة ثابتة فوقه
+BASE_PORT = 5900
+INTERFACE_PORT_STRIDE = int(os.environ.get("VNC_INTERFACE_PORT_STRIDE", "1000"))
+
 class MultiVNCManager:
-    def __init__(self):
-        self.display = ":1"
+    def __init__(self, display=None):
+        # بدون عرض محدد تُستعار شاشة مسخنة من المجمع
+        self.display = display
         self.screen_resolution = "1024x768"
         self.color_depth = 24
         self.vnc_password = "vnc123456"
         
-        # تعريف المنافذ المختلفة
+        # تعريف الواجهات (منافذها تُحسب من رقم العرض؛ المعار يُعرف عند الاستلام)
         self.vnc_configs = {
-            'main': {'port': 5900, 'description': 'الواجهة الرئيسية'},
-            'web': {'port': 5901, 'description': 'واجهة الويب'},
-            'mobile': {'port': 5902, 'description': 'واجهة الموبايل'},
-            'admin': {'port': 5903, 'description': 'واجهة الإدارة'},
+            'main': {'port': None, 'description': 'الواجهة الرئيسية'},
+            'web': {'port': None, 'description': 'واجهة الويب'},
+            'mobile': {'port': None, 'description': 'واجهة الموبايل'},
+            'admin': {'port': None, 'description': 'واجهة الإدارة'},
         }
+        if self.display:
+            self._assign_ports()
         
         # معرفات العمليات
         self.process_pids = {}
+        self.vnc_processes = {}
         self.xvfb_pid = None
         
+        # مجموعة العمليات الخاصة بهذه الحزمة
+        self.pooled = display is None
+        self.lease = None
+        self.group = None if self.pooled else get_process_group(f"multi-vnc{self.display}")
+        
+        # ملفات التعريف والتخطيط الدائمة لسطح المكتب المشترك (لكل عرض؛ المعار يُعرف عند الاستلام)
+        self.session = None if self.pooled else self._session_for(self.display)
+        
         # إعداد مجلد VNC
         self.vnc_dir = Path.home() / ".vnc"
         self.vnc_dir.mkdir(exist_ok=True)
@@ -52,27 +73,58 @@ class MultiVNCManager:
             logger.error(f"❌ خطأ في إعداد كلمة مرور VNC: {e}")
             return False
     
+    def _assign_ports(self):
+        """منافذ الواجهات من رقم العرض حتى لا تتصادم حزمتان أو شاشة معارة مع المدير المفرد"""
+        number = int(self.display.lstrip(':').split('.')[0])
+        for index, config in enumerate(self.vnc_configs.values()):
+            config['port'] = BASE_PORT + number + index * INTERFACE_PORT_STRIDE
+    
+    def _session_for(self, display):
+        """جلسة دائمة خاصة بالعرض حتى لا تتشارك الشاشات المعارة ملف تعريف المتصفح نفسه"""
+        return DesktopSession(f"multi-vnc-{display.lstrip(':')}")
+    
+    def _spawn(self, cmd, **kwargs):
+        """تشغيل عملية ضمن حزمة هذا المدير"""
+        if self.lease:
+            return self.lease.spawn(cmd, **kwargs)
+        return self.group.spawn(cmd, **kwargs)
+    
     def start_xvfb(self):
         """تشغيل الشاشة الوهمية المشتركة"""
         try:
-            # إيقاف أي Xvfb موجود
-            subprocess.run(["pkill", "-f", "Xvfb"], capture_output=True)
-            time.sleep(1)
+            if self.pooled:
+                # شاشة مسخنة من المجمع بدلاً من تشغيل بارد
+                if self.lease:
+                    self.lease.release()
+                self.lease = get_display_pool().acquire(owner="multi-vnc")
+                self.display = self.lease.display
+                self.group = self.lease.group
+                self.xvfb_pid = self.lease.xvfb_pid
+                self.session = self._session_for(self.display)
+                self._assign_ports()
+                os.environ["DISPLAY"] = self.display
+                logger.info(f"✅ تم استلام العرض {self.display} من مجمع الشاشات")
+                return True
+            
+            # إيقاف حزمة هذا المدير السابقة فقط
+            self.group.stop()
             
             cmd = [
                 "Xvfb", self.display,
                 "-screen", "0", f"{self.screen_resolution}x{self.color_depth}",
-                "-ac", "+extension", "GLX"
+                "-ac", "+extension", "GLX", *xvfb_flags(self.display)
             ]
             
-            process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            process = self._spawn(cmd)
             self.xvfb_pid = process.pid
             
             # تعيين متغير DISPLAY
             os.environ["DISPLAY"] = self.display
             
             # انتظار بدء التشغيل
-            time.sleep(2)
+            if not wait_for_display(self.display, process=process):
+                logger.error(f"❌ لم يصبح العرض {self.display} جاهزاً")
+                return False
             
             logger.info(f"✅ تم تشغيل Xvfb على العرض {self.display}")
             return True
@@ -86,9 +138,8 @@ class MultiVNCManager:
         try:
             logger.info(f"🚀 تشغيل {description} على المنفذ {port}")
             
-            # إيقاف أي خدمة VNC على نفس المنفذ
-            subprocess.run(["pkill", "-f", f"rfbport {port}"], capture_output=True)
-            time.sleep(1)
+            # إيقاف خادم هذه الواجهة السابق فقط
+            self.group.stop_process(self.vnc_processes.pop(config_name, None))
             
             cmd = [
                 "x11vnc",
@@ -97,10 +148,11 @@ class MultiVNCManager:
                 "-passwd", self.vnc_password,
                 "-forever",
                 "-shared",
-                "-noxdamage",
-                "-noxfixes", 
-                "-noscr",
-                "-quiet"
+                # التقاط معتمد على XDamage حسب ملف الأداء بدلاً من استطلاع الشاشة كاملة
+                *x11vnc_flags(),
+                "-quiet",
+                # استئناف الجلسة المعلقة فور اتصال عميل
+                "-afteraccept", self.session.resume_hook()
             ]
             
             # إضافة معاملات خاصة حسب نوع الواجهة
@@ -111,19 +163,13 @@ class MultiVNCManager:
             elif config_name == 'admin':
                 cmd.extend(["-viewonly"])  # للعرض فقط
             
-            cmd.append("-bg")  # تشغيل في الخلفية
-            
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            time.sleep(2)
+            # بدون -bg حتى تبقى العملية داخل مجموعة الحزمة
+            process = self._spawn(cmd)
+            self.vnc_processes[config_name] = process
             
             # التحقق من تشغيل VNC
-            check_result = subprocess.run(
-                ["pgrep", "-f", f"rfbport {port}"], 
-                capture_output=True
-            )
-            
-            if check_result.returncode == 0:
-                self.process_pids[config_name] = check_result.stdout.strip().split('\n')[0]
+            if wait_for_port(port, process=process):
+                self.process_pids[config_name] = process.pid
                 logger.info(f"✅ تم تشغيل {description} بنجاح على المنفذ {port}")
                 return True
             else:
@@ -139,38 +185,22 @@ class MultiVNCManager:
         try:
             logger.info("📱 تشغيل تطبيقات سطح المكتب...")
             
-            # قائمة التطبيقات للتشغيل
+            # قائمة التطبيقات الافتراضية (يُستعاد التخطيط المحفوظ إن وُجد)
             apps = [
                 ["openbox", "--config-file", "/dev/null"],  # مدير النوافذ
                 ["xterm", "-geometry", "80x24+10+10", "-title", "Terminal Main"],
                 ["xterm", "-geometry", "80x24+400+10", "-title", "Terminal 2"],
-                ["firefox-esr", "--new-instance", "--profile", "/tmp/firefox-vnc"],
+                ["firefox-esr", "--new-instance"],
                 ["chromium", "--no-sandbox", "--disable-gpu", "--app=http://localhost:5000"]
             ]
             
-            # إنشاء ملف تعريف Firefox مؤقت
-            subprocess.run(["mkdir", "-p", "/tmp/firefox-vnc"], capture_output=True)
+            # مدير النوافذ يعمل مسبقاً على الشاشة المسخنة
+            if self.lease and self.lease.wm_process:
+                apps = [app for app in apps if app[0] != "openbox"]
             
-            launched_count = 0
-            for app_cmd in apps:
-                try:
-                    subprocess.Popen(
-                        app_cmd,
-                        stdout=subprocess.DEVNULL,
-                        stderr=subprocess.DEVNULL,
-                        env=dict(os.environ, DISPLAY=self.display)
-                    )
-                    launched_count += 1
-                    logger.info(f"✅ تم تشغيل {app_cmd[0]}")
-                    time.sleep(1)  # انتظار قصير بين التطبيقات
-                except FileNotFoundError:
-                    logger.warning(f"⚠️ التطبيق غير موجود: {app_cmd[0]}")
-                    continue
-                except Exception as e:
-                    logger.warning(f"⚠️ فشل في تشغيل {app_cmd[0]}: {e}")
-                    continue
+            launched_count = len(self.session.launch(apps, self._spawn, self.display))
             
-            logger.info(f"✅ تم تشغيل {launched_count} تطبيق من أصل {len(apps)}")
+            logger.info(f"✅ تم تشغيل {launched_count} تطبيق")
             return True
             
         except Exception as e:
@@ -185,8 +215,40 @@ class MultiVNCManager:
             if self.start_vnc_server(config_name, config['port'], config['description']):
                 success_count += 1
         
+        from broadcast_relay import BROADCAST_ENABLED
+        if BROADCAST_ENABLED:
+            self.start_broadcast_source()
+        
         return success_count > 0
     
+    def start_broadcast_source(self):
+        """مصدر البث للمشاهدة فقط: ترميز واحد تنشره المرحلات لمئات المشاهدين"""
+        from broadcast_relay import BROADCAST_PORT
+        try:
+            logger.info(f"🚀 تشغيل مصدر البث على المنفذ {BROADCAST_PORT}")
+            self.group.stop_process(self.vnc_processes.pop('broadcast', None))
+            
+            cmd = [
+                sys.executable, str(Path(__file__).with_name("broadcast_relay.py")),
+                "source", "--display", self.display,
+                # محلي فقط ومحمي بكلمة مرور VNC نفسها؛ المرحلات البعيدة عبر نفق
+                "--host", "127.0.0.1", "--port", str(BROADCAST_PORT),
+                "--key-file", str(self.vnc_dir / "passwd")
+            ]
+            process = self._spawn(cmd)
+            self.vnc_processes['broadcast'] = process
+            
+            if wait_for_port(BROADCAST_PORT, process=process):
+                self.process_pids['broadcast'] = process.pid
+                logger.info(f"✅ مصدر البث جاهز: المرحلات تتصل بـ localhost:{BROADCAST_PORT}")
+                return True
+            logger.error(f"❌ فشل في تشغيل مصدر البث على المنفذ {BROADCAST_PORT}")
+            return False
+        
+        except Exception as e:
+            logger.error(f"❌ خطأ في تشغيل مصدر البث: {e}")
+            return False
+    
     def get_status(self):
         """الحصول على حالة جميع الخدمات"""
         status = {
@@ -227,6 +289,21 @@ class MultiVNCManager:
         except:
             return False
     
+    def has_connected_clients(self):
+        """هل يوجد عميل متصل بأي من خوادم VNC"""
+        try:
+            import psutil
+            from broadcast_relay import BROADCAST_PORT
+            # مشاهدو البث يصلون عبر المرحلات المتصلة بالمصدر
+            ports = {config['port'] for config in self.vnc_configs.values()} | {BROADCAST_PORT}
+            return any(
+                conn.status == psutil.CONN_ESTABLISHED and conn.laddr and conn.laddr.port in ports
+                for conn in psutil.net_connections(kind='tcp')
+            )
+        except Exception:
+            # عند تعذر الفحص نعتبر الجلسة نشطة حتى لا تُعلق خطأً
+            return True
+    
     def start_monitoring_thread(self):
         """بدء خيط مراقبة الخدمات"""
         def monitor():
@@ -238,6 +315,17 @@ class MultiVNCManager:
                     if not self.is_port_open(config['port']):
                         logger.warning(f"⚠️ إعادة تشغيل {config['description']} على المنفذ {config['port']}")
                         self.start_vnc_server(config_name, config['port'], config['description'])
+                
+                from broadcast_relay import BROADCAST_ENABLED, BROADCAST_PORT
+                if BROADCAST_ENABLED and not self.is_port_open(BROADCAST_PORT):
+                    logger.warning(f"⚠️ إعادة تشغيل مصدر البث على المنفذ {BROADCAST_PORT}")
+                    self.start_broadcast_source()
+                
+                # تعليق التطبيقات عند الخمول بدلاً من إيقافها
+                if self.has_connected_clients():
+                    self.session.mark_active()
+                else:
+                    self.session.suspend_if_idle(self.display)
         
         monitor_thread = threading.Thread(target=monitor, daemon=True)
         monitor_thread.start()
@@ -285,34 +373,33 @@ class MultiVNCManager:
         logger.info(f"🔑 كلمة المرور: {self.vnc_password}")
         logger.info("="*50)
     
-    def stop_all(self):
-        """إيقاف جميع الخدمات"""
+    def stop_all(self, grace_period=None):
+        """إيقاف جميع الخدمات بالتوازي"""
         logger.info("🛑 إيقاف خدمات VNC...")
         
-        # إيقاف خوادم VNC
-        for pid in self.process_pids.values():
-            if pid:
-                try:
-                    os.kill(int(pid), signal.SIGTERM)
-                    time.sleep(1)
-                    os.kill(int(pid), signal.SIGKILL)
-                except (OSError, ValueError):
-                    pass
+        # حفظ التخطيط ومواقع النوافذ لاستعادتها عند التشغيل التالي
+        if self.display and self.session and self.session.apps:
+            self.session.resume()
+            self.session.snapshot(self.display)
         
-        # إيقاف Xvfb
-        if self.xvfb_pid:
-            try:
-                os.kill(self.xvfb_pid, signal.SIGTERM)
-                time.sleep(1)
-                os.kill(self.xvfb_pid, signal.SIGKILL)
-            except OSError:
-                pass
-        
-        # قتل العمليات بالقوة
-        subprocess.run(["pkill", "-f", "x11vnc"], capture_output=True)
-        subprocess.run(["pkill", "-f", "Xvfb"], capture_output=True)
+        if self.lease:
+            # إعادة الشاشة للمجمع بعد إيقاف عمليات الجلسة
+            report = self.lease.release()
+            self.lease = None
+            self.display = None
+        elif self.group:
+            # إيقاف مجموعة العمليات الخاصة بهذه الحزمة فقط (SIGKILL للمتأخرين بعد المهلة)
+            report = self.group.stop(grace_period)
+        else:
+            return None
+        log_shutdown_report(report)
+        if self.session:
+            self.session.forget_processes()
+        self.vnc_processes.clear()
+        self.process_pids.clear()
         
         logger.info("✅ تم إيقاف جميع خدمات VNC")
+        return report
 
 def main():
     """البرنامج الرئيسي"""
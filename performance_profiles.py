@@ -0,0 +1,72 @@
+"""
+ملفات الأداء لالتقاط الشاشة
+كل ملف يحدد معاملات x11vnc وXvfb ومسار الالتقاط الخاص بنا: XDamage/XFixes مفعلة دائماً حتى لا يُستطلع الشاشة كاملة عند عدم تغير شيء
+
+الاختيار:
+    VNC_PERF_PROFILE=low-cpu | low-latency | bandwidth-saver
+"""
+
+import os
+import logging
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROFILE = os.environ.get("VNC_PERF_PROFILE", "low-cpu")
+
+# مجلد ملفات إطارات Xvfb (‎-fbdir) ليقرأها مسار الالتقاط عبر mmap دون بروتوكول X
+FRAMEBUFFER_DIR = Path(os.environ.get("VNC_FRAMEBUFFER_DIR", "/tmp/vnc-fb"))
+
+# امتدادات Xvfb المطلوبة للالتقاط المعتمد على التغيير
+XVFB_EXTENSIONS = ("DAMAGE", "XFIXES")
+
+PROFILES = {
+    'low-cpu': {
+        'description': 'أقل استهلاك للمعالج: دمج التحديثات والنوم عند الخمول',
+        'x11vnc': ['-xdamage', '-wait', '50', '-defer', '50', '-nap', '-sb', '30', '-noscr', '-nowf'],
+        'capture': {'defer_ms': 50, 'max_fps': 15, 'poll_interval': 1.0},
+    },
+    'low-latency': {
+        'description': 'أقل تأخير: تحديثات فورية ومؤشر سريع',
+        'x11vnc': ['-xdamage', '-wait', '10', '-defer', '5', '-nonap', '-threads', '-pointer_mode', '4'],
+        'capture': {'defer_ms': 5, 'max_fps': 60, 'poll_interval': 0.1},
+    },
+    'bandwidth-saver': {
+        'description': 'أقل عرض نطاق: دمج أطول وكشف التمرير وتقدير سرعة رابط بطيء',
+        'x11vnc': ['-xdamage', '-wait', '40', '-defer', '150', '-nap', '-scr', 'always', '-speeds', 'dsl', '-nowf'],
+        'capture': {'defer_ms': 150, 'max_fps': 5, 'poll_interval': 2.0},
+    },
+}
+
+def get_profile(name=None):
+    """ملف الأداء بالاسم (أو الافتراضي من VNC_PERF_PROFILE)"""
+    name = name or DEFAULT_PROFILE
+    if name not in PROFILES:
+        logger.warning(f"⚠️ ملف أداء غير معروف: {name}، استخدام low-cpu")
+        name = 'low-cpu'
+    return {'name': name, **PROFILES[name]}
+
+def x11vnc_flags(profile=None):
+    """معاملات x11vnc للملف المطلوب (بدلاً من -noxdamage -noxfixes)"""
+    return list(get_profile(profile)['x11vnc'])
+
+def framebuffer_dir(display):
+    """مجلد ملف الإطار الخاص بعرض محدد (Xvfb يكتب فيه Xvfb_screen0)"""
+    return FRAMEBUFFER_DIR / display.lstrip(':')
+
+def xvfb_flags(display):
+    """معاملات Xvfb: امتدادات التغيير وملف إطار قابل للقراءة عبر mmap"""
+    flags = []
+    for extension in XVFB_EXTENSIONS:
+        flags += ["+extension", extension]
+    try:
+        directory = framebuffer_dir(display)
+        directory.mkdir(parents=True, exist_ok=True)
+        flags += ["-fbdir", str(directory)]
+    except OSError as e:
+        logger.warning(f"⚠️ تعذر إنشاء مجلد الإطار للعرض {display}: {e}")
+    return flags
+
+def capture_settings(profile=None):
+    """معاملات مسار الالتقاط الخاص بنا للملف المطلوب"""
+    return dict(get_profile(profile)['capture'])
@@ -0,0 +1,196 @@
+"""
+تحويل صيغة البكسل لكل عميل
+العملاء على روابط بطيئة (واجهة الموبايل مثلاً) يطلبون 16 أو 8 بت بدلاً من 24 بت: التحويل متجه بـ NumPy لكل مربع،
+والنتيجة (مضغوطة بـ zlib) تُخزن ببصمة المربع والصيغة فيأخذها كل العملاء بنفس الصيغة دون إعادة حساب ودون عمليات x11vnc إضافية
+
+الصيغ:
+    rgb24     3 بايت لكل بكسل (بدون تحويل)
+    rgb565    2 بايت لكل بكسل (little-endian)
+    rgb332    1 بايت لكل بكسل (3-3-2)
+    palette8  1 بايت لكل بكسل مع لوحة ألوان للمربع (دقيقة إن كانت الألوان ≤ 256، وإلا مكعب 6x6x6)
+"""
+
+import os
+import json
+import zlib
+import struct
+import hashlib
+import threading
+import functools
+import logging
+from collections import OrderedDict
+
+from import_profiler import lazy_import
+from metrics import timed
+
+# NumPy يُحمل عند أول تحويل فقط (أحداث التفاوض تُسجل مع إنشاء التطبيق)
+np = lazy_import('numpy')
+
+logger = logging.getLogger(__name__)
+
+PIXEL_FORMATS = ('rgb24', 'rgb565', 'rgb332', 'palette8')
+DEFAULT_FORMAT = os.environ.get("VNC_PIXEL_FORMAT", "rgb24")
+
+# ضلع مربع التحويل، وحجم ذاكرة التخزين بالميغابايت
+FORMAT_TILE = int(os.environ.get("VNC_FORMAT_TILE", "64"))
+FORMAT_CACHE_MB = float(os.environ.get("VNC_FORMAT_CACHE_MB", "64"))
+
+# رسالة المربعات الثنائية: توقيع + طول JSON + JSON + بيانات المربعات متتالية
+MESSAGE_MAGIC = b"VT01"
+
+@functools.lru_cache(maxsize=1)
+def cube_palette():
+    """لوحة المكعب 6x6x6 للمربعات كثيرة الألوان"""
+    levels = np.array([0, 51, 102, 153, 204, 255], dtype=np.uint8)
+    return np.stack(np.meshgrid(levels, levels, levels, indexing='ij'), axis=-1).reshape(-1, 3)
+
+def tile_hash(pixels):
+    """بصمة محتوى المربع مع أبعاده"""
+    digest = hashlib.blake2b(struct.pack("<HH", pixels.shape[1], pixels.shape[0]), digest_size=8)
+    digest.update(np.ascontiguousarray(pixels).data)
+    return digest.hexdigest()
+
+def to_rgb565(rgb):
+    r, g, b = (rgb[..., i].astype(np.uint16) for i in range(3))
+    return (((r >> 3) << 11) | ((g >> 2) << 5) | (b >> 3)).astype('<u2')
+
+def to_rgb332(rgb):
+    return (rgb[..., 0] & 0xE0) | ((rgb[..., 1] & 0xE0) >> 3) | (rgb[..., 2] >> 6)
+
+def to_palette(rgb):
+    """(اللوحة RGB، مؤشرات uint8): لوحة دقيقة إن أمكن وإلا المكعب"""
+    packed = (rgb[..., 0].astype(np.uint32) << 16) | (rgb[..., 1].astype(np.uint32) << 8) | rgb[..., 2]
+    colors, indices = np.unique(packed.ravel(), return_inverse=True)
+    if colors.size <= 256:
+        palette = np.stack([(colors >> 16) & 0xFF, (colors >> 8) & 0xFF, colors & 0xFF], axis=-1).astype(np.uint8)
+        return palette, indices.astype(np.uint8).reshape(rgb.shape[:2])
+    # أقرب مستوى من مستويات المكعب (0، 51، ...، 255): round(v / 51)
+    quantized = (rgb.astype(np.uint16) * 5 + 127) // 255
+    indices = quantized[..., 0] * 36 + quantized[..., 1] * 6 + quantized[..., 2]
+    return cube_palette(), indices.astype(np.uint8)
+
+def convert_tile(rgb, fmt):
+    """تحويل مربع RGB إلى الصيغة المطلوبة: (بيانات مضغوطة، لوحة مضغوطة أو b"")"""
+    if fmt == 'rgb24':
+        return zlib.compress(np.ascontiguousarray(rgb).tobytes(), 1), b""
+    if fmt == 'rgb565':
+        return zlib.compress(to_rgb565(rgb).tobytes(), 1), b""
+    if fmt == 'rgb332':
+        return zlib.compress(to_rgb332(rgb).tobytes(), 1), b""
+    if fmt == 'palette8':
+        palette, indices = to_palette(rgb)
+        return zlib.compress(indices.tobytes(), 1), palette.tobytes()
+    raise ValueError(f"صيغة بكسل غير مدعومة: {fmt}")
+
+def negotiate_format(requested=None, save_data=False):
+    """الصيغة الفعلية لعميل: المطلوبة إن كانت مدعومة، و'auto' تختار 16 بت عند طلب توفير البيانات"""
+    if requested in PIXEL_FORMATS:
+        return requested
+    if requested == 'auto':
+        return 'rgb565' if save_data else DEFAULT_FORMAT
+    return DEFAULT_FORMAT
+
+class ConversionCache:
+    """ذاكرة LRU محدودة بالحجم للمربعات المحولة مفهرسة بـ (بصمة المربع، الصيغة)"""
+
+    def __init__(self, max_bytes=FORMAT_CACHE_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        entry_size = len(entry[0]) + len(entry[1])
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = entry
+            self.size += entry_size
+            while self.size > self.max_bytes and self._entries:
+                _, (data, palette) = self._entries.popitem(last=False)
+                self.size -= len(data) + len(palette)
+
+    def get_status(self):
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'size_mb': round(self.size / 1024 / 1024, 2),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 3) if total else None,
+        }
+
+conversion_cache = ConversionCache()
+
+def iter_tiles(width, height, rects=None, tile=FORMAT_TILE):
+    """مربعات الشبكة الثابتة التي تتقاطع مع المناطق المطلوبة (أو الإطار كله)"""
+    columns, rows = -(-width // tile), -(-height // tile)
+    if rects is None:
+        selected = [(c, r) for r in range(rows) for c in range(columns)]
+    else:
+        grid = np.zeros((rows, columns), dtype=bool)
+        for x, y, w, h in rects:
+            grid[y // tile:-(-(y + h) // tile), x // tile:-(-(x + w) // tile)] = True
+        selected = [(int(c), int(r)) for r, c in zip(*np.nonzero(grid))]
+    for c, r in selected:
+        x, y = c * tile, r * tile
+        yield x, y, min(tile, width - x), min(tile, height - y)
+
+@timed('convert_tiles')
+def convert_frame(rgb, fmt, rects=None, cache=conversion_cache, hashes=None):
+    """تحويل مربعات الإطار (أو المتغيرة منها) مع التخزين؛ hashes قاموس اختياري لبصمات محسوبة مسبقاً"""
+    height, width = rgb.shape[:2]
+    tiles = []
+    for x, y, w, h in iter_tiles(width, height, rects):
+        pixels = rgb[y:y + h, x:x + w]
+        digest = (hashes or {}).get((x, y)) or tile_hash(pixels)
+        key = (digest, fmt)
+        entry = cache.get(key)
+        if entry is None:
+            entry = convert_tile(pixels, fmt)
+            cache.put(key, entry)
+        tiles.append({'x': x, 'y': y, 'w': w, 'h': h, 'hash': digest, 'data': entry[0], 'palette': entry[1]})
+    return tiles
+
+def pack_tiles(meta, tiles):
+    """رسالة ثنائية واحدة: VT01 + طول JSON + JSON (الوصف والإزاحات) + البيانات"""
+    blobs = []
+    offset = 0
+    described = []
+    for tile in tiles:
+        item = {key: tile[key] for key in ('x', 'y', 'w', 'h', 'hash')}
+        item.update(offset=offset, length=len(tile['data']), palette=len(tile['palette']))
+        blobs += [tile['data'], tile['palette']]
+        offset += len(tile['data']) + len(tile['palette'])
+        described.append(item)
+    header = json.dumps({**meta, 'tiles': described}, separators=(',', ':')).encode()
+    return MESSAGE_MAGIC + struct.pack("<I", len(header)) + header + b"".join(blobs)
+
+# الصيغة المتفق عليها لكل عميل Socket.IO
+client_formats = {}
+
+def register_format_events(socketio):
+    """تسجيل حدث التفاوض على صيغة البكسل"""
+    from flask import request
+
+    @socketio.on('set_pixel_format')
+    def handle_set_pixel_format(data=None):
+        data = data or {}
+        fmt = negotiate_format(data.get('format'), bool(data.get('save_data')))
+        client_formats[request.sid] = fmt
+        socketio.emit('pixel_format', {'format': fmt, 'supported': list(PIXEL_FORMATS)}, to=request.sid)
+
+def forget_client_format(sid):
+    client_formats.pop(sid, None)
@@ -0,0 +1,163 @@
+"""
+إدارة مجموعات العمليات
+كل حزمة (Xvfb + x11vnc + سطح المكتب) تعمل في مجموعة عمليات مستقلة، والإيقاف يستهدف تلك المجموعة فقط
+"""
+
+import os
+import socket
+import subprocess
+import threading
+import time
+import logging
+from pathlib import Path
+
+from metrics import timed
+from shutdown_coordinator import ShutdownCoordinator
+
+logger = logging.getLogger(__name__)
+
+# جذر cgroup v2 اختياري (مثال: /sys/fs/cgroup/vnc) لعزل الحزم بشكل أقوى
+CGROUP_ROOT = os.environ.get("VNC_CGROUP_ROOT")
+
+class ProcessGroup:
+    """مجموعة عمليات مدارة لحزمة VNC واحدة"""
+
+    def __init__(self, name):
+        self.name = name
+        self.pgid = None
+        self.processes = []
+        self._lock = threading.Lock()
+        self.cgroup = self._create_cgroup()
+
+    def _create_cgroup(self):
+        """إنشاء cgroup خاص بالمجموعة إن كان متاحاً"""
+        if not CGROUP_ROOT:
+            return None
+        try:
+            path = Path(CGROUP_ROOT) / self.name.replace('/', '_')
+            path.mkdir(parents=True, exist_ok=True)
+            return path
+        except OSError as e:
+            logger.warning(f"⚠️ تعذر إنشاء cgroup للمجموعة {self.name}: {e}")
+            return None
+
+    def spawn(self, cmd, **kwargs):
+        """تشغيل أمر داخل المجموعة"""
+        kwargs.setdefault('stdout', subprocess.DEVNULL)
+        kwargs.setdefault('stderr', subprocess.DEVNULL)
+
+        with timed('spawn', program=os.path.basename(cmd[0])), self._lock:
+            if self.pgid is None or not self.is_alive():
+                # أول عملية تصبح قائدة مجموعة جديدة في نفس الجلسة
+                process = subprocess.Popen(cmd, process_group=0, **kwargs)
+                self.pgid = process.pid
+                self.processes = []
+            else:
+                process = subprocess.Popen(cmd, process_group=self.pgid, **kwargs)
+
+            self.processes.append(process)
+
+        if self.cgroup:
+            try:
+                (self.cgroup / "cgroup.procs").write_text(str(process.pid))
+            except OSError as e:
+                logger.warning(f"⚠️ تعذر نقل العملية {process.pid} إلى cgroup: {e}")
+
+        return process
+
+    def _reap(self):
+        """جمع أبنائنا المنتهين حتى لا تبقى zombies تُبقي المجموعة حية
+        (الأحفاد اليتامى يجمعهم init، وإيقافهم عبر killpg أو cgroup.kill)"""
+        for process in self.processes:
+            process.poll()
+
+    def is_alive(self):
+        """هل بقي أي عضو في المجموعة"""
+        if self.pgid is None:
+            return False
+        self._reap()
+        try:
+            os.killpg(self.pgid, 0)
+            return True
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+
+    def signal(self, sig):
+        """إرسال إشارة لكل أعضاء المجموعة دفعة واحدة"""
+        if self.pgid is None:
+            return False
+        try:
+            os.killpg(self.pgid, sig)
+            return True
+        except ProcessLookupError:
+            return False
+
+    def _kill_cgroup(self):
+        """إنهاء كل عمليات cgroup (بما فيها من غيّر مجموعته)"""
+        if not self.cgroup:
+            return
+        try:
+            (self.cgroup / "cgroup.kill").write_text("1")
+        except OSError:
+            pass
+
+    def stop(self, grace_period=None):
+        """إيقاف المجموعة: SIGTERM للجميع دفعة واحدة ثم SIGKILL للمتأخرين فقط"""
+        if self.pgid is None:
+            return {'success': True, 'duration': 0, 'grace_period': grace_period, 'processes': []}
+
+        alive = [process for process in self.processes if process.poll() is None]
+        report = ShutdownCoordinator(grace_period).shutdown(alive, pgids=[self.pgid])
+        self._kill_cgroup()
+        if report['success']:
+            self.processes = []
+        else:
+            logger.warning(f"⚠️ بقيت عمليات في المجموعة {self.name} بعد الإيقاف")
+        return report
+
+    def stop_process(self, process, grace_period=None):
+        """إيقاف عضو واحد من المجموعة دون المساس بالبقية"""
+        if process is None or process.poll() is not None:
+            return True
+        report = ShutdownCoordinator(grace_period).shutdown([process])
+        return report['success']
+
+@timed('wait_for_port')
+def wait_for_port(port, timeout=5.0, host='127.0.0.1', process=None):
+    """انتظار فتح منفذ بدلاً من النوم لمدة ثابتة"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            return False
+        try:
+            with socket.create_connection((host, port), timeout=0.2):
+                return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+@timed('wait_for_display')
+def wait_for_display(display, timeout=5.0, process=None):
+    """انتظار جاهزية خادم X عبر socket العرض"""
+    socket_path = Path("/tmp/.X11-unix") / f"X{display.lstrip(':')}"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            return False
+        if socket_path.exists():
+            return True
+        time.sleep(0.05)
+    return False
+
+# المجموعات المدارة في هذه العملية
+_groups = {}
+_groups_lock = threading.Lock()
+
+def get_process_group(name):
+    """الحصول على مجموعة عمليات باسمها (وإنشاؤها عند الحاجة)"""
+    with _groups_lock:
+        if name not in _groups:
+            _groups[name] = ProcessGroup(name)
+        return _groups[name]
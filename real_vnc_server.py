@@ -10,18 +10,30 @@ import time
 import logging
 from pathlib import Path
 
+from address_discovery import get_address_discovery
+from display_pool import get_display_pool
+from metrics import timed
+from performance_profiles import x11vnc_flags, xvfb_flags
+from process_groups import get_process_group, wait_for_display, wait_for_port
+
 logger = logging.getLogger(__name__)
 
 class RealVNCServer:
     """خادم VNC حقيقي للاتصال الخارجي"""
     
-    def __init__(self):
-        self.display = ":1"
+    def __init__(self, display=None):
+        # بدون عرض محدد تُستعار شاشة مسخنة من المجمع
+        self.display = display
         self.port = 8000  # منفذ مدعوم في Replit
         self.password = "vnc123"
         self.screen_size = "1024x768"
         self.color_depth = 24
         
+        # مجموعة العمليات الخاصة بهذا الخادم
+        self.pooled = display is None
+        self.lease = None
+        self.group = None if self.pooled else get_process_group(f"real-vnc{self.display}")
+        
     def start_vnc_server(self):
         """بدء خادم VNC حقيقي"""
         try:
@@ -36,7 +48,11 @@ class RealVNCServer:
             self._stop_existing_vnc()
             
             # بدء خادم العرض الافتراضي
-            self._start_virtual_display()
+            if self._start_virtual_display() is None:
+                return {
+                    'success': False,
+                    'message': 'فشل في بدء خادم العرض الافتراضي'
+                }
             
             # بدء خادم VNC
             vnc_result = self._start_vnc_daemon()
@@ -82,19 +98,35 @@ class RealVNCServer:
         return True
     
     def _stop_existing_vnc(self):
-        """إيقاف أي خادم VNC موجود"""
+        """إيقاف خادم VNC السابق لهذا المدير فقط"""
         try:
-            # إيقاف x11vnc
-            subprocess.run(['pkill', '-f', 'x11vnc'], capture_output=True)
-            # إيقاف Xvfb
-            subprocess.run(['pkill', '-f', 'Xvfb'], capture_output=True)
-            time.sleep(1)
+            if self.lease:
+                self.lease.release()
+                self.lease = None
+                self.display = None
+            elif self.group:
+                self.group.stop()
         except:
             pass
     
+    def _spawn(self, cmd, **kwargs):
+        """تشغيل عملية ضمن حزمة هذا الخادم"""
+        if self.lease:
+            return self.lease.spawn(cmd, **kwargs)
+        return self.group.spawn(cmd, **kwargs)
+    
     def _start_virtual_display(self):
         """بدء خادم العرض الافتراضي"""
         try:
+            if self.pooled:
+                # شاشة مسخنة من المجمع بدلاً من تشغيل بارد
+                self.lease = get_display_pool().acquire(owner="real-vnc")
+                self.display = self.lease.display
+                self.group = self.lease.group
+                os.environ['DISPLAY'] = self.display
+                logger.info(f"تم استلام العرض {self.display} من مجمع الشاشات")
+                return self.lease.xvfb_process
+            
             cmd = [
                 'Xvfb', 
                 self.display,
@@ -102,18 +134,14 @@ class RealVNCServer:
                 '-ac', 
                 '+extension', 'GLX',
                 '+render',
-                '-noreset'
+                '-noreset',
+                *xvfb_flags(self.display)
             ]
             
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-                preexec_fn=os.setsid
-            )
+            process = self._spawn(cmd)
             
             # انتظار بدء الخادم
-            time.sleep(2)
+            wait_for_display(self.display, process=process)
             
             # تعيين متغير البيئة
             os.environ['DISPLAY'] = self.display
@@ -142,20 +170,19 @@ class RealVNCServer:
                 '-rfbauth', str(passwd_file),
                 '-forever',
                 '-shared',
-                '-bg',
+                *x11vnc_flags(),
                 '-o', '/tmp/x11vnc.log'
             ]
             
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            # بدون -bg حتى تبقى العملية داخل مجموعة الخادم
+            process = self._spawn(cmd)
             
-            if result.returncode == 0:
-                # التحقق من أن المنفذ مفتوح
-                time.sleep(1)
-                if self._check_port_open(self.port):
-                    logger.info(f"خادم VNC يعمل على المنفذ {self.port}")
-                    return True
+            # التحقق من أن المنفذ مفتوح
+            if wait_for_port(self.port, process=process):
+                logger.info(f"خادم VNC يعمل على المنفذ {self.port}")
+                return True
             
-            logger.error(f"فشل بدء x11vnc: {result.stderr}")
+            logger.error(f"فشل بدء x11vnc: رمز الخروج {process.poll()}")
             return False
             
         except Exception as e:
@@ -165,27 +192,25 @@ class RealVNCServer:
     def _setup_desktop_environment(self):
         """تهيئة بيئة سطح المكتب"""
         try:
-            # بدء مدير النوافذ البسيط
-            subprocess.Popen([
-                'fluxbox'
-            ], env=dict(os.environ, DISPLAY=self.display), 
-               stdout=subprocess.DEVNULL, 
-               stderr=subprocess.DEVNULL)
-            
-            time.sleep(1)
+            # بدء مدير النوافذ البسيط (الشاشة المسخنة لديها مدير نوافذ مسبقاً)
+            if not (self.lease and self.lease.wm_process):
+                self._spawn([
+                    'fluxbox'
+                ], env=dict(os.environ, DISPLAY=self.display))
+                
+                time.sleep(1)
             
             # بدء terminal
-            subprocess.Popen([
+            self._spawn([
                 'xterm', '-geometry', '80x24+10+10'
-            ], env=dict(os.environ, DISPLAY=self.display),
-               stdout=subprocess.DEVNULL, 
-               stderr=subprocess.DEVNULL)
+            ], env=dict(os.environ, DISPLAY=self.display))
             
             logger.info("تم تهيئة بيئة سطح المكتب")
             
         except Exception as e:
             logger.warning(f"تحذير: فشل تهيئة سطح المكتب: {e}")
     
+    @timed('check_port_open')
     def _check_port_open(self, port):
         """فحص المنفذ"""
         try:
@@ -197,24 +222,10 @@ class RealVNCServer:
             return False
     
     def _get_external_ip(self):
-        """الحصول على عنوان IP الخارجي"""
-        try:
-            # محاولة الحصول على IP الخارجي
-            import requests
-            response = requests.get('https://api.ipify.org?format=text', timeout=5)
-            if response.status_code == 200:
-                return response.text.strip()
-        except:
-            pass
-        
-        # محاولة الحصول على IP المحلي
-        try:
-            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
-                sock.connect(("8.8.8.8", 80))
-                return sock.getsockname()[0]
-        except:
-            return None
+        """الحصول على عنوان IP الخارجي (من الذاكرة المخبأة دون اتصال شبكي)"""
+        return get_address_discovery().get()
     
+    @timed('real_vnc_status')
     def get_status(self):
         """الحصول على حالة الخادم"""
         is_running = self._check_port_open(self.port)
@@ -0,0 +1,472 @@
+"""
+مسار التقاط الشاشة المعتمد على التغيير
+يقرأ إطار Xvfb مباشرة من ملف ‎-fbdir (صيغة XWD) عبر mmap دون نسخ أو بروتوكول X، ولا ينسخ إلا المناطق التي أبلغت عنها XDamage؛
+عند عدم توفر python-xlib يُستطلع الملف بفاصل ملف الأداء. كل إطار يمر على محرك المقارنة (tile_diff) فيستلم المشتركون
+(الترميز، المصغرات، التسجيل) رقم الإطار مع عمليات النسخ (التمرير) والمستطيلات المتغيرة فقط
+"""
+
+import os
+import mmap
+import time
+import select
+import struct
+import threading
+import logging
+from collections import deque
+
+import numpy as np
+
+from metrics import timed
+from performance_profiles import capture_settings, framebuffer_dir
+from tile_diff import TileDiffer
+
+logger = logging.getLogger(__name__)
+
+# حقول ترويسة XWD (كلها CARD32)
+XWD_FIELDS = (
+    'header_size', 'file_version', 'pixmap_format', 'pixmap_depth', 'pixmap_width', 'pixmap_height',
+    'xoffset', 'byte_order', 'bitmap_unit', 'bitmap_bit_order', 'bitmap_pad', 'bits_per_pixel',
+    'bytes_per_line', 'visual_class', 'red_mask', 'green_mask', 'blue_mask', 'bits_per_rgb',
+    'colormap_entries', 'ncolors', 'window_width', 'window_height', 'window_x', 'window_y', 'window_bdrwidth'
+)
+XWD_HEADER_SIZE = 4 * len(XWD_FIELDS)
+XWD_COLOR_SIZE = 12
+XWD_VERSION = 7
+
+# عدد الإطارات المحفوظة مناطقها المتغيرة للمشتركين المتأخرين
+DAMAGE_HISTORY = int(os.environ.get("VNC_DAMAGE_HISTORY", "120"))
+
+# عند تجاوز هذا العدد من المناطق تُدمج في مستطيل واحد
+MAX_RECTS = 64
+
+def parse_xwd_header(data):
+    """قراءة ترويسة XWD (Xvfb يكتبها بترتيب MSB أولاً)"""
+    for order in ('>', '<'):
+        header = dict(zip(XWD_FIELDS, struct.unpack_from(f"{order}{len(XWD_FIELDS)}I", data)))
+        if header['file_version'] == XWD_VERSION:
+            header['pixel_offset'] = header['header_size'] + header['ncolors'] * XWD_COLOR_SIZE
+            return header
+    raise ValueError("ملف الإطار ليس بصيغة XWD")
+
+def union_rect(rects):
+    """أصغر مستطيل يحوي كل المستطيلات"""
+    x0 = min(r[0] for r in rects)
+    y0 = min(r[1] for r in rects)
+    x1 = max(r[0] + r[2] for r in rects)
+    y1 = max(r[1] + r[3] for r in rects)
+    return (x0, y0, x1 - x0, y1 - y0)
+
+def coalesce_rects(rects, width, height):
+    """قص المناطق إلى حدود الشاشة وإزالة المكرر، ودمجها إن كثرت"""
+    clipped = set()
+    for x, y, w, h in rects:
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(width, x + w), min(height, y + h)
+        if x1 > x0 and y1 > y0:
+            clipped.add((x0, y0, x1 - x0, y1 - y0))
+    # إزالة المناطق المحتواة في غيرها
+    result = [r for r in clipped if not any(
+        o != r and o[0] <= r[0] and o[1] <= r[1] and o[0] + o[2] >= r[0] + r[2] and o[1] + o[3] >= r[1] + r[3]
+        for o in clipped)]
+    if len(result) > MAX_RECTS:
+        return [union_rect(result)]
+    return sorted(result, key=lambda r: (r[1], r[0]))
+
+class Framebuffer:
+    """إطار Xvfb مربوط بالذاكرة (‎-fbdir/Xvfb_screen0)"""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._file = open(self.path, 'rb')
+        self._inode = os.fstat(self._file.fileno()).st_ino
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.header = parse_xwd_header(self._map)
+        self.width = self.header['pixmap_width']
+        self.height = self.header['pixmap_height']
+        self.bits_per_pixel = self.header['bits_per_pixel']
+        self.bytes_per_pixel = self.bits_per_pixel // 8
+        self.stride = self.header['bytes_per_line']
+        offset = self.header['pixel_offset']
+        # عرض بدون نسخ لصفوف البكسلات كما هي في الذاكرة
+        self.pixels = np.frombuffer(self._map, dtype=np.uint8, count=self.stride * self.height,
+                                    offset=offset).reshape(self.height, self.stride)
+
+    @property
+    def pixel_format(self):
+        """صيغة البكسل الأصلية للإطار"""
+        return {
+            'bits_per_pixel': self.bits_per_pixel,
+            'depth': self.header['pixmap_depth'],
+            'big_endian': self.header['byte_order'] == 1,
+            'red_mask': self.header['red_mask'],
+            'green_mask': self.header['green_mask'],
+            'blue_mask': self.header['blue_mask'],
+        }
+
+    def is_stale(self):
+        """هل أعيد إنشاء الملف (إعادة تشغيل Xvfb)"""
+        try:
+            return os.stat(self.path).st_ino != self._inode
+        except OSError:
+            return True
+
+    def close(self):
+        self.pixels = None
+        try:
+            self._map.close()
+        except BufferError:
+            # ما زالت هناك عروض numpy على الذاكرة؛ تُغلق عند تحريرها
+            pass
+        self._file.close()
+
+def to_rgb(rows, pixel_format, width):
+    """تحويل صفوف البكسلات الأصلية (32 أو 16 بت) إلى مصفوفة RGB"""
+    bpp = pixel_format['bits_per_pixel']
+    if bpp == 32:
+        pixels = rows[:, :width * 4].reshape(rows.shape[0], width, 4)
+        channels = []
+        for mask in (pixel_format['red_mask'], pixel_format['green_mask'], pixel_format['blue_mask']):
+            shift = (mask & -mask).bit_length() - 1
+            index = shift // 8
+            channels.append(3 - index if pixel_format['big_endian'] else index)
+        return pixels[:, :, channels]
+    if bpp == 16:
+        dtype = '>u2' if pixel_format['big_endian'] else '<u2'
+        values = rows[:, :width * 2].copy().view(dtype).astype(np.uint32)
+        rgb = np.empty(values.shape + (3,), dtype=np.uint8)
+        for i, mask in enumerate((pixel_format['red_mask'], pixel_format['green_mask'], pixel_format['blue_mask'])):
+            shift = (mask & -mask).bit_length() - 1
+            bits = mask.bit_count()
+            channel = (values & mask) >> shift
+            rgb[:, :, i] = (channel * 255 // ((1 << bits) - 1)).astype(np.uint8)
+        return rgb
+    raise ValueError(f"عمق بكسل غير مدعوم: {bpp}")
+
+class XDamageSource:
+    """مصدر تغيير من امتداد XDamage (يحجب على مقبس X دون أي استهلاك للمعالج عند الخمول)"""
+
+    name = 'xdamage'
+
+    def __init__(self, display):
+        from Xlib import display as xdisplay
+        from Xlib.ext import damage
+
+        self.connection = xdisplay.Display(display)
+        if not self.connection.has_extension('DAMAGE'):
+            self.connection.close()
+            raise RuntimeError("امتداد DAMAGE غير متوفر في خادم X")
+        self.connection.damage_query_version()
+        root = self.connection.screen().root
+        self.damage = root.damage_create(damage.DamageReportRawRectangles)
+        self.event_type = self.connection.extension_event.DamageNotify
+        self.connection.flush()
+
+    def wait(self, timeout):
+        """انتظار مناطق متغيرة (قائمة فارغة عند انتهاء المهلة)"""
+        if not self.connection.pending_events():
+            readable, _, _ = select.select([self.connection.fileno()], [], [], timeout)
+            if not readable:
+                return []
+        return self.drain()
+
+    def drain(self):
+        rects = []
+        while self.connection.pending_events():
+            event = self.connection.next_event()
+            if event.type == self.event_type:
+                area = event.area
+                rects.append((area.x, area.y, area.width, area.height))
+        return rects
+
+    def close(self):
+        try:
+            self.connection.damage_destroy(self.damage)
+            self.connection.close()
+        except Exception:
+            pass
+
+class PollingDamageSource:
+    """بديل بدون python-xlib: مقارنة الصفوف مع آخر نسخة بفاصل ملف الأداء"""
+
+    name = 'polling'
+
+    def __init__(self, framebuffer, interval):
+        self.framebuffer = framebuffer
+        self.interval = interval
+        self.previous = framebuffer.pixels.copy()
+
+    def wait(self, timeout):
+        time.sleep(min(self.interval, timeout))
+        return self.drain()
+
+    def drain(self):
+        current = self.framebuffer.pixels
+        changed = np.flatnonzero((current != self.previous).any(axis=1))
+        if changed.size == 0:
+            return []
+        self.previous = current.copy()
+        # تجميع الصفوف المتتالية في أشرطة كاملة العرض
+        breaks = np.flatnonzero(np.diff(changed) > 1)
+        starts = np.concatenate(([changed[0]], changed[breaks + 1]))
+        ends = np.concatenate((changed[breaks], [changed[-1]]))
+        return [(0, int(s), self.framebuffer.width, int(e - s + 1)) for s, e in zip(starts, ends)]
+
+    def close(self):
+        pass
+
+class CaptureStage:
+    """التقاط مشترك لعرض واحد: إطار مرقم بالإصدار ومناطق متغيرة لكل المشتركين"""
+
+    def __init__(self, display, profile=None):
+        self.display = display
+        self.settings = capture_settings(profile)
+        self.path = framebuffer_dir(display) / "Xvfb_screen0"
+        self.framebuffer = None
+        self.source = None
+        self.frame = None
+        self.version = 0
+        self.updated_at = None
+        self._history = deque(maxlen=DAMAGE_HISTORY)
+        self._differ = None
+        self._subscribers = []
+        self._retire_callbacks = []
+        self.retired = False
+        self._lock = threading.Lock()
+        self._thread = None
+        self._running = False
+
+    @property
+    def available(self):
+        """هل يكتب Xvfb ملف الإطار لهذا العرض"""
+        return self.path.exists()
+
+    @property
+    def width(self):
+        return self.framebuffer.width if self.framebuffer else None
+
+    @property
+    def height(self):
+        return self.framebuffer.height if self.framebuffer else None
+
+    @property
+    def pixel_format(self):
+        return self.framebuffer.pixel_format if self.framebuffer else None
+
+    def _open(self):
+        """ربط ملف الإطار واختيار مصدر التغيير"""
+        if self.source:
+            self.source.close()
+        if self.framebuffer:
+            self.framebuffer.close()
+        self.framebuffer = Framebuffer(self.path)
+        with self._lock:
+            self.frame = self.framebuffer.pixels.copy()
+            self._differ = TileDiffer(bytes_per_pixel=self.framebuffer.bytes_per_pixel)
+            update = self._differ.diff(self.frame)
+            self.version += 1
+            self.updated_at = time.time()
+            self._history.append((self.version, update))
+        try:
+            self.source = XDamageSource(self.display)
+        except Exception as e:
+            logger.info(f"ℹ️ XDamage غير متاح للعرض {self.display} ({e})، استطلاع كل {self.settings['poll_interval']} ثانية")
+            self.source = PollingDamageSource(self.framebuffer, self.settings['poll_interval'])
+        logger.info(f"✅ التقاط {self.display} بدقة {self.framebuffer.width}x{self.framebuffer.height} عبر {self.source.name}")
+
+    def start(self):
+        """بدء خيط الالتقاط (مرة واحدة)"""
+        with self._lock:
+            if self._running:
+                return True
+            if not self.available:
+                return False
+            self._running = True
+        try:
+            self._open()
+        except Exception as e:
+            self._running = False
+            logger.error(f"خطأ في فتح إطار العرض {self.display}: {e}")
+            return False
+        # المؤشر يُنقل على قناته الخاصة ويُخفى من الإطار حتى لا تُسبب حركته تحديثات
+        from cursor_channel import forget_cursor_display, get_cursor_tracker
+        get_cursor_tracker(self.display)
+        self.on_retire(lambda stage: forget_cursor_display(stage.display))
+        self._thread = threading.Thread(target=self._run, daemon=True, name=f"capture{self.display}")
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._running = False
+
+    def subscribe(self, callback):
+        """callback(stage, version, update) عند كل إطار جديد؛ update = {'copies': [...], 'rects': [...]}"""
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def on_retire(self, callback):
+        """callback(stage) عند انتهاء المرحلة لاختفاء إطار العرض (فوراً إن كانت قد انتهت)"""
+        with self._lock:
+            if not self.retired:
+                self._retire_callbacks.append(callback)
+                return
+        callback(self)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def _run(self):
+        min_interval = 1.0 / self.settings['max_fps']
+        defer = self.settings['defer_ms'] / 1000
+        # مهلة الانتظار لا تقل عن فاصل الاستطلاع حتى لا تقطعه (ملف "توفير" يستطلع كل ثانيتين)
+        timeout = max(1.0, self.settings['poll_interval'])
+        last_frame = 0.0
+        while self._running:
+            try:
+                if self.framebuffer.is_stale():
+                    if not self.available:
+                        self._retire()
+                        return
+                    self._open()
+                rects = self.source.wait(timeout=timeout)
+                if not rects:
+                    continue
+                # دمج التحديثات المتقاربة ثم احترام أقصى معدل إطارات
+                wait = max(defer, min_interval - (time.monotonic() - last_frame))
+                if wait > 0:
+                    time.sleep(wait)
+                    rects += self.source.drain()
+                last_frame = time.monotonic()
+                self._apply(rects)
+            except Exception as e:
+                logger.error(f"خطأ في التقاط العرض {self.display}: {e}")
+                time.sleep(1)
+
+    def _retire(self):
+        """إيقاف مرحلة عرض اختفى ملف إطاره (انتهى Xvfb) وإخراجها من السجل؛ يُنشأ غيرها إن عاد العرض"""
+        logger.info(f"🛑 اختفى إطار العرض {self.display}، إيقاف الالتقاط")
+        self._running = False
+        self.source.close()
+        with _stages_lock:
+            if _stages.get(self.display) is self:
+                del _stages[self.display]
+        with self._lock:
+            self.retired = True
+            callbacks, self._retire_callbacks = self._retire_callbacks, []
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception as e:
+                logger.error(f"خطأ في إنهاء مشترك الالتقاط: {e}")
+
+    @timed('capture_frame')
+    def _apply(self, rects):
+        """نسخ المناطق المتغيرة فقط من ملف الإطار ثم مقارنتها بالمربعات وإبلاغ المشتركين"""
+        framebuffer = self.framebuffer
+        rects = coalesce_rects(rects, framebuffer.width, framebuffer.height)
+        if not rects:
+            return
+        bpp = framebuffer.bytes_per_pixel
+        with self._lock:
+            for x, y, w, h in rects:
+                self.frame[y:y + h, x * bpp:(x + w) * bpp] = framebuffer.pixels[y:y + h, x * bpp:(x + w) * bpp]
+            update = self._differ.diff(self.frame)
+            if not update['rects'] and not update['copies']:
+                # أبلغت XDamage عن رسم لم يغير أي بكسل
+                return
+            self.version += 1
+            self.updated_at = time.time()
+            self._history.append((self.version, update))
+            version = self.version
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(self, version, update)
+            except Exception as e:
+                logger.error(f"خطأ في مشترك الالتقاط: {e}")
+
+    def damage_since(self, version):
+        """المناطق المتغيرة منذ إصدار معين (None إن خرج من السجل)"""
+        with self._lock:
+            if version == self.version:
+                return []
+            if not self._history or version < self._history[0][0] - 1:
+                return None
+            rects = [rect for v, update in self._history if v > version
+                     for rect in update['rects'] + [copy[2:] for copy in update['copies']]]
+        return coalesce_rects(rects, self.width, self.height)
+
+    def raw_frame(self):
+        """نسخة من بايتات الإطار بصيغته الأصلية (لمرمز الفيديو)"""
+        with self._lock:
+            return self.frame.tobytes()
+
+    def snapshot(self, region=None):
+        """(الإصدار، صورة RGB) للإطار كاملاً أو لمنطقة منه"""
+        with self._lock:
+            if self.frame is None:
+                return self.version, None
+            x, y, w, h = region or (0, 0, self.width, self.height)
+            bpp = self.framebuffer.bytes_per_pixel
+            rows = self.frame[y:y + h, x * bpp:(x + w) * bpp].copy()
+            version = self.version
+        return version, to_rgb(rows, self.pixel_format, w)
+
+    def downscaled(self, width, height):
+        """(الإصدار، صورة RGB مصغرة): عينات 2x2 لكل بكسل ناتج تُتوسط، دون تحويل الإطار كاملاً"""
+        with self._lock:
+            if self.frame is None:
+                return self.version, None
+            bpp = self.framebuffer.bytes_per_pixel
+            ys = ((np.arange(height * 2) + 0.5) * self.height / (height * 2)).astype(np.intp)
+            xs = ((np.arange(width * 2) + 0.5) * self.width / (width * 2)).astype(np.intp)
+            columns = (xs[:, None] * bpp + np.arange(bpp)).ravel()
+            rows = self.frame[ys[:, None], columns]
+            version = self.version
+        rgb = to_rgb(rows, self.pixel_format, width * 2).astype(np.uint16)
+        return version, (rgb.reshape(height, 2, width, 2, 3).sum(axis=(1, 3)) >> 2).astype(np.uint8)
+
+    def get_status(self):
+        return {
+            'display': self.display,
+            'running': self._running,
+            'source': self.source.name if self.source else None,
+            'version': self.version,
+            'size': [self.width, self.height] if self.framebuffer else None,
+            'pixel_format': self.pixel_format,
+            'settings': self.settings,
+        }
+
+# مراحل الالتقاط المفهرسة برقم العرض
+_stages = {}
+_stages_lock = threading.Lock()
+
+def get_capture_stage(display, start=True):
+    """الحصول على مرحلة الالتقاط المشتركة لعرض (وبدؤها عند الحاجة)"""
+    with _stages_lock:
+        if display not in _stages:
+            _stages[display] = CaptureStage(display)
+        stage = _stages[display]
+    if start:
+        stage.start()
+    return stage
+
+def find_displays():
+    """كل العروض التي يكتب Xvfb ملفات إطارها"""
+    root = framebuffer_dir(":0").parent
+    if not root.exists():
+        return []
+    return [f":{path.parent.name}" for path in sorted(root.glob("*/Xvfb_screen0"))]
+
+def is_known_display(display):
+    """هل العرض من العروض التي يكتب Xvfb إطارها (للتحقق من عروض يرسلها العملاء)"""
+    return display in find_displays()
+
+def find_active_display():
+    """أول عرض يكتب Xvfb ملف إطاره"""
+    env_display = os.environ.get("DISPLAY")
+    if env_display and (framebuffer_dir(env_display) / "Xvfb_screen0").exists():
+        return env_display
+    displays = find_displays()
+    return displays[0] if displays else None
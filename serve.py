@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Serve - مشغل الإنتاج لخوادم الويب
+يفعّل gevent/eventlet قبل استيراد التطبيق ثم يشغله بخادم غير متزامن بدلاً من خادم Werkzeug التطويري
+
+الاستخدام:
+    python serve.py control --port 5000          # لوحة التحكم مع Socket.IO
+    python serve.py web-vnc --port 8080          # واجهة VNC Web
+    python serve.py novnc                        # خادم noVNC
+    VNC_ASYNC_MODE=eventlet python serve.py control
+
+مع gunicorn (عامل واحد لكل عملية بسبب جلسات Socket.IO):
+    gunicorn -k gevent -w 1 --bind 0.0.0.0:5000 'serve:build_app("control")'
+    gunicorn -k eventlet -w 1 --bind 0.0.0.0:5000 'serve:build_app("control")'
+"""
+
+import os
+import argparse
+import logging
+
+from async_runtime import detect_async_mode, patch_runtime, serve_app
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# الهدف: المنفذ الافتراضي
+TARGETS = {"control": 5000, "web-vnc": 8080, "novnc": 8080}
+
+def build_app(target="control"):
+    """بناء التطبيق المطلوب (يُستدعى بعد تفعيل monkey patching)"""
+    if target == "control":
+        from flask_app import create_app
+        return create_app()
+    if target == "web-vnc":
+        from web_vnc_interface import WebVNCInterface
+        return WebVNCInterface().app
+    if target == "novnc":
+        from web_interface import NoVNCServer
+        return NoVNCServer().app
+    raise ValueError(f"هدف غير معروف: {target}")
+
+def main():
+    """البرنامج الرئيسي"""
+    parser = argparse.ArgumentParser(description="تشغيل خوادم الويب بنمط غير متزامن")
+    parser.add_argument("target", nargs="?", default="control", choices=TARGETS)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=None)
+    parser.add_argument("--mode", default=None, help="auto أو gevent أو eventlet أو threading")
+    args = parser.parse_args()
+
+    # يجب أن يسبق التفعيل أي استيراد لـ Flask أو socket
+    mode = patch_runtime(detect_async_mode(args.mode))
+    port = args.port or int(os.environ.get("PORT", TARGETS[args.target]))
+
+    try:
+        if args.target == "control":
+            app = build_app("control")
+            from flask_app import socketio
+            logger.info(f"🌐 تشغيل لوحة التحكم على {args.host}:{port} ({mode})")
+            serve_app(app, args.host, port, socketio=socketio)
+        elif args.target == "novnc":
+            from web_interface import NoVNCServer
+            server = NoVNCServer()
+            server.http_port = port
+            server.run()
+        else:
+            from web_vnc_interface import WebVNCInterface
+            WebVNCInterface().run(host=args.host, port=port)
+    except KeyboardInterrupt:
+        logger.info("تم إيقاف الخادم")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+استمرارية جلسات سطح المكتب
+ملفات تعريف المتصفحات في مجلد دائم، حفظ التطبيقات ومواقع النوافذ لاستعادتها، وتعليق الجلسات الخاملة بدلاً من قتلها
+"""
+
+import os
+import json
+import shutil
+import signal
+import subprocess
+import time
+import logging
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+SESSIONS_DIR = Path(os.environ.get("VNC_SESSIONS_DIR", Path.home() / ".vnc" / "sessions"))
+
+# مدة الخمول قبل التعليق بالثواني (0 للتعطيل)
+IDLE_SUSPEND_SECONDS = int(os.environ.get("VNC_IDLE_SUSPEND", "600"))
+
+FIREFOX_BINARIES = ("firefox", "firefox-esr")
+CHROMIUM_BINARIES = ("chromium", "chromium-browser", "google-chrome")
+
+class DesktopSession:
+    """جلسة سطح مكتب دائمة: ملفات التعريف والتخطيط وحالة التعليق"""
+
+    def __init__(self, name):
+        self.name = name
+        self.session_dir = SESSIONS_DIR / name
+        self.session_dir.mkdir(parents=True, exist_ok=True)
+        self.layout_file = self.session_dir / "layout.json"
+        self.pids_file = self.session_dir / "apps.pids"
+
+        # التطبيقات المشغلة: [(entry, process)]
+        self.apps = []
+        self.suspended = False
+        self.last_activity = time.monotonic()
+
+    # ---- ملفات التعريف ----
+
+    def profile_dir(self, app_name):
+        """مجلد ملف التعريف الدائم لتطبيق"""
+        path = self.session_dir / "profiles" / app_name
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def prepare_command(self, entry):
+        """بناء أمر التشغيل مع ملف التعريف الدائم ومواقع النوافذ المحفوظة"""
+        cmd = list(entry['cmd'])
+        binary = os.path.basename(cmd[0])
+        geometry = entry.get('geometry')
+
+        if binary in FIREFOX_BINARIES:
+            # إزالة أي ملف تعريف مؤقت (مثل /tmp/firefox-vnc)
+            if "--profile" in cmd:
+                index = cmd.index("--profile")
+                del cmd[index:index + 2]
+            cmd += ["--profile", str(self.profile_dir("firefox"))]
+
+        elif binary in CHROMIUM_BINARIES:
+            cmd = [arg for arg in cmd if not arg.startswith(("--user-data-dir=", "--window-position=", "--window-size="))]
+            cmd.append(f"--user-data-dir={self.profile_dir('chromium')}")
+            if geometry:
+                cmd.append(f"--window-position={geometry['x']},{geometry['y']}")
+                cmd.append(f"--window-size={geometry['width']},{geometry['height']}")
+
+        elif binary == "xterm" and geometry and "-geometry" in cmd:
+            # الإبقاء على عدد الأعمدة والأسطر مع استعادة الموقع
+            index = cmd.index("-geometry") + 1
+            size = cmd[index].split('+')[0].split('-')[0]
+            cmd[index] = f"{size}+{geometry['x']}+{geometry['y']}"
+
+        return cmd
+
+    # ---- التخطيط ----
+
+    def load_layout(self):
+        """قراءة التخطيط المحفوظ (أو None)"""
+        try:
+            with open(self.layout_file) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save_layout(self):
+        """حفظ التطبيقات الحالية ومواقع نوافذها"""
+        layout = [entry for entry, process in self.apps if process.poll() is None]
+        try:
+            tmp = self.layout_file.with_suffix(".tmp")
+            with open(tmp, 'w') as f:
+                json.dump(layout, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, self.layout_file)
+        except OSError as e:
+            logger.warning(f"⚠️ تعذر حفظ تخطيط الجلسة {self.name}: {e}")
+        return layout
+
+    def snapshot(self, display):
+        """التقاط مواقع النوافذ الحالية عبر wmctrl وحفظ التخطيط"""
+        if shutil.which("wmctrl"):
+            try:
+                result = subprocess.run(
+                    ["wmctrl", "-lpG"], capture_output=True, text=True, timeout=2,
+                    env=dict(os.environ, DISPLAY=display)
+                )
+                windows = {}
+                for line in result.stdout.splitlines():
+                    parts = line.split(None, 8)
+                    if len(parts) >= 7:
+                        pid, x, y, width, height = (int(v) for v in parts[2:7])
+                        windows.setdefault(pid, {'x': x, 'y': y, 'width': width, 'height': height})
+                for entry, process in self.apps:
+                    if process.pid in windows:
+                        entry['geometry'] = windows[process.pid]
+            except (subprocess.SubprocessError, ValueError) as e:
+                logger.warning(f"⚠️ تعذر قراءة مواقع النوافذ: {e}")
+        return self.save_layout()
+
+    # ---- التشغيل والاستعادة ----
+
+    def launch(self, default_apps, spawn, display):
+        """تشغيل تطبيقات الجلسة (التخطيط المحفوظ أولاً) دون انتظار بين التطبيقات"""
+        # التخطيط المحفوظ مقيد بالتطبيقات المسموحة حالياً (مثل استبعاد مدير النوافذ المشغل مسبقاً)
+        allowed = {cmd[0] for cmd in default_apps}
+        layout = [entry for entry in self.load_layout() or [] if entry['cmd'][0] in allowed]
+        entries = layout if layout else [{'cmd': list(cmd)} for cmd in default_apps]
+        if layout:
+            logger.info(f"♻️ استعادة {len(entries)} تطبيق من تخطيط الجلسة {self.name}")
+
+        launched = []
+        for entry in entries:
+            try:
+                process = spawn(self.prepare_command(entry), env=dict(os.environ, DISPLAY=display))
+                self.apps.append((entry, process))
+                launched.append(entry['cmd'][0])
+                logger.info(f"✅ تم تشغيل {entry['cmd'][0]}")
+            except FileNotFoundError:
+                logger.warning(f"⚠️ التطبيق غير موجود: {entry['cmd'][0]}")
+            except Exception as e:
+                logger.warning(f"⚠️ فشل في تشغيل {entry['cmd'][0]}: {e}")
+
+        self._write_pids()
+        self.save_layout()
+        return launched
+
+    def _app_pids(self):
+        """معرفات التطبيقات الحية مع عملياتها الفرعية (مثل عمليات عرض المتصفح)"""
+        pids = [process.pid for _, process in self.apps if process.poll() is None]
+        try:
+            import psutil
+            for pid in list(pids):
+                try:
+                    pids += [child.pid for child in psutil.Process(pid).children(recursive=True)]
+                except psutil.Error:
+                    pass
+        except ImportError:
+            pass
+        return pids
+
+    def _write_pids(self, pids=None):
+        """كتابة معرفات التطبيقات ليستخدمها أمر الاستئناف في x11vnc"""
+        pids = self._app_pids() if pids is None else pids
+        try:
+            self.pids_file.write_text(" ".join(str(pid) for pid in pids))
+        except OSError:
+            pass
+
+    def resume_hook(self):
+        """أمر shell يستأنف الجلسة فور قبول x11vnc لعميل (-afteraccept)"""
+        return f"kill -CONT $(cat {self.pids_file}) 2>/dev/null"
+
+    # ---- التعليق والاستئناف ----
+
+    def _signal_apps(self, sig, pids):
+        count = 0
+        for pid in pids:
+            try:
+                os.kill(pid, sig)
+                count += 1
+            except ProcessLookupError:
+                pass
+        return count
+
+    def suspend(self, display=None):
+        """تعليق تطبيقات الجلسة (SIGSTOP) مع حفظ التخطيط أولاً"""
+        if self.suspended:
+            return 0
+        if display:
+            self.snapshot(display)
+        pids = self._app_pids()
+        self._write_pids(pids)
+        count = self._signal_apps(signal.SIGSTOP, pids)
+        self.suspended = True
+        logger.info(f"⏸️ تم تعليق {count} تطبيق في الجلسة {self.name}")
+        return count
+
+    def resume(self):
+        """استئناف فوري لتطبيقات الجلسة (SIGCONT)"""
+        self.last_activity = time.monotonic()
+        if not self.suspended:
+            return 0
+        count = self._signal_apps(signal.SIGCONT, self._app_pids())
+        self.suspended = False
+        logger.info(f"▶️ تم استئناف {count} تطبيق في الجلسة {self.name}")
+        return count
+
+    def mark_active(self):
+        """تسجيل نشاط (اتصال عميل) واستئناف الجلسة إن كانت معلقة"""
+        self.resume()
+
+    def suspend_if_idle(self, display=None, idle_seconds=None):
+        """تعليق الجلسة إن تجاوز خمولها المدة المحددة"""
+        idle_seconds = IDLE_SUSPEND_SECONDS if idle_seconds is None else idle_seconds
+        if idle_seconds <= 0 or self.suspended:
+            return False
+        if time.monotonic() - self.last_activity >= idle_seconds:
+            self.suspend(display)
+            return True
+        return False
+
+    def forget_processes(self):
+        """نسيان العمليات بعد إيقاف الحزمة (يبقى التخطيط المحفوظ)"""
+        self.apps = []
+        self.suspended = False
+        try:
+            self.pids_file.unlink()
+        except OSError:
+            pass
@@ -0,0 +1,428 @@
+"""
+تسجيل الجلسات بصيغة قابلة للتنقل
+ملف التسجيل إلحاقي مقسم إلى كتل: إطار مفتاحي كامل كل VNC_RECORD_KEYFRAME_INTERVAL ثانية، وبينها فروقات المربعات المتغيرة
+(النسخ والمستطيلات كما يخرجها tile_diff) مضغوطة بـ zlib؛ ملف فهرس جانبي بسجل ثابت الحجم لكل كتلة (الزمن، الإزاحة، النوع).
+التشغيل يربط الملفين بالذاكرة ويقفز إلى أي زمن بفك أقرب إطار مفتاحي قبله ثم تطبيق الفروقات التالية فقط
+
+الصيغة:
+    VREC + طول JSON (uint32) + JSON (الأبعاد وصيغة البكسل)
+    كتل: نوع (KEYF أو DELT) + طول (uint32) + زمن (float64) + إصدار (uint64) + بيانات zlib
+    .idx: سجلات <dQB (الزمن، إزاحة الكتلة، مفتاحي؟)
+"""
+
+import os
+import json
+import mmap
+import zlib
+import queue
+import struct
+import threading
+import time
+import logging
+from datetime import datetime
+from pathlib import Path
+
+from import_profiler import lazy_import
+from metrics import timed
+
+np = lazy_import('numpy')
+
+logger = logging.getLogger(__name__)
+
+RECORDING_DIR = Path(os.environ.get("VNC_RECORDING_DIR", "recordings"))
+KEYFRAME_INTERVAL = float(os.environ.get("VNC_RECORD_KEYFRAME_INTERVAL", "10"))
+
+# تسجيل كل جلسة تلقائياً عند بدئها
+RECORD_SESSIONS = os.environ.get("VNC_RECORD_SESSIONS", "0") == "1"
+
+FILE_MAGIC = b"VREC"
+KEYFRAME = b"KEYF"
+DELTA = b"DELT"
+CHUNK_HEADER = struct.Struct("<4sIdQ")
+INDEX_RECORD = struct.Struct("<dQB")
+RECT = struct.Struct("<4H")
+COPY = struct.Struct("<6H")
+DELTA_HEADER = struct.Struct("<HH")
+
+def _index_dtype():
+    return np.dtype([('time', '<f8'), ('offset', '<u8'), ('key', 'u1')])
+
+def encode_delta(copies, rects, pixels):
+    """بيانات كتلة فروقات: عدد النسخ والمستطيلات، جداولها، ثم بايتات المستطيلات متتالية"""
+    parts = [DELTA_HEADER.pack(len(copies), len(rects))]
+    parts += [COPY.pack(*copy) for copy in copies]
+    parts += [RECT.pack(*rect) for rect in rects]
+    parts += pixels
+    return zlib.compress(b"".join(parts), 1)
+
+def apply_delta(frame, payload, bytes_per_pixel):
+    """تطبيق كتلة فروقات على الإطار (النسخ أولاً ثم المستطيلات)"""
+    data = zlib.decompress(payload)
+    copy_count, rect_count = DELTA_HEADER.unpack_from(data, 0)
+    offset = DELTA_HEADER.size
+    bpp = bytes_per_pixel
+    for _ in range(copy_count):
+        src_x, src_y, x, y, w, h = COPY.unpack_from(data, offset)
+        offset += COPY.size
+        frame[y:y + h, x * bpp:(x + w) * bpp] = frame[src_y:src_y + h, src_x * bpp:(src_x + w) * bpp].copy()
+    rects = []
+    for _ in range(rect_count):
+        rects.append(RECT.unpack_from(data, offset))
+        offset += RECT.size
+    for x, y, w, h in rects:
+        size = w * bpp * h
+        frame[y:y + h, x * bpp:(x + w) * bpp] = np.frombuffer(data, np.uint8, size, offset).reshape(h, w * bpp)
+        offset += size
+
+class SessionRecorder:
+    """مسجل عرض واحد: النسخ في خيط الالتقاط (بايتات المناطق المتغيرة فقط) والضغط والكتابة في خيط خاص"""
+
+    def __init__(self, path, width, height, stride, bytes_per_pixel, pixel_format, display=None,
+                 keyframe_interval=KEYFRAME_INTERVAL):
+        self.path = Path(path)
+        self.width = width
+        self.height = height
+        self.stride = stride
+        self.bytes_per_pixel = bytes_per_pixel
+        self.keyframe_interval = keyframe_interval
+        self.started = time.monotonic()
+        self.chunks = 0
+        self.keyframes = 0
+        self.bytes_written = 0
+        self._last_keyframe = None
+        self._queue = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stage = None
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        header = json.dumps({
+            'display': display,
+            'width': width,
+            'height': height,
+            'stride': stride,
+            'bytes_per_pixel': bytes_per_pixel,
+            'pixel_format': pixel_format,
+            'started_at': datetime.utcnow().isoformat(),
+            'keyframe_interval': keyframe_interval,
+        }).encode()
+        self._file = open(self.path, "wb")
+        self._file.write(FILE_MAGIC + struct.pack("<I", len(header)) + header)
+        self._index = open(self.path.with_suffix(".idx"), "wb")
+
+    @classmethod
+    def for_stage(cls, stage, path, **kwargs):
+        """مسجل مربوط بمرحلة التقاط: يستلم كل إطار جديد ويكتب في الخلفية"""
+        framebuffer = stage.framebuffer
+        recorder = cls(path, stage.width, stage.height, framebuffer.pixels.shape[1], framebuffer.bytes_per_pixel,
+                       stage.pixel_format, display=stage.display, **kwargs)
+        recorder._queue = queue.Queue()
+        recorder._thread = threading.Thread(target=recorder._writer, daemon=True, name=f"record{stage.display}")
+        recorder._thread.start()
+        recorder._stage = stage
+        # الإطار المفتاحي والاشتراك في قسم حرج واحد حتى لا يفوت إطار بينهما
+        # (subscribe يأخذ القفل نفسه وهو غير قابل لإعادة الدخول)
+        with stage._lock:
+            recorder._queue.put(recorder.capture(stage.frame, stage.version, None))
+            stage._subscribers.append(recorder._on_frame)
+        return recorder
+
+    def _on_frame(self, stage, version, update):
+        # خيط الالتقاط: نسخ المناطق المتغيرة فقط، والضغط في خيط الكتابة
+        if stage.frame.shape != (self.height, self.stride):
+            # أعيد فتح الإطار بأبعاد أخرى: الترويسة لم تعد تصفه، فيُتابع التسجيل في ملف جديد
+            _rotate_recording(stage, self)
+            return
+        self._queue.put(self.capture(stage.frame, version, update))
+
+    @timed('record_capture')
+    def capture(self, frame, version, update, now=None):
+        """لقطة قابلة للكتابة من الإطار الحالي: كامل عند حلول الإطار المفتاحي، وإلا المستطيلات المتغيرة"""
+        now = time.monotonic() if now is None else now
+        timestamp = now - self.started
+        if update is None or self._last_keyframe is None or now - self._last_keyframe >= self.keyframe_interval:
+            self._last_keyframe = now
+            return (KEYFRAME, timestamp, version, frame.tobytes())
+        bpp = self.bytes_per_pixel
+        pixels = [frame[y:y + h, x * bpp:(x + w) * bpp].tobytes() for x, y, w, h in update['rects']]
+        return (DELTA, timestamp, version, (update['copies'], update['rects'], pixels))
+
+    @timed('record_write')
+    def write(self, item):
+        """ضغط اللقطة وإلحاقها بالملف وبالفهرس"""
+        kind, timestamp, version, data = item
+        payload = zlib.compress(data, 1) if kind == KEYFRAME else encode_delta(*data)
+        with self._lock:
+            offset = self._file.tell()
+            self._file.write(CHUNK_HEADER.pack(kind, len(payload), timestamp, version))
+            self._file.write(payload)
+            self._index.write(INDEX_RECORD.pack(timestamp, offset, kind == KEYFRAME))
+            self.chunks += 1
+            self.keyframes += kind == KEYFRAME
+            self.bytes_written = offset + CHUNK_HEADER.size + len(payload)
+            if kind == KEYFRAME:
+                # ما قبل كل إطار مفتاحي قابل للتشغيل من ملف لم يُغلق بعد
+                self._file.flush()
+                self._index.flush()
+
+    def record(self, frame, version, update, now=None):
+        """تسجيل إطار مباشرة (دون خيط كتابة)"""
+        self.write(self.capture(frame, version, update, now))
+
+    def _writer(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            try:
+                self.write(item)
+            except Exception as e:
+                logger.error(f"خطأ في كتابة التسجيل {self.path.name}: {e}")
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+            self._index.flush()
+
+    def close(self):
+        """إيقاف الاستلام وكتابة ما تبقى ثم إغلاق الملفين"""
+        if self._stage is not None:
+            self._stage.unsubscribe(self._on_frame)
+            self._stage = None
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            self._file.close()
+            self._index.close()
+
+    def get_status(self):
+        return {
+            'path': str(self.path),
+            'duration_s': round(time.monotonic() - self.started, 1),
+            'chunks': self.chunks,
+            'keyframes': self.keyframes,
+            'size_mb': round(self.bytes_written / 1024 / 1024, 2),
+            'backlog': self._queue.qsize() if self._queue is not None else 0,
+        }
+
+class SessionPlayer:
+    """تشغيل تسجيل: الملف مربوط بالذاكرة، والقفز من أقرب إطار مفتاحي"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:4] != FILE_MAGIC:
+            raise ValueError(f"ليس ملف تسجيل: {self.path}")
+        header_length = struct.unpack_from("<I", self._map, 4)[0]
+        self.header = json.loads(self._map[8:8 + header_length])
+        self.data_offset = 8 + header_length
+        self.index = self._load_index()
+        self.keyframe_positions = np.flatnonzero(self.index['key'])
+        self._frame = None
+        self._position = None
+
+    def _load_index(self):
+        """الفهرس الجانبي، أو إعادة بنائه بالمرور على الكتل (تسجيل انقطع قبل كتابة الفهرس)"""
+        index_path = self.path.with_suffix(".idx")
+        if index_path.exists():
+            raw = index_path.read_bytes()
+            index = np.frombuffer(raw[:len(raw) - len(raw) % INDEX_RECORD.size], dtype=_index_dtype())
+            # آخر كتلة قد تكون ناقصة إن انقطع التسجيل أثناء كتابتها
+            while len(index) and not self._complete(int(index['offset'][-1])):
+                index = index[:-1]
+            return index
+        records = []
+        offset = self.data_offset
+        while self._complete(offset):
+            kind, length, timestamp, _ = CHUNK_HEADER.unpack_from(self._map, offset)
+            records.append((timestamp, offset, kind == KEYFRAME))
+            offset += CHUNK_HEADER.size + length
+        return np.array(records, dtype=_index_dtype())
+
+    def _complete(self, offset):
+        """هل الكتلة عند الإزاحة مكتوبة كاملة"""
+        if offset + CHUNK_HEADER.size > len(self._map):
+            return False
+        length = CHUNK_HEADER.unpack_from(self._map, offset)[1]
+        return offset + CHUNK_HEADER.size + length <= len(self._map)
+
+    @property
+    def duration(self):
+        return float(self.index['time'][-1]) if len(self.index) else 0.0
+
+    def _chunk(self, position):
+        offset = int(self.index['offset'][position])
+        kind, length, timestamp, version = CHUNK_HEADER.unpack_from(self._map, offset)
+        start = offset + CHUNK_HEADER.size
+        return kind, timestamp, version, self._map[start:start + length]
+
+    def _apply(self, position):
+        kind, _, _, payload = self._chunk(position)
+        if kind == KEYFRAME:
+            data = zlib.decompress(payload)
+            self._frame = np.frombuffer(data, np.uint8).reshape(self.header['height'], self.header['stride']).copy()
+        else:
+            apply_delta(self._frame, payload, self.header['bytes_per_pixel'])
+        self._position = position
+
+    @timed('record_seek')
+    def seek(self, timestamp):
+        """الإطار (بالصيغة الأصلية) عند زمن معين؛ يكمل من الموقع الحالي إن لم يتجاوز إطاراً مفتاحياً"""
+        if not len(self.index):
+            return None
+        target = max(0, int(np.searchsorted(self.index['time'], timestamp, side='right')) - 1)
+        keyframe = int(self.keyframe_positions[np.searchsorted(self.keyframe_positions, target, side='right') - 1])
+        if self._position is None or not keyframe <= self._position <= target:
+            start = keyframe
+        else:
+            start = self._position + 1
+        for position in range(start, target + 1):
+            self._apply(position)
+        return self._frame
+
+    def rgb_at(self, timestamp):
+        """الإطار عند زمن معين كصورة RGB"""
+        from screen_capture import to_rgb
+        frame = self.seek(timestamp)
+        return None if frame is None else to_rgb(frame, self.header['pixel_format'], self.header['width'])
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def get_status(self):
+        return {
+            'path': str(self.path),
+            'display': self.header.get('display'),
+            'started_at': self.header.get('started_at'),
+            'size': [self.header['width'], self.header['height']],
+            'duration_s': round(self.duration, 1),
+            'chunks': len(self.index),
+            'keyframes': len(self.keyframe_positions),
+        }
+
+# التسجيلات الجارية مفهرسة برقم العرض
+_recorders = {}
+_recorders_lock = threading.Lock()
+
+def start_recording(display, name=None):
+    """بدء تسجيل عرض (إن لم يكن يُسجل)؛ قاموس بالنتيجة"""
+    from screen_capture import get_capture_stage, is_known_display
+
+    if not is_known_display(display):
+        return {'success': False, 'message': f'عرض غير معروف: {display}'}
+    with _recorders_lock:
+        if display in _recorders:
+            return {'success': True, 'message': 'العرض يُسجل بالفعل', **_recorders[display].get_status()}
+        stage = get_capture_stage(display)
+        if not stage.start():
+            return {'success': False, 'message': f'لا يوجد ملف إطار للعرض {display}'}
+        # اسم ملف فقط: لا مسارات نسبية تخرج من مجلد التسجيلات
+        name = Path(name).name if name else None
+        name = name or f"display{display.lstrip(':')}-{datetime.now():%Y%m%d-%H%M%S}"
+        recorder = SessionRecorder.for_stage(stage, RECORDING_DIR / f"{name}.vrec")
+        _recorders[display] = recorder
+    # خارج القفل: يُستدعى فوراً إن كانت المرحلة قد انتهت للتو
+    stage.on_retire(_on_stage_retired)
+    logger.info(f"⏺️ بدء تسجيل العرض {display} في {recorder.path}")
+    return {'success': True, 'message': 'تم بدء التسجيل', **recorder.get_status()}
+
+def _rotate_recording(stage, recorder):
+    """إغلاق تسجيل لم تعد ترويسته تطابق أبعاد الإطار ومتابعته في مقطع جديد"""
+    with _recorders_lock:
+        if _recorders.get(stage.display) is not recorder:
+            return
+        recorder.close()
+        path = recorder.path.with_name(f"{recorder.path.stem}-{datetime.now():%H%M%S}.vrec")
+        _recorders[stage.display] = SessionRecorder.for_stage(stage, path)
+    logger.info(f"🔁 تغيرت أبعاد العرض {stage.display} إلى {stage.width}x{stage.height}، متابعة التسجيل في {path}")
+
+def _on_stage_retired(stage):
+    """انتهى العرض: إيقاف تسجيله وإغلاق ملفه"""
+    with _recorders_lock:
+        recorder = _recorders.get(stage.display)
+        if recorder is None or recorder._stage is not stage:
+            return
+        del _recorders[stage.display]
+    recorder.close()
+    logger.info(f"⏹️ انتهى العرض {stage.display}، تم إيقاف تسجيله")
+
+def stop_recording(display):
+    """إيقاف تسجيل عرض وإغلاق ملفه"""
+    with _recorders_lock:
+        recorder = _recorders.pop(display, None)
+    if recorder is None:
+        return {'success': False, 'message': 'العرض لا يُسجل'}
+    recorder.close()
+    logger.info(f"⏹️ تم إيقاف تسجيل العرض {display}")
+    return {'success': True, 'message': 'تم إيقاف التسجيل', **recorder.get_status()}
+
+def list_recordings():
+    """التسجيلات المحفوظة مع حالتها"""
+    recordings = []
+    active = {str(r.path) for r in _recorders.values()}
+    for path in sorted(RECORDING_DIR.glob("*.vrec")):
+        try:
+            player = SessionPlayer(path)
+            recordings.append({'name': path.stem, 'recording': str(path) in active, **player.get_status()})
+            player.close()
+        except Exception as e:
+            logger.error(f"خطأ في قراءة التسجيل {path.name}: {e}")
+    return recordings
+
+def register_recordings(app):
+    """مسارات التسجيل والتشغيل"""
+    from flask import Response, jsonify, request
+
+    @app.route('/api/recordings')
+    def api_recordings():
+        try:
+            return jsonify({'success': True, 'recordings': list_recordings(),
+                            'active': {d: r.get_status() for d, r in _recorders.items()}})
+        except Exception as e:
+            logger.error(f"خطأ في قائمة التسجيلات: {e}")
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @app.route('/api/recordings/start', methods=['POST'])
+    def api_start_recording():
+        data = request.get_json(silent=True) or {}
+        try:
+            from cursor_channel import default_display
+            return jsonify(start_recording(data.get('display') or default_display(), data.get('name')))
+        except Exception as e:
+            logger.error(f"خطأ في بدء التسجيل: {e}")
+            return jsonify({'success': False, 'message': str(e)}), 500
+
+    @app.route('/api/recordings/stop', methods=['POST'])
+    def api_stop_recording():
+        data = request.get_json(silent=True) or {}
+        try:
+            from cursor_channel import default_display
+            return jsonify(stop_recording(data.get('display') or default_display()))
+        except Exception as e:
+            logger.error(f"خطأ في إيقاف التسجيل: {e}")
+            return jsonify({'success': False, 'message': str(e)}), 500
+
+    @app.route('/api/recordings/<name>/frame')
+    def api_recording_frame(name):
+        """إطار PNG من تسجيل عند الزمن t (بالثواني)"""
+        try:
+            from io import BytesIO
+            from PIL import Image
+            path = RECORDING_DIR / f"{Path(name).name}.vrec"
+            if not path.exists():
+                return jsonify({'success': False, 'error': 'التسجيل غير موجود'}), 404
+            player = SessionPlayer(path)
+            try:
+                pixels = player.rgb_at(request.args.get('t', 0.0, type=float))
+            finally:
+                player.close()
+            buffer = BytesIO()
+            Image.fromarray(pixels, 'RGB').save(buffer, format='PNG', compress_level=1)
+            return Response(buffer.getvalue(), mimetype='image/png')
+        except Exception as e:
+            logger.error(f"خطأ في إطار التسجيل: {e}")
+            return jsonify({'success': False, 'error': str(e)}), 500
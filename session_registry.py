@@ -0,0 +1,255 @@
+"""
+سجل جلسات VNC الحية في الذاكرة
+المصدر الموثوق لحالة الجلسات أثناء تشغيل العملية، وقاعدة البيانات مجرد سجل كتابة مؤجلة
+"""
+
+import threading
+import logging
+from collections import deque
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# الحقول التي تُنسخ إلى جدول vnc_sessions
+PERSISTED_FIELDS = (
+    'session_name', 'display_number', 'port', 'screen_resolution', 'color_depth',
+    'created_at', 'last_accessed', 'is_active', 'access_count', 'desktop_environment'
+)
+
+class LiveSession:
+    """جلسة VNC حية في الذاكرة"""
+
+    def __init__(self, display, port, resolution, color_depth, desktop_environment='LXDE'):
+        now = datetime.utcnow()
+        self.session_name = f"جلسة VNC {display}"
+        self.display_number = display
+        self.port = port
+        self.screen_resolution = resolution
+        self.color_depth = color_depth
+        self.created_at = now
+        self.last_accessed = now
+        self.is_active = True
+        self.access_count = 0
+        self.desktop_environment = desktop_environment
+
+        # معرف الصف في قاعدة البيانات بعد أول كتابة
+        self.db_id = None
+        # الحقول المعدلة منذ آخر كتابة
+        self.changed = set(PERSISTED_FIELDS)
+
+    @property
+    def key(self):
+        return (self.display_number, self.port)
+
+    @property
+    def id(self):
+        """معرف الجلسة (معرف قاعدة البيانات إن وُجد)"""
+        return self.db_id if self.db_id is not None else f"live_{self.display_number}_{self.port}"
+
+    def update(self, **fields):
+        """تعديل حقول الجلسة مع تتبع التغييرات"""
+        for name, value in fields.items():
+            if getattr(self, name) != value:
+                setattr(self, name, value)
+                self.changed.add(name)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'session_name': self.session_name,
+            'display_number': self.display_number,
+            'port': self.port,
+            'screen_resolution': self.screen_resolution,
+            'color_depth': self.color_depth,
+            'created_at': self.created_at.isoformat(),
+            'last_accessed': self.last_accessed.isoformat(),
+            'is_active': self.is_active,
+            'access_count': self.access_count,
+            'desktop_environment': self.desktop_environment
+        }
+
+class SessionRegistry:
+    """سجل الجلسات الحية مفهرس بالعرض والمنفذ"""
+
+    def __init__(self, history_size=50):
+        self._lock = threading.RLock()
+        self._sessions = {}
+        self._history = deque(maxlen=history_size)
+        self._pending = {}
+        self._seeded = False
+        self._flush_lock = threading.Lock()
+        self._flusher = None
+        self._stop_event = threading.Event()
+
+    def register(self, display, port, resolution, color_depth, **extra):
+        """تسجيل جلسة جديدة (تستبدل أي جلسة على نفس العرض والمنفذ)"""
+        with self._lock:
+            self.unregister(display, port)
+            session = LiveSession(display, port, resolution, color_depth, **extra)
+            self._sessions[session.key] = session
+            self._pending[id(session)] = session
+            return session
+
+    def unregister(self, display, port=None):
+        """إنهاء جلسات عرض محدد (ومنفذ محدد إن وُجد)"""
+        ended = []
+        with self._lock:
+            for key in list(self._sessions):
+                if key[0] != display or (port is not None and key[1] != port):
+                    continue
+                session = self._sessions.pop(key)
+                session.update(is_active=False)
+                self._pending[id(session)] = session
+                self._history.appendleft(session)
+                ended.append(session)
+        return ended
+
+    def unregister_all(self):
+        """إنهاء جميع الجلسات الحية"""
+        with self._lock:
+            displays = {key[0] for key in self._sessions}
+            ended = []
+            for display in displays:
+                ended.extend(self.unregister(display))
+            return ended
+
+    def get(self, display, port=None):
+        """الحصول على جلسة حية"""
+        with self._lock:
+            for key, session in self._sessions.items():
+                if key[0] == display and (port is None or key[1] == port):
+                    return session
+            return None
+
+    def touch(self, display, port):
+        """تحديث وقت الوصول وعدد مرات الوصول"""
+        with self._lock:
+            session = self._sessions.get((display, port))
+            if session:
+                session.update(
+                    last_accessed=datetime.utcnow(),
+                    access_count=session.access_count + 1
+                )
+                self._pending[id(session)] = session
+            return session
+
+    def active_sessions(self):
+        """قائمة الجلسات الحية مرتبة حسب العرض"""
+        with self._lock:
+            return sorted(self._sessions.values(), key=lambda s: s.key)
+
+    def recent(self, limit=10):
+        """أحدث الجلسات (الحية ثم المنتهية) دون قراءة قاعدة البيانات"""
+        with self._lock:
+            sessions = list(self._sessions.values()) + list(self._history)
+        sessions.sort(key=lambda s: s.created_at, reverse=True)
+        return sessions[:limit]
+
+    def _seed_from_database(self, VNCSession, db):
+        """إغلاق الجلسات اليتيمة من عملية سابقة وإرجاع السجل التاريخي دون تعديل الذاكرة"""
+        with self._lock:
+            live_ids = {s.db_id for s in self._sessions.values()}
+
+        orphans = VNCSession.query.filter_by(is_active=True).all()
+        for row in orphans:
+            if row.id not in live_ids:
+                row.is_active = False
+
+        rows = VNCSession.query.order_by(VNCSession.created_at.desc()).limit(self._history.maxlen).all()
+        seeded = []
+        for row in rows:
+            if row.id in live_ids:
+                continue
+            session = LiveSession(row.display_number, row.port, row.screen_resolution,
+                                  row.color_depth, row.desktop_environment)
+            for name in PERSISTED_FIELDS:
+                setattr(session, name, getattr(row, name))
+            session.is_active = False
+            session.db_id = row.id
+            session.changed.clear()
+            seeded.append(session)
+        return seeded
+
+    def _apply_seed(self, seeded):
+        """دمج السجل التاريخي تحت القفل بعد نجاح الكتابة"""
+        with self._lock:
+            # الجلسات المنتهية في هذه العملية أحدث من أي صف قديم
+            known = {s.db_id for s in self._history} | {s.db_id for s in self._sessions.values()}
+            seeded = [s for s in seeded if s.db_id not in known]
+            self._history = deque(list(self._history) + seeded, maxlen=self._history.maxlen)
+            self._seeded = True
+
+    def flush(self, app):
+        """كتابة الصفوف المعدلة فقط إلى قاعدة البيانات"""
+        with self._flush_lock:
+            return self._flush(app)
+
+    def _flush(self, app):
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+            changes = [(session, {name: getattr(session, name) for name in session.changed})
+                       for session in pending]
+            for session in pending:
+                session.changed.clear()
+
+        if not changes and self._seeded:
+            return 0
+
+        try:
+            with app.app_context():
+                from models import VNCSession, db
+
+                seeded = None
+                if not self._seeded:
+                    seeded = self._seed_from_database(VNCSession, db)
+
+                new_rows = []
+                for session, fields in changes:
+                    if session.db_id is None:
+                        row = VNCSession(**{name: getattr(session, name) for name in PERSISTED_FIELDS})
+                        db.session.add(row)
+                        new_rows.append((session, row))
+                    elif fields:
+                        VNCSession.query.filter_by(id=session.db_id).update(fields)
+
+                db.session.commit()
+                for session, row in new_rows:
+                    session.db_id = row.id
+                if seeded is not None:
+                    self._apply_seed(seeded)
+            return len(changes)
+
+        except Exception as e:
+            logger.error(f"خطأ في كتابة الجلسات إلى قاعدة البيانات: {e}")
+            # إعادة الجلسات إلى قائمة الانتظار للمحاولة لاحقاً
+            with self._lock:
+                for session, fields in changes:
+                    session.changed.update(fields)
+                    self._pending[id(session)] = session
+            return 0
+
+    def start_flusher(self, app, interval=5):
+        """بدء خيط الكتابة المؤجلة"""
+        if self._flusher and self._flusher.is_alive():
+            return
+
+        def flush_loop():
+            from async_runtime import run_blocking
+            while not self._stop_event.wait(interval):
+                # الكتابة في SQLite حاجزة: تُنفذ خارج حلقة الأحداث في نمط gevent/eventlet
+                run_blocking(self.flush, app)
+
+        self._stop_event.clear()
+        self._flusher = threading.Thread(target=flush_loop, daemon=True)
+        self._flusher.start()
+        logger.info("✅ تم بدء خيط الكتابة المؤجلة للجلسات")
+
+    def stop_flusher(self, app=None):
+        """إيقاف خيط الكتابة المؤجلة مع كتابة أخيرة"""
+        self._stop_event.set()
+        if app is not None:
+            self.flush(app)
+
+# السجل المشترك
+session_registry = SessionRegistry()
@@ -0,0 +1,209 @@
+"""
+منسق الإيقاف المتوازي
+يرسل SIGTERM لكل العمليات دفعة واحدة وينتظرها معاً عبر pidfd، ثم SIGKILL للمتأخرة فقط بعد مهلة قابلة للضبط
+"""
+
+import os
+import select
+import signal
+import subprocess
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# مهلة الإيقاف الرشيق الافتراضية بالثواني
+DEFAULT_GRACE_PERIOD = float(os.environ.get("VNC_SHUTDOWN_GRACE", "2.0"))
+
+# مهلة انتظار العمليات بعد SIGKILL
+KILL_WAIT = 1.0
+
+# أقل فاصل بين مرورين على /proc لفحص أعضاء مجموعة ما زالت ترد على killpg
+GROUP_SCAN_INTERVAL = 0.1
+
+class _Target:
+    """عملية واحدة قيد الإيقاف"""
+
+    def __init__(self, process):
+        if isinstance(process, subprocess.Popen):
+            self.process = process
+            self.pid = process.pid
+            self.name = os.path.basename(str(process.args[0] if isinstance(process.args, (list, tuple)) else process.args))
+        else:
+            self.process = None
+            self.pid = int(process)
+            self.name = str(self.pid)
+        self.fd = None
+        self.exit_time = None
+        self.returncode = None
+        self.killed = False
+
+    def open_pidfd(self):
+        """فتح pidfd للعملية (Linux 5.3+)"""
+        try:
+            self.fd = os.pidfd_open(self.pid)
+        except (AttributeError, OSError):
+            self.fd = None
+        return self.fd
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def check_exited(self):
+        """هل انتهت العملية (مع جمعها إن كانت ابناً لنا)"""
+        if self.process is not None:
+            self.returncode = self.process.poll()
+            return self.returncode is not None
+        try:
+            pid, status = os.waitpid(self.pid, os.WNOHANG)
+            if pid == 0:
+                return False
+            self.returncode = os.waitstatus_to_exitcode(status)
+            return True
+        except ChildProcessError:
+            # ليست ابناً لنا: نتحقق من وجودها فقط
+            try:
+                os.kill(self.pid, 0)
+                return False
+            except ProcessLookupError:
+                return True
+            except PermissionError:
+                return False
+
+    def to_dict(self):
+        return {
+            'pid': self.pid,
+            'name': self.name,
+            'exit_time': round(self.exit_time, 4) if self.exit_time is not None else None,
+            'returncode': self.returncode,
+            'killed': self.killed
+        }
+
+def _has_running_member(pgid):
+    """هل في المجموعة عملية غير zombie (من /proc؛ نعم إن تعذرت القراءة)"""
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return True
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # الحقول بعد اسم الأمر: الحالة ثم الأب ثم المجموعة
+                fields = f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if int(fields[2]) == pgid and fields[0] not in ("Z", "X"):
+            return True
+    return False
+
+class ShutdownCoordinator:
+    """إيقاف مجموعة عمليات بالتوازي مع تقرير زمن خروج كل عملية"""
+
+    def __init__(self, grace_period=None):
+        self.grace_period = DEFAULT_GRACE_PERIOD if grace_period is None else grace_period
+        self._scanned = {}
+
+    def _send(self, targets, pgids, sig):
+        """إرسال الإشارة لجميع الأهداف دفعة واحدة"""
+        for pgid in pgids:
+            try:
+                os.killpg(pgid, sig)
+            except (ProcessLookupError, PermissionError):
+                pass
+        for target in targets:
+            if target.exit_time is not None:
+                continue
+            try:
+                os.kill(target.pid, sig)
+            except (ProcessLookupError, PermissionError):
+                pass
+
+    def _group_alive(self, pgid):
+        """هل بقي عضو يعمل في مجموعة العمليات
+        (لا نجمع بـ waitpid(-pgid) حتى لا نسرق خروج Popen متتبع؛ الأهداف يجمعها poll())"""
+        try:
+            os.killpg(pgid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        # killpg يعد العمليات المنتهية التي لم تُجمع بعد (zombies) أعضاء في المجموعة؛
+        # المرور على /proc مكلف فلا يتكرر أكثر من مرة كل GROUP_SCAN_INTERVAL
+        now = time.monotonic()
+        if now - self._scanned.get(pgid, 0.0) < GROUP_SCAN_INTERVAL:
+            return True
+        self._scanned[pgid] = now
+        return _has_running_member(pgid)
+
+    def _wait(self, targets, pgids, started, deadline):
+        """انتظار جميع الأهداف معاً حتى الموعد النهائي"""
+        poller = select.poll()
+        by_fd = {}
+        for target in targets:
+            if target.exit_time is None and target.fd is not None:
+                poller.register(target.fd, select.POLLIN)
+                by_fd[target.fd] = target
+
+        live_groups = set(pgids)
+        while True:
+            for target in targets:
+                if target.exit_time is None and target.check_exited():
+                    target.exit_time = time.monotonic() - started
+                    if target.fd in by_fd:
+                        poller.unregister(target.fd)
+                        del by_fd[target.fd]
+            pending = [t for t in targets if t.exit_time is None]
+            # المجموعات تُفحص بعد خروج الأهداف المتتبعة فقط (غالباً قائدها بينها)
+            if not pending:
+                live_groups = {pgid for pgid in live_groups if self._group_alive(pgid)}
+            remaining = deadline - time.monotonic()
+            if (not pending and not live_groups) or remaining <= 0:
+                return pending, live_groups
+
+            # بدون pidfd أو مع مجموعات (لا fd لها) نستخدم فترات قصيرة
+            polling = live_groups or any(t.fd is None for t in pending)
+            timeout = min(remaining, 0.01) if polling else remaining
+            poller.poll(timeout * 1000)
+
+    def shutdown(self, processes=(), pgids=(), grace_period=None):
+        """إيقاف العمليات ومجموعات العمليات المحددة وإرجاع تقرير"""
+        grace = self.grace_period if grace_period is None else grace_period
+        targets = [_Target(p) for p in processes if p is not None]
+        pgids = [pgid for pgid in pgids if pgid]
+
+        for target in targets:
+            target.open_pidfd()
+
+        started = time.monotonic()
+        try:
+            self._send(targets, pgids, signal.SIGTERM)
+            pending, live_groups = self._wait(targets, pgids, started, started + grace)
+
+            if pending or live_groups:
+                logger.warning(f"⚠️ إجبار إيقاف {len(pending)} عملية متأخرة بعد {grace} ثانية")
+                for target in pending:
+                    target.killed = True
+                self._send(pending, live_groups, signal.SIGKILL)
+                pending, live_groups = self._wait(targets, live_groups, started, time.monotonic() + KILL_WAIT)
+        finally:
+            for target in targets:
+                target.close()
+
+        report = {
+            'success': not pending and not live_groups,
+            'duration': round(time.monotonic() - started, 4),
+            'grace_period': grace,
+            'processes': [target.to_dict() for target in targets]
+        }
+        return report
+
+def log_shutdown_report(report):
+    """طباعة زمن خروج كل عملية من تقرير الإيقاف"""
+    for entry in report['processes']:
+        state = "SIGKILL" if entry['killed'] else "SIGTERM"
+        logger.info(f"  ⏹️ {entry['name']} ({entry['pid']}): {entry['exit_time']} ثانية [{state}]")
+    logger.info(f"⏱️ مدة الإيقاف الكلية: {report['duration']} ثانية")
@@ -4,44 +4,49 @@ Simple Multi VNC - تشغيل واجهات VNC متعددة بسيط
 """
 
 import os
-import subprocess
-import time
 import logging
 
+from performance_profiles import x11vnc_flags
+from process_groups import get_process_group, wait_for_port
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# العرض القائم الذي تُربط به الواجهات (بدلاً من :1 الثابت)
+display = os.environ.get("VNC_DISPLAY", os.environ.get("DISPLAY", ":1"))
+
+# مجموعة عمليات خوادم VNC التي يشغلها هذا البرنامج
+vnc_group = get_process_group("simple-multi-vnc")
+vnc_processes = {}
+
 def start_vnc_on_port(port, description):
     """تشغيل VNC على منفذ محدد"""
     try:
         logger.info(f"🚀 تشغيل {description} على المنفذ {port}")
         
-        # إيقاف أي خدمة على نفس المنفذ
-        subprocess.run([
-            "pkill", "-f", f"rfbport {port}"
-        ], capture_output=True)
-        
-        time.sleep(1)
+        # إيقاف الخادم السابق على نفس المنفذ (من هذا البرنامج فقط)
+        vnc_group.stop_process(vnc_processes.pop(port, None))
         
         # بناء أمر x11vnc
         cmd = [
             "x11vnc",
-            "-display", ":1",
+            "-display", display,
             "-rfbport", str(port), 
             "-passwd", "vnc123456",
             "-forever",
             "-shared",
-            "-bg"
+            *x11vnc_flags()
         ]
         
-        # تشغيل الأمر
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        # تشغيل الأمر داخل مجموعة العمليات (بدون -bg)
+        process = vnc_group.spawn(cmd)
+        vnc_processes[port] = process
         
-        if result.returncode == 0:
+        if wait_for_port(port, process=process):
             logger.info(f"✅ {description} يعمل على المنفذ {port}")
             return True
         else:
-            logger.error(f"❌ فشل في تشغيل {description}: {result.stderr}")
+            logger.error(f"❌ فشل في تشغيل {description}: رمز الخروج {process.poll()}")
             return False
             
     except Exception as e:
@@ -53,7 +58,7 @@ def main():
     logger.info("🚀 تشغيل واجهات VNC متعددة...")
     
     # إعداد متغير البيئة
-    os.environ["DISPLAY"] = ":1"
+    os.environ["DISPLAY"] = display
     
     # قائمة الواجهات
     interfaces = [
@@ -68,7 +73,6 @@ def main():
     for port, desc in interfaces:
         if start_vnc_on_port(port, desc):
             success_count += 1
-        time.sleep(2)
     
     logger.info(f"✅ تم تشغيل {success_count}/{len(interfaces)} واجهات")
     
@@ -78,11 +82,8 @@ def main():
     
     for port, desc in interfaces:
         # فحص حالة المنفذ
-        check = subprocess.run([
-            "pgrep", "-f", f"rfbport {port}"
-        ], capture_output=True)
-        
-        status = "✅ يعمل" if check.returncode == 0 else "❌ متوقف"
+        process = vnc_processes.get(port)
+        status = "✅ يعمل" if process and process.poll() is None else "❌ متوقف"
         logger.info(f"  {desc}: localhost:{port} - {status}")
     
     logger.info("🔑 كلمة المرور: vnc123456")
@@ -9,37 +9,84 @@ import sys
 import subprocess
 import time
 import logging
-import signal
+
+from display_pool import get_display_pool
+from performance_profiles import x11vnc_flags, xvfb_flags
+from process_groups import get_process_group, wait_for_display, wait_for_port
+from session_persistence import DesktopSession
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# العرض المستخدم: VNC_DISPLAY إن حُدد، وإلا شاشة مسخنة من المجمع
+display = os.environ.get("VNC_DISPLAY")
+display_lease = None
+
+# مجموعة العمليات الخاصة بهذه الحزمة وخوادم VNC المشغلة منها
+desktop_group = get_process_group("multiple-interfaces")
+vnc_processes = {}
+
+# ملفات التعريف والتخطيط الدائمة لسطح المكتب (تُنشأ لكل عرض في main)
+desktop_session = None
+
+def spawn(cmd, **kwargs):
+    """تشغيل عملية ضمن حزمة هذا البرنامج"""
+    if display_lease:
+        return display_lease.spawn(cmd, **kwargs)
+    return desktop_group.spawn(cmd, **kwargs)
+
+def stop_all():
+    """إيقاف حزمة هذا البرنامج فقط"""
+    global display_lease
+    # حفظ التخطيط ومواقع النوافذ لاستعادتها عند التشغيل التالي
+    if display and desktop_session and desktop_session.apps:
+        desktop_session.resume()
+        desktop_session.snapshot(display)
+    
+    if display_lease:
+        display_lease.release()
+        display_lease = None
+    else:
+        desktop_group.stop()
+    if desktop_session:
+        desktop_session.forget_processes()
+
 def ensure_xvfb_running():
     """التأكد من تشغيل Xvfb"""
+    global display, display_lease
     logger.info("🖥️ التحقق من الشاشة الافتراضية...")
     
-    # فحص إذا كان Xvfb يعمل
-    result = subprocess.run(["pgrep", "-f", "Xvfb"], capture_output=True)
-    
-    if result.returncode == 0:
-        logger.info("✅ Xvfb يعمل بالفعل")
-        return True
-    
     # تشغيل Xvfb جديد
     try:
+        if display is None:
+            # شاشة مسخنة من المجمع بدلاً من تشغيل بارد
+            display_lease = get_display_pool().acquire(owner="multiple-interfaces")
+            display = display_lease.display
+            os.environ["DISPLAY"] = display
+            logger.info(f"✅ تم استلام العرض {display} من مجمع الشاشات")
+            return True
+        
+        # فحص إذا كان العرض المحدد يعمل
+        if wait_for_display(display, timeout=0.1):
+            os.environ["DISPLAY"] = display
+            logger.info(f"✅ Xvfb يعمل بالفعل على العرض {display}")
+            return True
+        
         logger.info("🚀 تشغيل شاشة افتراضية جديدة...")
         
         cmd = [
-            "Xvfb", ":1",
+            "Xvfb", display,
             "-screen", "0", "1024x768x24",
-            "-ac", "+extension", "GLX"
+            "-ac", "+extension", "GLX", *xvfb_flags(display)
         ]
         
-        subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        time.sleep(3)
+        process = desktop_group.spawn(cmd)
+        if not wait_for_display(display, process=process):
+            logger.error(f"❌ لم يصبح العرض {display} جاهزاً")
+            return False
         
         # إعداد متغير البيئة
-        os.environ["DISPLAY"] = ":1"
+        os.environ["DISPLAY"] = display
         
         logger.info("✅ تم تشغيل Xvfb بنجاح")
         return True
@@ -53,42 +100,34 @@ def start_vnc_server(port, server_name, extra_params=[]):
     logger.info(f"🚀 تشغيل {server_name} على المنفذ {port}...")
     
     try:
-        # إيقاف أي خدمة VNC موجودة على نفس المنفذ
-        subprocess.run(["pkill", "-f", f"rfbport {port}"], capture_output=True)
-        time.sleep(1)
+        # إيقاف الخادم السابق على نفس المنفذ (من هذه الحزمة فقط)
+        desktop_group.stop_process(vnc_processes.pop(port, None))
         
         # بناء أمر تشغيل VNC
         cmd = [
             "x11vnc",
-            "-display", ":1", 
+            "-display", display, 
             "-rfbport", str(port),
             "-passwd", "vnc123456",
             "-forever",
             "-shared", 
-            "-noxdamage",
-            "-noxfixes",
-            "-noscr"
-        ] + extra_params + ["-bg"]
-        
-        # تشغيل الأمر
-        result = subprocess.run(cmd, capture_output=True, text=True)
+            # التقاط معتمد على XDamage حسب ملف الأداء بدلاً من استطلاع الشاشة كاملة
+            *x11vnc_flags(),
+            # استئناف الجلسة المعلقة فور اتصال عميل
+            "-afteraccept", desktop_session.resume_hook()
+        ] + extra_params
         
-        # انتظار بدء التشغيل
-        time.sleep(2)
+        # تشغيل الأمر داخل مجموعة الحزمة (بدون -bg)
+        process = spawn(cmd)
+        vnc_processes[port] = process
         
         # فحص نجاح التشغيل
-        check_result = subprocess.run(
-            ["pgrep", "-f", f"rfbport {port}"], 
-            capture_output=True
-        )
-        
-        if check_result.returncode == 0:
+        if wait_for_port(port, process=process):
             logger.info(f"✅ {server_name} يعمل بنجاح على المنفذ {port}")
             return True
         else:
             logger.error(f"❌ فشل في تشغيل {server_name} على المنفذ {port}")
-            if result.stderr:
-                logger.error(f"خطأ: {result.stderr}")
+            logger.error(f"خطأ: رمز الخروج {process.poll()}")
             return False
             
     except Exception as e:
@@ -130,27 +169,18 @@ def start_desktop_apps():
         ["chromium", "--no-sandbox", "--disable-gpu"]
     ]
     
-    launched = 0
-    for app in apps:
-        try:
-            subprocess.Popen(
-                app,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-                env=dict(os.environ, DISPLAY=":1")
-            )
-            logger.info(f"✅ تم تشغيل {app[0]}")
-            launched += 1
-            time.sleep(1)
-        except FileNotFoundError:
-            logger.warning(f"⚠️ التطبيق غير موجود: {app[0]}")
-        except Exception as e:
-            logger.warning(f"⚠️ فشل في تشغيل {app[0]}: {e}")
-    
-    logger.info(f"✅ تم تشغيل {launched}/{len(apps)} تطبيقات")
+    # مدير النوافذ يعمل مسبقاً على الشاشة المسخنة
+    if display_lease and display_lease.wm_process:
+        apps = [app for app in apps if app[0] != "openbox"]
+    
+    # التخطيط المحفوظ يُستعاد بدلاً من القائمة الافتراضية
+    launched = desktop_session.launch(apps, spawn, display)
+    
+    logger.info(f"✅ تم تشغيل {len(launched)} تطبيقات")
 
 def main():
     """البرنامج الرئيسي"""
+    global desktop_session
     logger.info("🚀 بدء تشغيل واجهات VNC متعددة...")
     
     # إعداد كلمة المرور
@@ -162,6 +192,9 @@ def main():
         logger.error("❌ فشل في تشغيل الشاشة الافتراضية")
         sys.exit(1)
     
+    # جلسة لكل عرض حتى لا تتشارك الشاشات المعارة ملف تعريف المتصفح نفسه
+    desktop_session = DesktopSession(f"multiple-interfaces-{display.lstrip(':')}")
+    
     # تشغيل التطبيقات الأساسية
     start_desktop_apps()
     
@@ -190,12 +223,8 @@ def main():
     
     for port, name, _ in vnc_configs:
         # فحص حالة الخادم
-        check_result = subprocess.run(
-            ["pgrep", "-f", f"rfbport {port}"], 
-            capture_output=True
-        )
-        
-        status = "✅ يعمل" if check_result.returncode == 0 else "❌ متوقف"
+        process = vnc_processes.get(port)
+        status = "✅ يعمل" if process and process.poll() is None else "❌ متوقف"
         logger.info(f"  {name}: localhost:{port} - {status}")
     
     logger.info(f"🔑 كلمة المرور: vnc123456")
@@ -211,12 +240,9 @@ def main():
             # فحص دوري للخدمات
             running_count = 0
             for port, name, extra_params in vnc_configs:
-                check_result = subprocess.run(
-                    ["pgrep", "-f", f"rfbport {port}"], 
-                    capture_output=True
-                )
+                process = vnc_processes.get(port)
                 
-                if check_result.returncode == 0:
+                if process and process.poll() is None:
                     running_count += 1
                 else:
                     logger.warning(f"⚠️ إعادة تشغيل {name} على المنفذ {port}")
@@ -227,16 +253,16 @@ def main():
     except KeyboardInterrupt:
         logger.info("🛑 تم استلام إشارة الإيقاف...")
         
-        # إيقاف جميع خوادم VNC
+        # إيقاف حزمة هذا البرنامج فقط
         logger.info("إيقاف خوادم VNC...")
-        subprocess.run(["pkill", "-f", "x11vnc"], capture_output=True)
+        stop_all()
         
         logger.info("✅ تم إيقاف جميع الخدمات")
         
     except Exception as e:
         logger.error(f"❌ خطأ عام: {e}")
         # إيقاف الخدمات في حالة الخطأ
-        subprocess.run(["pkill", "-f", "x11vnc"], capture_output=True)
+        stop_all()
         sys.exit(1)
 
 if __name__ == "__main__":
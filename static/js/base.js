@@ -0,0 +1,113 @@
+// WebSocket connection
+const socket = io();
+
+// Show notification
+function showNotification(message, type = 'info') {
+    const notification = $(`
+        <div class="toast align-items-center text-white bg-${type} border-0" role="alert">
+            <div class="d-flex">
+                <div class="toast-body">${message}</div>
+                <button type="button" class="btn-close btn-close-white me-2 m-auto" data-bs-dismiss="toast"></button>
+            </div>
+        </div>
+    `);
+    
+    $('#notifications').append(notification);
+    const toast = new bootstrap.Toast(notification[0]);
+    toast.show();
+}
+
+// Update server status
+function updateServerStatus(status) {
+    const statusElement = $('#server-status');
+    if (status.is_running) {
+        statusElement.html('<i class="fas fa-circle text-success me-1 pulse"></i> متصل');
+    } else {
+        statusElement.html('<i class="fas fa-circle text-danger me-1"></i> غير متصل');
+    }
+}
+
+// وثيقة الحالة المحلية: لقطة أولى ثم فروقات مرقمة بالإصدار
+const statusDocument = {version: 0, data: {}, listeners: {}};
+
+function onStatusSection(section, callback) {
+    (statusDocument.listeners[section] = statusDocument.listeners[section] || []).push(callback);
+    if (statusDocument.data[section] !== undefined) {
+        callback(statusDocument.data[section]);
+    }
+}
+
+function notifyStatusSections(sections) {
+    sections.forEach(function(section) {
+        (statusDocument.listeners[section] || []).forEach(function(callback) {
+            callback(statusDocument.data[section]);
+        });
+    });
+}
+
+function applyStatusOps(ops) {
+    const changed = new Set();
+    ops.forEach(function(op) {
+        const keys = op.path.split('/').slice(1).map(function(key) {
+            return key.replace(/~1/g, '/').replace(/~0/g, '~');
+        });
+        changed.add(keys[0]);
+        let target = statusDocument.data;
+        for (let i = 0; i < keys.length - 1; i++) {
+            target = target[keys[i]] = target[keys[i]] || {};
+        }
+        const last = keys[keys.length - 1];
+        if (op.op === 'remove') {
+            delete target[last];
+        } else {
+            target[last] = op.value;
+        }
+    });
+    return Array.from(changed);
+}
+
+function applyStatusChanges(changes) {
+    if (changes.document) {
+        statusDocument.data = changes.document;
+        statusDocument.version = changes.version;
+        notifyStatusSections(Object.keys(changes.document));
+    } else if (changes.from === statusDocument.version) {
+        const changed = applyStatusOps(changes.ops);
+        statusDocument.version = changes.version;
+        notifyStatusSections(changed);
+    } else if (changes.version > statusDocument.version) {
+        // فاتتنا فروقات: طلب ما ينقص منذ آخر إصدار لدينا
+        socket.emit('request_status_update', {version: statusDocument.version});
+    }
+}
+
+// Socket events
+socket.on('status_snapshot', applyStatusChanges);
+socket.on('status_delta', applyStatusChanges);
+onStatusSection('vnc_status', updateServerStatus);
+
+socket.on('vnc_status_changed', function(data) {
+    // الحالة الجديدة تصل بالدفع من الخادم
+    showNotification(`تم تغيير حالة الخادم إلى: ${data.status}`, 'success');
+});
+
+socket.on('app_installed', function(data) {
+    showNotification(`تم تثبيت التطبيق: ${data.app}`, 'success');
+});
+
+// AJAX helpers
+function makeRequest(url, method = 'GET', data = null) {
+    const config = {
+        url: url,
+        method: method,
+        headers: {
+            'Content-Type': 'application/json'
+        }
+    };
+    
+    if (data) {
+        config.data = JSON.stringify(data);
+    }
+    
+    return $.ajax(config);
+}
@@ -0,0 +1,74 @@
+// فك رسائل المربعات الثنائية (VT01) من /api/vnc/tiles ورسمها على canvas
+// الرسالة: "VT01" + طول JSON (uint32 LE) + JSON + بيانات المربعات (zlib) متتالية
+const VncTiles = (function() {
+    const MAGIC = 'VT01';
+
+    async function inflate(bytes) {
+        const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('deflate'));
+        return new Uint8Array(await new Response(stream).arrayBuffer());
+    }
+
+    function parse(buffer) {
+        const view = new DataView(buffer);
+        const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+        if (magic !== MAGIC) throw new Error('رسالة مربعات غير معروفة');
+        const headerLength = view.getUint32(4, true);
+        const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 8, headerLength)));
+        return {header: header, body: new Uint8Array(buffer, 8 + headerLength)};
+    }
+
+    // تحويل بيانات مربع بالصيغة المستلمة إلى RGBA
+    function toRGBA(format, pixels, palette, count) {
+        const out = new Uint8ClampedArray(count * 4);
+        for (let i = 0, o = 0; i < count; i++, o += 4) {
+            let r, g, b;
+            if (format === 'rgb24') {
+                r = pixels[i * 3]; g = pixels[i * 3 + 1]; b = pixels[i * 3 + 2];
+            } else if (format === 'rgb565') {
+                const v = pixels[i * 2] | (pixels[i * 2 + 1] << 8);
+                r = (v >> 11) << 3; g = ((v >> 5) & 0x3F) << 2; b = (v & 0x1F) << 3;
+            } else if (format === 'rgb332') {
+                const v = pixels[i];
+                r = v & 0xE0; g = (v & 0x1C) << 3; b = (v & 0x03) << 6;
+            } else {
+                const p = pixels[i] * 3;
+                r = palette[p]; g = palette[p + 1]; b = palette[p + 2];
+            }
+            out[o] = r; out[o + 1] = g; out[o + 2] = b; out[o + 3] = 255;
+        }
+        return out;
+    }
+
+    async function draw(canvas, buffer) {
+        const message = parse(buffer);
+        const header = message.header;
+        if (canvas.width !== header.width || canvas.height !== header.height) {
+            canvas.width = header.width;
+            canvas.height = header.height;
+        }
+        const context = canvas.getContext('2d');
+        await Promise.all(header.tiles.map(async function(tile) {
+            const data = message.body.subarray(tile.offset, tile.offset + tile.length);
+            const palette = message.body.subarray(tile.offset + tile.length, tile.offset + tile.length + tile.palette);
+            const pixels = await inflate(data);
+            const rgba = toRGBA(header.format, pixels, palette, tile.w * tile.h);
+            context.putImageData(new ImageData(rgba, tile.w, tile.h), tile.x, tile.y);
+        }));
+        return header;
+    }
+
+    async function fetchFrame(canvas, params) {
+        const response = await fetch('/api/vnc/tiles?' + new URLSearchParams(params));
+        if (!response.ok) throw new Error('فشل جلب المربعات: ' + response.status);
+        return draw(canvas, await response.arrayBuffer());
+    }
+
+    // الصيغة المناسبة للرابط: توفير البيانات أو اتصال بطيء يطلب 16 بت
+    function preferredFormat() {
+        const connection = navigator.connection || {};
+        if (connection.saveData || ['slow-2g', '2g', '3g'].includes(connection.effectiveType)) return 'rgb565';
+        return 'auto';
+    }
+
+    return {parse: parse, draw: draw, fetchFrame: fetchFrame, preferredFormat: preferredFormat};
+})();
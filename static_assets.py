@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+الملفات الثابتة والتخزين المؤقت عبر HTTP
+روابط ملفات مبصومة بمحتواها مع ضغط مسبق (gzip/brotli) وتخزين دائم immutable، مكتبات محلية مع رجوع إلى CDN، وETag/Last-Modified لصفحات HTML
+
+تنزيل المكتبات لتقديمها محلياً:
+    python static_assets.py --fetch-vendor
+"""
+
+import sys
+import gzip
+import hashlib
+import mimetypes
+import threading
+import logging
+from collections import OrderedDict
+from datetime import datetime, timezone
+from pathlib import Path
+
+from flask import Response, abort, request
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).parent.absolute()
+STATIC_DIR = BASE_DIR / "static"
+
+# بادئة روابط الملفات المبصومة
+ASSETS_PREFIX = "/assets"
+
+# مدة التخزين للملفات المبصومة (سنة)
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+
+# أنواع الملفات التي تستفيد من الضغط
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.html', '.map', '.txt', '.ttf', '.eot'}
+
+# المكتبات الخارجية: الملف المحلي تحت static/ ورابط CDN الاحتياطي
+VENDOR_ASSETS = {
+    'bootstrap_css': ('vendor/bootstrap/css/bootstrap.rtl.min.css',
+                      'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.rtl.min.css'),
+    'bootstrap_js': ('vendor/bootstrap/js/bootstrap.bundle.min.js',
+                     'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js'),
+    'fontawesome': ('vendor/fontawesome/css/all.min.css',
+                    'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/css/all.min.css'),
+    'jquery': ('vendor/jquery/jquery.min.js',
+               'https://code.jquery.com/jquery-3.6.0.min.js'),
+    'socketio': ('vendor/socket.io/socket.io.min.js',
+                 'https://cdnjs.cloudflare.com/ajax/libs/socket.io/4.7.2/socket.io.min.js'),
+}
+
+# خطوط Font Awesome المشار إليها نسبياً من all.min.css
+FONTAWESOME_FONTS = ('fa-solid-900', 'fa-regular-400', 'fa-brands-400', 'fa-v4compatibility')
+FONTAWESOME_CDN = 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/webfonts'
+
+class _Asset:
+    """ملف ثابت محمل في الذاكرة مع نسخه المضغوطة"""
+
+    def __init__(self, path, relative):
+        self.relative = relative
+        self.mtime = path.stat().st_mtime
+        data = path.read_bytes()
+        self.digest = hashlib.sha256(data).hexdigest()[:12]
+        self.mimetype = mimetypes.guess_type(relative)[0] or 'application/octet-stream'
+        self.encodings = {'identity': data}
+
+        if path.suffix in COMPRESSIBLE and len(data) > 512:
+            self.encodings['gzip'] = gzip.compress(data, compresslevel=9, mtime=0)
+            try:
+                import brotli
+                self.encodings['br'] = brotli.compress(data, quality=11)
+            except ImportError:
+                pass
+
+    def select(self, accept_encoding):
+        """اختيار أفضل ترميز يقبله العميل"""
+        for encoding in ('br', 'gzip'):
+            if encoding in self.encodings and encoding in accept_encoding:
+                return encoding
+        return 'identity'
+
+class AssetRegistry:
+    """فهرس الملفات المبصومة (يُبنى مرة واحدة ويُعاد البناء عند تغير الملف)"""
+
+    def __init__(self, static_dir=STATIC_DIR):
+        self.static_dir = Path(static_dir)
+        self._assets = {}
+        self._lock = threading.Lock()
+
+    def get(self, relative):
+        """الحصول على ملف محمل (أو None إن لم يوجد)"""
+        path = (self.static_dir / relative).resolve()
+        if not path.is_relative_to(self.static_dir.resolve()) or not path.is_file():
+            return None
+        with self._lock:
+            asset = self._assets.get(relative)
+            if asset is None or asset.mtime != path.stat().st_mtime:
+                asset = _Asset(path, relative)
+                self._assets[relative] = asset
+            return asset
+
+    def preload(self):
+        """تحميل وضغط كل الملفات مسبقاً عند البدء"""
+        count = 0
+        for path in self.static_dir.rglob("*"):
+            if path.is_file() and not path.name.startswith('.'):
+                self.get(path.relative_to(self.static_dir).as_posix())
+                count += 1
+        return count
+
+    def url(self, relative):
+        """رابط الملف مع بصمة المحتوى"""
+        asset = self.get(relative)
+        if asset is None:
+            return f"/static/{relative}"
+        return f"{ASSETS_PREFIX}/{asset.digest}/{relative}"
+
+    def vendor_url(self, name):
+        """رابط مكتبة خارجية: محلياً إن كانت منزلة، وإلا عبر CDN"""
+        local, cdn = VENDOR_ASSETS[name]
+        if self.get(local) is not None:
+            return self.url(local)
+        return cdn
+
+    def is_current(self, digest):
+        """هل البصمة تخص ملفاً حالياً"""
+        with self._lock:
+            return any(asset.digest == digest for asset in self._assets.values())
+
+    def response(self, digest, relative):
+        """استجابة ملف مبصوم بترميز مناسب وتخزين دائم"""
+        asset = self.get(relative)
+        if asset is None:
+            abort(404)
+
+        headers = {'Vary': 'Accept-Encoding', 'ETag': f'"{asset.digest}"'}
+        if self.is_current(digest):
+            # الملفات المشار إليها نسبياً (مثل خطوط Font Awesome) تقع تحت بصمة الملف الذي يشير إليها
+            headers['Cache-Control'] = IMMUTABLE_CACHE
+        else:
+            # بصمة قديمة: بدون تخزين دائم
+            headers['Cache-Control'] = 'no-cache'
+
+        if request.if_none_match.contains(asset.digest):
+            return Response(status=304, headers=headers)
+
+        encoding = asset.select(request.headers.get('Accept-Encoding', ''))
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        return Response(asset.encodings[encoding], mimetype=asset.mimetype, headers=headers)
+
+# سجل مشترك لكل تطبيقات Flask في العملية
+asset_registry = AssetRegistry()
+
+class _FirstSeen:
+    """وقت أول ظهور لكل ETag: يمثل آخر تغيير فعلي لمحتوى الصفحة"""
+
+    def __init__(self, limit=1024):
+        self.limit = limit
+        self._times = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, etag):
+        with self._lock:
+            if etag not in self._times:
+                self._times[etag] = datetime.now(timezone.utc).replace(microsecond=0)
+                if len(self._times) > self.limit:
+                    self._times.popitem(last=False)
+            self._times.move_to_end(etag)
+            return self._times[etag]
+
+_first_seen = _FirstSeen()
+
+def _conditional_html(response):
+    """إضافة ETag وLast-Modified لصفحات HTML والرد بـ 304 عند عدم التغير"""
+    if (request.method != 'GET' or response.status_code != 200
+            or response.mimetype != 'text/html' or response.direct_passthrough):
+        return response
+
+    response.add_etag()
+    etag, _ = response.get_etag()
+    response.last_modified = _first_seen.get(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+def register_static_assets(app):
+    """تفعيل الملفات المبصومة وروابط المكتبات وتخزين HTML الشرطي لتطبيق Flask"""
+    count = asset_registry.preload()
+
+    app.add_url_rule(
+        f"{ASSETS_PREFIX}/<digest>/<path:filename>",
+        endpoint="fingerprinted_asset",
+        view_func=lambda digest, filename: asset_registry.response(digest, filename)
+    )
+    app.jinja_env.globals['asset_url'] = asset_registry.url
+    app.jinja_env.globals['vendor_url'] = asset_registry.vendor_url
+    app.after_request(_conditional_html)
+
+    logger.info(f"✅ تم تجهيز {count} ملف ثابت مبصوم ومضغوط مسبقاً")
+    return asset_registry
+
+def fetch_vendor_assets():
+    """تنزيل المكتبات الخارجية إلى static/vendor لتقديمها محلياً"""
+    import urllib.request
+
+    downloads = [(STATIC_DIR / local, cdn) for local, cdn in VENDOR_ASSETS.values()]
+    fonts_dir = STATIC_DIR / "vendor/fontawesome/webfonts"
+    for font in FONTAWESOME_FONTS:
+        for ext in ('woff2', 'ttf'):
+            downloads.append((fonts_dir / f"{font}.{ext}", f"{FONTAWESOME_CDN}/{font}.{ext}"))
+
+    failed = 0
+    for target, url in downloads:
+        try:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            with urllib.request.urlopen(url, timeout=30) as response:
+                target.write_bytes(response.read())
+            logger.info(f"✅ {target.relative_to(STATIC_DIR)}")
+        except Exception as e:
+            failed += 1
+            logger.error(f"❌ فشل تنزيل {url}: {e}")
+    return failed == 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if "--fetch-vendor" in sys.argv:
+        sys.exit(0 if fetch_vendor_assets() else 1)
+    print(f"ملفات ثابتة: {asset_registry.preload()}")
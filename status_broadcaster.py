@@ -0,0 +1,272 @@
+"""
+بث حالة النظام بالدفع
+منتج واحد يحسب الحالة دورياً أو عند التغيير ويرسل فروقات مرقمة بالإصدار (بأسلوب JSON Patch) إلى غرفة المشتركين، مع لقطة مخزنة للمشتركين الجدد
+"""
+
+import os
+import json
+import threading
+import time
+import logging
+from collections import deque
+
+from async_runtime import run_blocking
+from metrics import timed
+
+logger = logging.getLogger(__name__)
+
+# غرفة Socket.IO الخاصة بمشتركي الحالة
+STATUS_ROOM = "status"
+
+# فترة تحديث الحالة بالثواني
+STATUS_INTERVAL = float(os.environ.get("VNC_STATUS_INTERVAL", "5"))
+
+# أقسام وثيقة الحالة
+SECTIONS = ('vnc_status', 'system_info')
+
+# عدد الإصدارات المحفوظة فروقاتها للعملاء المتأخرين
+DELTA_HISTORY = int(os.environ.get("VNC_STATUS_HISTORY", "64"))
+
+# مع عدة عمال: فاصل فحص ملف طلب التحديث (لدى القائد) واللقطة المشتركة (لدى التابعين)
+SHARED_POLL_INTERVAL = float(os.environ.get("VNC_STATUS_SHARED_POLL", "0.5"))
+
+def _escape(key):
+    """ترميز مفتاح داخل مسار JSON Pointer"""
+    return str(key).replace('~', '~0').replace('/', '~1')
+
+def diff_documents(old, new, path=''):
+    """فروقات بأسلوب JSON Patch بين وثيقتين (القوائم تُستبدل كاملة)"""
+    if old == new:
+        return []
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        return [{'op': 'replace', 'path': path, 'value': new}]
+
+    ops = []
+    for key in old:
+        if key not in new:
+            ops.append({'op': 'remove', 'path': f"{path}/{_escape(key)}"})
+    for key, value in new.items():
+        child = f"{path}/{_escape(key)}"
+        if key not in old:
+            ops.append({'op': 'add', 'path': child, 'value': value})
+        else:
+            ops.extend(diff_documents(old[key], value, child))
+    return ops
+
+def merge_deltas(deltas):
+    """دمج فروقات متتالية مع إبقاء آخر عملية لكل مسار"""
+    merged = {}
+    for ops in deltas:
+        for op in ops:
+            # عملية على مسار أب تلغي العمليات السابقة على مساراته الفرعية
+            for path in [p for p in merged if p.startswith(op['path'] + '/')]:
+                del merged[path]
+            merged.pop(op['path'], None)
+            merged[op['path']] = op
+    return list(merged.values())
+
+def _compute_section(name):
+    """حساب قسم واحد من الحالة"""
+    from vnc_manager import get_vnc_status, get_system_info
+    if name == 'vnc_status':
+        return get_vnc_status()
+    return get_system_info()
+
+class StatusBroadcaster:
+    """منتج حالة وحيد يبث إلى غرفة بدلاً من الحساب لكل عميل"""
+
+    def __init__(self, interval=STATUS_INTERVAL):
+        self.interval = interval
+        self.socketio = None
+        self.snapshot = {}
+        self.version = 0
+        self.updated_at = None
+        # (الإصدار، الفروقات المؤدية إليه)
+        self._history = deque(maxlen=DELTA_HISTORY)
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._started = False
+        # مع عدة عمال: قائد واحد يحسب ويبث، والبقية يقرؤون اللقطة المشتركة
+        self._leader_lock = None
+        self._shared_file = None
+        self._shared_mtime = None
+        self._refresh_file = None
+        self._refresh_mtime = None
+
+    def init_app(self, socketio):
+        """ربط المنتج بخادم Socket.IO"""
+        from message_bus import MESSAGE_QUEUE, LeaderLock
+        self.socketio = socketio
+        if MESSAGE_QUEUE:
+            self._leader_lock = LeaderLock("status")
+            self._shared_file = self._leader_lock.path.with_name("status.json")
+            self._refresh_file = self._leader_lock.path.with_name("status.refresh")
+
+    def start(self):
+        """بدء المنتج عند أول مشترك"""
+        with self._lock:
+            if self._started or self.socketio is None:
+                return
+            self._started = True
+        self.socketio.start_background_task(self._run)
+        logger.info(f"✅ تم بدء بث الحالة كل {self.interval} ثانية")
+
+    def refresh(self):
+        """طلب إعادة حساب فورية بعد تغيير معروف (بدء/إيقاف خادم)"""
+        self._wakeup.set()
+        if self._refresh_file and not self._leader_lock.held:
+            # التابع لا يحسب الحالة: تنبيه القائد عبر ملف مشترك يراقبه
+            try:
+                self._refresh_file.touch()
+            except OSError as e:
+                logger.warning(f"⚠️ تعذر طلب تحديث الحالة من القائد: {e}")
+
+    @timed('status_collect')
+    def _collect(self):
+        """حساب لقطة كاملة"""
+        snapshot = {}
+        for name in SECTIONS:
+            try:
+                # psutil (عينة المعالج لثانية) حاجز: يُنفذ في مجمع الخيوط
+                snapshot[name] = run_blocking(_compute_section, name)
+            except Exception as e:
+                logger.error(f"خطأ في حساب حالة {name}: {e}")
+                if name in self.snapshot:
+                    snapshot[name] = self.snapshot[name]
+        return snapshot
+
+    def tick(self):
+        """حساب الحالة مرة واحدة وبث الفروقات فقط مع رقم إصدار جديد"""
+        snapshot = self._collect()
+        with self._lock:
+            ops = diff_documents(self.snapshot, snapshot)
+            if not ops:
+                return None
+            previous = self.version
+            self.version += 1
+            self.snapshot = snapshot
+            self.updated_at = time.time()
+            self._history.append((self.version, ops))
+            version = self.version
+
+        if self._shared_file:
+            self._save_shared()
+
+        self.socketio.emit('status_delta', {'from': previous, 'version': version, 'ops': ops}, to=STATUS_ROOM)
+        return ops
+
+    def _save_shared(self):
+        """نشر اللقطة للعمال الآخرين"""
+        tmp = self._shared_file.with_suffix(".tmp")
+        with open(tmp, 'w') as f:
+            json.dump(self.get_snapshot(), f, default=str)
+        os.replace(tmp, self._shared_file)
+
+    def _load_shared(self):
+        """قراءة لقطة القائد إن تغيرت"""
+        try:
+            mtime = self._shared_file.stat().st_mtime_ns
+            if mtime == self._shared_mtime:
+                return
+            with open(self._shared_file) as f:
+                shared = json.load(f)
+        except (OSError, ValueError):
+            return
+        self._shared_mtime = mtime
+        with self._lock:
+            if shared['version'] > self.version:
+                self.version = shared['version']
+                self.snapshot = shared['document']
+                self.updated_at = time.time()
+                # لا نملك فروقات القائد: الطلبات القديمة تستلم الوثيقة كاملة
+                self._history.clear()
+
+    def _is_leader(self):
+        """هل هذا العامل هو منتج الحالة (مع تولي القيادة إن توقف القائد السابق)"""
+        if self._leader_lock is None:
+            return True
+        was_leader = self._leader_lock.held
+        if not self._leader_lock.acquire():
+            return False
+        if not was_leader:
+            # متابعة ترقيم الإصدارات من حيث توقف القائد السابق
+            self._load_shared()
+            logger.info(f"👑 هذا العامل ({os.getpid()}) هو منتج الحالة")
+        return True
+
+    def _refresh_requested(self):
+        """هل طلب عامل آخر تحديثاً منذ آخر فحص"""
+        try:
+            mtime = self._refresh_file.stat().st_mtime_ns
+        except OSError:
+            mtime = 0
+        requested = self._refresh_mtime is not None and mtime != self._refresh_mtime
+        self._refresh_mtime = mtime
+        return requested
+
+    def _wait(self):
+        """انتظار الفترة أو طلب تحديث: محلي، أو من عامل آخر، أو لقطة جديدة من القائد"""
+        if self._refresh_file is None:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            return
+        deadline = time.monotonic() + self.interval
+        while time.monotonic() < deadline:
+            if self._wakeup.wait(SHARED_POLL_INTERVAL):
+                break
+            if self._leader_lock.held:
+                if self._refresh_requested():
+                    break
+            else:
+                # التابع يلتقط لقطة القائد فور نشرها بدل انتظار دورته
+                self._load_shared()
+        self._wakeup.clear()
+
+    def _run(self):
+        while True:
+            try:
+                if self._is_leader():
+                    self.tick()
+                else:
+                    self._load_shared()
+            except Exception as e:
+                logger.error(f"خطأ في بث الحالة: {e}")
+            self._wait()
+
+    def get_snapshot(self):
+        """آخر لقطة محسوبة مع إصدارها"""
+        with self._lock:
+            return {'version': self.version, 'document': self.snapshot}
+
+    def changes_since(self, version):
+        """الفروقات منذ إصدار معين: None إن لم يتغير شيء، أو وثيقة كاملة إن خرج الإصدار من السجل"""
+        with self._lock:
+            if version == self.version:
+                return None
+            deltas = [ops for v, ops in self._history if v > version]
+            oldest = self._history[0][0] if self._history else None
+            if version > self.version or oldest is None or version < oldest - 1:
+                return {'version': self.version, 'document': self.snapshot}
+            return {'from': version, 'version': self.version, 'ops': merge_deltas(deltas)}
+
+    def send_snapshot(self, sid, since=None):
+        """إرسال ما ينقص عميلاً واحداً: فروقات منذ إصداره أو اللقطة الكاملة"""
+        if since is None:
+            if self.version:
+                self.socketio.emit('status_snapshot', self.get_snapshot(), to=sid)
+            return
+        changes = self.changes_since(since)
+        if changes is None:
+            return
+        event = 'status_delta' if 'ops' in changes else 'status_snapshot'
+        self.socketio.emit(event, changes, to=sid)
+
+    def subscribe(self, sid):
+        """إضافة عميل لغرفة الحالة وإرسال اللقطة الحالية له فوراً"""
+        from flask_socketio import join_room
+        join_room(STATUS_ROOM, sid=sid)
+        self.start()
+        self.send_snapshot(sid)
+
+# المنتج المشترك للتطبيق
+status_broadcaster = StatusBroadcaster()
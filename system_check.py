@@ -5,6 +5,7 @@
 import subprocess
 import sys
 import logging
+from importlib.util import find_spec
 
 logger = logging.getLogger(__name__)
 
@@ -31,12 +32,8 @@ def verify_system_requirements():
             'psutil'
         ]
         
-        missing_modules = []
-        for module in required_modules:
-            try:
-                __import__(module)
-            except ImportError:
-                missing_modules.append(module)
+        # التحقق من وجود الوحدات دون استيرادها (الاستيراد الفعلي مكلف ويتم لاحقاً عند الحاجة)
+        missing_modules = [module for module in required_modules if find_spec(module) is None]
         
         if missing_modules:
             logger.warning(f"مكتبات Python مفقودة: {missing_modules}")
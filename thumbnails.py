@@ -0,0 +1,233 @@
+"""
+مصغرات الجلسات الحية للوحة التحكم
+مصغرة صغيرة (160x120 افتراضياً) لكل عرض نشط من مرحلة الالتقاط المشتركة: تُعاد فقط للعروض التي تغير إطارها
+(بحد أدنى VNC_THUMB_INTERVAL بين تحديثين)، تُخدم بـ ETag، ويستلم مشتركو اللوحة إشعاراً صغيراً بالبصمة الجديدة،
+فمتابعة 50 سطح مكتب تكلف 50 تصغيراً لكل تغيير فقط، لا 50 بثاً بالدقة الكاملة
+
+الأحداث:
+    thumbnails_subscribe            ← العميل
+    thumbnail {display, etag, ...}  → العميل (عند تغير مصغرة)
+    thumbnail_removed {display}     → العميل (عند اختفاء عرض)
+"""
+
+import os
+import io
+import time
+import hashlib
+import threading
+import logging
+
+from import_profiler import lazy_import
+from metrics import timed
+
+Image = lazy_import('PIL.Image')
+
+logger = logging.getLogger(__name__)
+
+# غرفة Socket.IO لمشتركي المصغرات
+THUMBNAIL_ROOM = "thumbnails"
+
+THUMB_WIDTH, THUMB_HEIGHT = (int(v) for v in os.environ.get("VNC_THUMB_SIZE", "160x120").split("x"))
+THUMB_INTERVAL = float(os.environ.get("VNC_THUMB_INTERVAL", "2"))
+THUMB_QUALITY = int(os.environ.get("VNC_THUMB_QUALITY", "70"))
+
+# فاصل البحث عن عروض جديدة
+DISCOVERY_INTERVAL = float(os.environ.get("VNC_THUMB_DISCOVERY_INTERVAL", "10"))
+
+class Thumbnail:
+    """مصغرة عرض واحد مرمزة JPEG مع بصمتها"""
+
+    def __init__(self, display, version, image):
+        self.display = display
+        self.version = version
+        self.image = image
+        self.etag = hashlib.blake2b(image, digest_size=8).hexdigest()
+        self.updated_at = time.time()
+
+    def to_dict(self):
+        return {
+            'display': self.display,
+            'number': self.display.lstrip(':'),
+            'version': self.version,
+            'etag': self.etag,
+            'size': len(self.image),
+            'updated_at': self.updated_at,
+        }
+
+def fit_size(width, height, max_width=THUMB_WIDTH, max_height=THUMB_HEIGHT):
+    """أبعاد المصغرة مع الحفاظ على نسبة العرض إلى الارتفاع"""
+    scale = min(max_width / width, max_height / height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+class ThumbnailService:
+    """خيط واحد يعيد تصغير العروض المتغيرة فقط ويبلغ غرفة المشتركين"""
+
+    def __init__(self):
+        self.socketio = None
+        self.thumbnails = {}
+        self.generated = 0
+        self._dirty = set()
+        self._stages = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._started = False
+
+    def init_app(self, socketio):
+        self.socketio = socketio
+
+    def start(self):
+        """بدء الخدمة عند أول طلب أو مشترك"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        self.discover()
+        threading.Thread(target=self._run, daemon=True, name="thumbnails").start()
+        logger.info(f"✅ تم بدء خدمة المصغرات ({THUMB_WIDTH}x{THUMB_HEIGHT})")
+
+    def discover(self):
+        """ربط العروض الجديدة بمراحل التقاطها؛ كل عرض جديد يُصغر مرة أولى، والعروض المختفية تُزال"""
+        from screen_capture import find_displays, get_capture_stage
+
+        displays = find_displays()
+        for display in set(self._stages) - set(displays):
+            self.remove(display)
+        for display in displays:
+            if display in self._stages:
+                continue
+            stage = get_capture_stage(display)
+            if not stage.available:
+                continue
+            stage.subscribe(self._on_frame)
+            with self._lock:
+                self._stages[display] = stage
+                self._dirty.add(display)
+        self._wakeup.set()
+
+    def remove(self, display):
+        """فك ارتباط عرض انتهى وإبلاغ المشتركين بحذف مصغرته"""
+        with self._lock:
+            stage = self._stages.pop(display, None)
+            self._dirty.discard(display)
+        if stage is None:
+            return
+        stage.unsubscribe(self._on_frame)
+        self.thumbnails.pop(display, None)
+        logger.info(f"🗑️ إزالة مصغرة العرض {display}")
+        if self.socketio is not None:
+            self.socketio.emit('thumbnail_removed', {'display': display, 'number': display.lstrip(':')},
+                               to=THUMBNAIL_ROOM)
+
+    def _on_frame(self, stage, version, update):
+        # يُستدعى من خيط الالتقاط: تعليم العرض فقط، التصغير في خيط الخدمة
+        with self._lock:
+            self._dirty.add(stage.display)
+        self._wakeup.set()
+
+    def _run(self):
+        last_discovery = time.monotonic()
+        while True:
+            self._wakeup.wait(DISCOVERY_INTERVAL)
+            self._wakeup.clear()
+            try:
+                if time.monotonic() - last_discovery >= DISCOVERY_INTERVAL:
+                    last_discovery = time.monotonic()
+                    self.discover()
+                self.refresh_dirty()
+            except Exception as e:
+                logger.error(f"خطأ في تحديث المصغرات: {e}")
+            # تجميع التغيرات المتلاحقة: مصغرة واحدة لكل عرض في كل فاصل
+            time.sleep(THUMB_INTERVAL)
+
+    def refresh_dirty(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        for display in sorted(dirty):
+            thumbnail = self.render(display)
+            if thumbnail is not None and self.socketio is not None:
+                self.socketio.emit('thumbnail', thumbnail.to_dict(), to=THUMBNAIL_ROOM)
+
+    @timed('thumbnail_render')
+    def render(self, display):
+        """تصغير عرض واحد؛ None إن لم يتغير المحتوى"""
+        stage = self._stages.get(display)
+        if stage is None:
+            return None
+        width, height = fit_size(stage.width, stage.height)
+        version, pixels = stage.downscaled(width, height)
+        if pixels is None:
+            return None
+        buffer = io.BytesIO()
+        Image.fromarray(pixels, 'RGB').save(buffer, format='JPEG', quality=THUMB_QUALITY)
+        thumbnail = Thumbnail(display, version, buffer.getvalue())
+        previous = self.thumbnails.get(display)
+        if previous is not None and previous.etag == thumbnail.etag:
+            return None
+        self.thumbnails[display] = thumbnail
+        self.generated += 1
+        return thumbnail
+
+    def get(self, display):
+        """المصغرة الحالية لعرض (تُحسب فوراً إن لم تُحسب بعد)"""
+        self.start()
+        if display not in self._stages:
+            self.discover()
+        if display not in self.thumbnails:
+            self.render(display)
+        return self.thumbnails.get(display)
+
+    def subscribe(self, sid):
+        """إضافة عميل لغرفة المصغرات وإرسال القائمة الحالية له"""
+        from flask_socketio import join_room
+        join_room(THUMBNAIL_ROOM, sid=sid)
+        self.start()
+        for thumbnail in list(self.thumbnails.values()):
+            self.socketio.emit('thumbnail', thumbnail.to_dict(), to=sid)
+
+    def get_status(self):
+        return {
+            'displays': sorted(self._stages),
+            'thumbnails': [t.to_dict() for t in self.thumbnails.values()],
+            'generated': self.generated,
+            'size': [THUMB_WIDTH, THUMB_HEIGHT],
+        }
+
+# خدمة المصغرات المشتركة للتطبيق
+thumbnail_service = ThumbnailService()
+
+def register_thumbnails(app, socketio):
+    """مسارات المصغرات وحدث الاشتراك"""
+    from flask import Response, jsonify, request
+
+    thumbnail_service.init_app(socketio)
+
+    @app.route('/api/thumbnails')
+    def api_thumbnails():
+        """قائمة مصغرات العروض النشطة وبصماتها"""
+        try:
+            thumbnail_service.start()
+            return jsonify({'success': True, **thumbnail_service.get_status()})
+        except Exception as e:
+            logger.error(f"خطأ في قائمة المصغرات: {e}")
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @app.route('/api/thumbnails/<int:number>')
+    def api_thumbnail(number):
+        """مصغرة JPEG لعرض مع ETag (304 إن لم تتغير)"""
+        try:
+            thumbnail = thumbnail_service.get(f":{number}")
+            if thumbnail is None:
+                return jsonify({'success': False, 'error': 'لا توجد مصغرة لهذا العرض'}), 404
+            if thumbnail.etag in request.if_none_match:
+                return Response(status=304, headers={'ETag': f'"{thumbnail.etag}"'})
+            response = Response(thumbnail.image, mimetype='image/jpeg')
+            response.set_etag(thumbnail.etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        except Exception as e:
+            logger.error(f"خطأ في مصغرة العرض :{number}: {e}")
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @socketio.on('thumbnails_subscribe')
+    def handle_thumbnails_subscribe(data=None):
+        thumbnail_service.subscribe(request.sid)
@@ -0,0 +1,184 @@
+"""
+محرك مقارنة الإطارات بالمربعات
+يقارن الإطار الحالي بالسابق لكل مربع 64x64 بعمليات NumPy متجهة، ويكشف التمرير العمودي (الشائع في xterm) بمطابقة بصمات الصفوف
+فيرسله كنسخ مستطيل (CopyRect) بدلاً من إعادة الترميز، ثم يدمج المربعات المتغيرة في أقل عدد من المستطيلات
+
+الإطار مصفوفة uint8 بشكل (الارتفاع، بايتات الصف) كما في ملف Xvfb، أو HxWxC
+"""
+
+import os
+import logging
+
+import numpy as np
+
+from metrics import timed
+
+logger = logging.getLogger(__name__)
+
+# ضلع مربع المقارنة بالبكسل
+DIFF_TILE = int(os.environ.get("VNC_DIFF_TILE", "64"))
+
+# أقل عدد صفوف متطابقة لاعتبار التغيير تمريراً، وأقصى إزاحة تُبحث
+MIN_SCROLL_ROWS = 32
+MAX_SCROLL = int(os.environ.get("VNC_MAX_SCROLL", "512"))
+
+def _as_rows(frame):
+    """تحويل الإطار إلى (صفوف، بايتات) مع عدد بايتات البكسل"""
+    if frame.ndim == 3:
+        return frame.reshape(frame.shape[0], -1), frame.shape[2]
+    return frame, None
+
+def _word_view(rows, bytes_per_pixel, tile):
+    """عرض الصفوف ككلمات 64 بت إن أمكن (مقارنة أسرع 8 مرات) مع عرض المربع بالكلمات"""
+    tile_bytes = tile * bytes_per_pixel
+    if rows.flags.c_contiguous and rows.shape[1] % 8 == 0 and tile_bytes % 8 == 0:
+        return rows.view(np.uint64), tile_bytes // 8
+    return rows, tile_bytes
+
+def merge_tiles(dirty, tile, width, height):
+    """دمج شبكة المربعات المتغيرة في مستطيلات: تسلسلات أفقية ثم دمج التسلسلات المتطابقة عمودياً"""
+    open_runs = {}
+    rects = []
+    for row in range(dirty.shape[0]):
+        columns = np.flatnonzero(dirty[row])
+        runs = set()
+        if columns.size:
+            breaks = np.flatnonzero(np.diff(columns) > 1)
+            starts = np.concatenate(([columns[0]], columns[breaks + 1]))
+            ends = np.concatenate((columns[breaks], [columns[-1]]))
+            runs = {(int(s), int(e)) for s, e in zip(starts, ends)}
+        for run in list(open_runs):
+            if run not in runs:
+                rects.append((run, open_runs.pop(run), row))
+        for run in runs:
+            open_runs.setdefault(run, row)
+    for run, top in open_runs.items():
+        rects.append((run, top, dirty.shape[0]))
+
+    result = []
+    for (first, last), top, bottom in rects:
+        x, y = first * tile, top * tile
+        result.append((x, y, min(width, (last + 1) * tile) - x, min(height, bottom * tile) - y))
+    return sorted(result, key=lambda r: (r[1], r[0]))
+
+class TileDiffer:
+    """مقارنة متتالية للإطارات مع الاحتفاظ بالإطار السابق وبصمات صفوفه"""
+
+    def __init__(self, tile=DIFF_TILE, bytes_per_pixel=4, detect_scroll=True):
+        self.tile = tile
+        self.bytes_per_pixel = bytes_per_pixel
+        self.detect_scroll = detect_scroll
+        self.previous = None
+        self._weights = None
+
+    def reset(self):
+        """نسيان الإطار السابق (التحديث التالي كامل)"""
+        self.previous = None
+
+    def _row_hashes(self, words, columns):
+        """بصمة لكل (صف، مجموعة أعمدة مربعات): مجموع مرجح بكلمات عشوائية مع التفاف 64 بت"""
+        if self._weights is None or self._weights.shape[0] != words.shape[1]:
+            rng = np.random.default_rng(0x5EED)
+            self._weights = rng.integers(1, 2**63, size=words.shape[1], dtype=np.uint64) | np.uint64(1)
+        band = slice(columns[0], columns[1])
+        return (words[:, band].astype(np.uint64, copy=False) * self._weights[band]).sum(axis=1, dtype=np.uint64)
+
+    def _dirty_tiles(self, current, previous, tile_words):
+        """شبكة منطقية للمربعات المتغيرة"""
+        height, row_words = current.shape
+        changed = current != previous
+        row_starts = np.arange(0, height, self.tile)
+        col_starts = np.arange(0, row_words, tile_words)
+        return np.logical_or.reduceat(np.logical_or.reduceat(changed, row_starts, axis=0), col_starts, axis=1)
+
+    def _find_scroll(self, current, previous, tile_words, first_col, last_col, top, bottom):
+        """البحث عن إزاحة عمودية لشريط أعمدة متغير؛ يعيد (المصدر y، الهدف y، الارتفاع) أو None"""
+        columns = (first_col * tile_words, min(current.shape[1], (last_col + 1) * tile_words))
+        current_hash = self._row_hashes(current[top:bottom], columns)
+        previous_hash = self._row_hashes(previous[top:bottom], columns)
+
+        # الصفوف ذات البصمة الفريدة في الإطار السابق فقط (الصفوف المتكررة كالخلفية لا تحدد الإزاحة)
+        unique, index, counts = np.unique(previous_hash, return_index=True, return_counts=True)
+        unique, index = unique[counts == 1], index[counts == 1]
+        if unique.size < MIN_SCROLL_ROWS // 4:
+            return None
+        position = np.clip(np.searchsorted(unique, current_hash), 0, unique.size - 1)
+        matched = unique[position] == current_hash
+        rows = np.flatnonzero(matched)
+        shifts = index[position[matched]] - rows
+        shifts = shifts[(shifts != 0) & (np.abs(shifts) <= MAX_SCROLL)]
+        if shifts.size < MIN_SCROLL_ROWS // 4:
+            return None
+        values, votes = np.unique(shifts, return_counts=True)
+        dy = int(values[np.argmax(votes)])
+
+        # أطول تسلسل من الصفوف التي تطابق الإطار السابق بهذه الإزاحة
+        length = (bottom - top) - abs(dy)
+        destination = np.arange(max(0, -dy), max(0, -dy) + length)
+        same = current_hash[destination] == previous_hash[destination + dy]
+        if not same.any():
+            return None
+        edges = np.diff(np.concatenate(([0], same.astype(np.int8), [0])))
+        starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+        best = int(np.argmax(ends - starts))
+        run_start, run_length = int(starts[best]), int(ends[best] - starts[best])
+        if run_length < MIN_SCROLL_ROWS:
+            return None
+
+        dst_y = top + int(destination[run_start])
+        src_y = dst_y + dy
+        band = slice(*columns)
+        # تحقق فعلي من البكسلات (البصمات قد تتصادم)
+        if not np.array_equal(current[dst_y:dst_y + run_length, band], previous[src_y:src_y + run_length, band]):
+            return None
+        return src_y, dst_y, run_length
+
+    @timed('tile_diff')
+    def diff(self, frame):
+        """المقارنة بالإطار السابق: {'copies': [(src_x, src_y, x, y, w, h)], 'rects': [(x, y, w, h)], ...}"""
+        rows, bytes_per_pixel = _as_rows(frame)
+        bytes_per_pixel = bytes_per_pixel or self.bytes_per_pixel
+        height = rows.shape[0]
+        width = rows.shape[1] // bytes_per_pixel
+
+        if self.previous is None or self.previous.shape != rows.shape:
+            self.previous = rows.copy()
+            return {'copies': [], 'rects': [(0, 0, width, height)], 'dirty_tiles': None, 'full': True}
+
+        current, tile_words = _word_view(rows, bytes_per_pixel, self.tile)
+        previous, _ = _word_view(self.previous, bytes_per_pixel, self.tile)
+        dirty = self._dirty_tiles(current, previous, tile_words)
+        if not dirty.any():
+            return {'copies': [], 'rects': [], 'dirty_tiles': 0, 'full': False}
+
+        copies = []
+        if self.detect_scroll:
+            # كل مجموعة أعمدة متغيرة متجاورة تُفحص كمنطقة تمرير محتملة
+            columns = np.flatnonzero(dirty.any(axis=0))
+            breaks = np.flatnonzero(np.diff(columns) > 1)
+            groups = zip(np.concatenate(([columns[0]], columns[breaks + 1])), np.concatenate((columns[breaks], [columns[-1]])))
+            for first_col, last_col in groups:
+                dirty_rows = np.flatnonzero(dirty[:, first_col:last_col + 1].any(axis=1))
+                top, bottom = int(dirty_rows[0]) * self.tile, min(height, (int(dirty_rows[-1]) + 1) * self.tile)
+                if bottom - top < MIN_SCROLL_ROWS * 2:
+                    continue
+                found = self._find_scroll(current, previous, tile_words, int(first_col), int(last_col), top, bottom)
+                if found is None:
+                    continue
+                src_y, dst_y, length = found
+                x = int(first_col) * self.tile
+                w = min(width, (int(last_col) + 1) * self.tile) - x
+                copies.append((x, src_y, x, dst_y, w, length))
+
+        if copies:
+            # الإطار المتوقع لدى العميل بعد النسخ؛ المتبقي فقط يُعاد ترميزه
+            for src_x, src_y, x, y, w, h in copies:
+                byte_x, byte_w = x * bytes_per_pixel, w * bytes_per_pixel
+                self.previous[y:y + h, byte_x:byte_x + byte_w] = self.previous[src_y:src_y + h, byte_x:byte_x + byte_w].copy()
+            previous, _ = _word_view(self.previous, bytes_per_pixel, self.tile)
+            dirty = self._dirty_tiles(current, previous, tile_words)
+
+        rects = merge_tiles(dirty, self.tile, width, height)
+        for x, y, w, h in rects:
+            self.previous[y:y + h, x * bytes_per_pixel:(x + w) * bytes_per_pixel] = rows[y:y + h, x * bytes_per_pixel:(x + w) * bytes_per_pixel]
+        return {'copies': copies, 'rects': rects, 'dirty_tiles': int(dirty.sum()), 'full': False}
@@ -0,0 +1,245 @@
+"""
+خدمة ترميز الإطارات على عدة أنوية
+الإطار يُنسخ مرة واحدة إلى ذاكرة مشتركة (multiprocessing.shared_memory) ويُقسم إلى مربعات أو أشرطة تُرمز في ProcessPoolExecutor؛
+العمال يقرؤون البكسلات مباشرة من الذاكرة المشتركة فلا تُنقل عبر pickle إلا الإحداثيات والنتائج المرمزة، ثم تُجمع النتائج بالترتيب
+
+الإعداد:
+    VNC_ENCODER_WORKERS=4 VNC_TILE_SIZE=128 VNC_PNG_BAND_ROWS=64
+"""
+
+import os
+import io
+import zlib
+import struct
+import threading
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from metrics import timed
+
+logger = logging.getLogger(__name__)
+
+# عدد العمال (0 = عدد الأنوية)، وطريقة إنشائهم (forkserver آمنة مع خيوط Flask)
+ENCODER_WORKERS = int(os.environ.get("VNC_ENCODER_WORKERS", "0")) or os.cpu_count() or 1
+ENCODER_START_METHOD = os.environ.get("VNC_ENCODER_START", "forkserver")
+
+# ضلع المربع بالبكسل، وعدد صفوف كل شريط في ترميز PNG المتوازي
+TILE_SIZE = int(os.environ.get("VNC_TILE_SIZE", "128"))
+PNG_BAND_ROWS = int(os.environ.get("VNC_PNG_BAND_ROWS", "64"))
+
+# صيغ المربعات المدعومة
+TILE_FORMATS = ('jpeg', 'png', 'zlib')
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+ADLER_BASE = 65521
+
+def split_tiles(width, height, tile_size=TILE_SIZE, rects=None):
+    """تقسيم الإطار (أو المناطق المحددة) إلى مربعات مرتبة صفاً صفاً"""
+    tiles = []
+    for x0, y0, w, h in rects or [(0, 0, width, height)]:
+        for y in range(y0, y0 + h, tile_size):
+            for x in range(x0, x0 + w, tile_size):
+                tiles.append((x, y, min(tile_size, x0 + w - x), min(tile_size, y0 + h - y)))
+    return sorted(tiles, key=lambda t: (t[1], t[0]))
+
+def adler32_combine(adler1, adler2, length2):
+    """دمج مجموعي adler32 لمقطعين متتاليين (مثل adler32_combine في zlib)"""
+    remainder = length2 % ADLER_BASE
+    sum1 = adler1 & 0xFFFF
+    sum2 = (remainder * sum1) % ADLER_BASE
+    sum1 = (sum1 + (adler2 & 0xFFFF) + ADLER_BASE - 1) % ADLER_BASE
+    sum2 = (sum2 + ((adler1 >> 16) & 0xFFFF) + ((adler2 >> 16) & 0xFFFF) + ADLER_BASE - remainder) % ADLER_BASE
+    return sum1 | (sum2 << 16)
+
+def png_filter_sub(rows):
+    """مرشح PNG من النوع Sub لصفوف RGB (فرق كل بكسل عن جاره الأيسر) مع بايت النوع في بداية كل صف"""
+    filtered = np.empty((rows.shape[0], rows.shape[1] * 3 + 1), dtype=np.uint8)
+    filtered[:, 0] = 1
+    flat = rows.reshape(rows.shape[0], -1)
+    filtered[:, 1:4] = flat[:, :3]
+    np.subtract(flat[:, 3:], flat[:, :-3], out=filtered[:, 4:])
+    return filtered
+
+def _png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+# ---- جهة العامل ----
+
+# الذاكرة المشتركة المفتوحة في العامل مفهرسة بالاسم (تُفتح مرة واحدة لكل مقبس)
+_attached = {}
+
+def _frame_view(name, shape):
+    """عرض numpy للإطار في الذاكرة المشتركة دون نسخ"""
+    segment = _attached.get(name)
+    if segment is None:
+        segment = shared_memory.SharedMemory(name=name)
+        _attached[name] = segment
+    return np.ndarray(shape, dtype=np.uint8, buffer=segment.buf)
+
+def _encode_tile(pixels, fmt, quality):
+    if fmt == 'zlib':
+        return zlib.compress(pixels.tobytes(), 1)
+    from PIL import Image
+    buffer = io.BytesIO()
+    image = Image.fromarray(np.ascontiguousarray(pixels), 'RGB')
+    if fmt == 'jpeg':
+        image.save(buffer, format='JPEG', quality=quality)
+    else:
+        image.save(buffer, format='PNG', compress_level=1)
+    return buffer.getvalue()
+
+def encode_tile_batch(name, shape, tiles, fmt, quality):
+    """ترميز دفعة مربعات من الإطار المشترك (يُنفذ في العامل)"""
+    frame = _frame_view(name, shape)
+    return [_encode_tile(frame[y:y + h, x:x + w], fmt, quality) for x, y, w, h in tiles]
+
+def encode_png_band(name, shape, top, bottom, level, last):
+    """ضغط شريط صفوف كمقطع deflate مستقل ينتهي بحدود بايت (يُنفذ في العامل)"""
+    frame = _frame_view(name, shape)
+    filtered = png_filter_sub(frame[top:bottom]).tobytes()
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    data = compressor.compress(filtered) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+    return data, zlib.adler32(filtered), len(filtered)
+
+def _warm_up(_=None):
+    """تحميل المكتبات في العامل مسبقاً"""
+    import PIL.Image  # noqa: F401
+    return os.getpid()
+
+# ---- جهة الخدمة ----
+
+class _FrameSlot:
+    """ذاكرة مشتركة قابلة لإعادة الاستخدام لإطار بحجم معين"""
+
+    def __init__(self, shape):
+        self.shape = shape
+        self.segment = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)))
+        self.array = np.ndarray(shape, dtype=np.uint8, buffer=self.segment.buf)
+
+    @property
+    def name(self):
+        return self.segment.name
+
+    def close(self):
+        self.array = None
+        self.segment.close()
+        self.segment.unlink()
+
+class TileEncoder:
+    """مجمع عمال الترميز مع خانات ذاكرة مشتركة لكل إطار قيد الترميز"""
+
+    def __init__(self, workers=ENCODER_WORKERS, tile_size=TILE_SIZE):
+        self.workers = max(1, workers)
+        self.tile_size = tile_size
+        self._executor = None
+        self._free_slots = {}
+        self._slots = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        """تشغيل العمال وتحميل المكتبات فيها"""
+        with self._lock:
+            if self._executor is None:
+                context = multiprocessing.get_context(ENCODER_START_METHOD)
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                pids = set(self._executor.map(_warm_up, range(self.workers)))
+                logger.info(f"✅ خدمة الترميز تعمل بـ {len(pids)} عامل")
+        return self._executor
+
+    def shutdown(self):
+        """إيقاف العمال وتحرير الذاكرة المشتركة"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+            for slot in self._slots:
+                slot.close()
+            self._slots = []
+            self._free_slots = {}
+
+    def _acquire_slot(self, frame):
+        """نسخ الإطار إلى خانة مشتركة حرة (النسخة الوحيدة للبكسلات)"""
+        shape = frame.shape
+        with self._lock:
+            free = self._free_slots.setdefault(shape, [])
+            slot = free.pop() if free else None
+            if slot is None:
+                slot = _FrameSlot(shape)
+                self._slots.append(slot)
+        np.copyto(slot.array, frame)
+        return slot
+
+    def _release_slot(self, slot):
+        with self._lock:
+            self._free_slots.setdefault(slot.shape, []).append(slot)
+
+    def _batches(self, items):
+        """توزيع العناصر على دفعات متقاربة (عدة دفعات لكل عامل لموازنة الحمل)"""
+        count = min(len(items), self.workers * 4)
+        size = -(-len(items) // count) if count else 1
+        return [items[i:i + size] for i in range(0, len(items), size)]
+
+    @timed('encode_tiles')
+    def encode_tiles(self, frame, rects=None, fmt='jpeg', quality=80):
+        """ترميز مربعات الإطار (RGB بشكل HxWx3) بالتوازي؛ النتيجة مرتبة: [{'x','y','w','h','data'}]"""
+        if fmt not in TILE_FORMATS:
+            raise ValueError(f"صيغة مربعات غير مدعومة: {fmt}")
+        height, width = frame.shape[:2]
+        tiles = split_tiles(width, height, self.tile_size, rects)
+        if not tiles:
+            return []
+
+        executor = self.start()
+        slot = self._acquire_slot(frame)
+        try:
+            batches = self._batches(tiles)
+            futures = [executor.submit(encode_tile_batch, slot.name, slot.shape, batch, fmt, quality)
+                       for batch in batches]
+            encoded = [data for future in futures for data in future.result()]
+        finally:
+            self._release_slot(slot)
+        return [{'x': x, 'y': y, 'w': w, 'h': h, 'data': data} for (x, y, w, h), data in zip(tiles, encoded)]
+
+    @timed('encode_png')
+    def encode_png(self, frame, level=6):
+        """ترميز الإطار كصورة PNG واحدة: كل عامل يضغط شريطاً كمقطع deflate مستقل ثم تُوصل المقاطع بالترتيب"""
+        height, width = frame.shape[:2]
+        executor = self.start()
+        slot = self._acquire_slot(frame)
+        try:
+            bands = [(top, min(top + PNG_BAND_ROWS, height)) for top in range(0, height, PNG_BAND_ROWS)]
+            futures = [executor.submit(encode_png_band, slot.name, slot.shape, top, bottom, level,
+                                       bottom == height)
+                       for top, bottom in bands]
+            parts = [future.result() for future in futures]
+        finally:
+            self._release_slot(slot)
+
+        checksum = 1
+        for _, band_checksum, length in parts:
+            checksum = adler32_combine(checksum, band_checksum, length)
+        idat = b"\x78\x9c" + b"".join(data for data, _, _ in parts) + struct.pack(">I", checksum)
+        header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+        return PNG_SIGNATURE + _png_chunk(b"IHDR", header) + _png_chunk(b"IDAT", idat) + _png_chunk(b"IEND", b"")
+
+    def get_status(self):
+        return {
+            'workers': self.workers,
+            'running': self._executor is not None,
+            'tile_size': self.tile_size,
+            'shared_slots': len(self._slots),
+        }
+
+# المتغير العام - سيتم تهيئته عند الحاجة
+tile_encoder = None
+
+def get_tile_encoder():
+    """الحصول على خدمة الترميز المشتركة"""
+    global tile_encoder
+    if tile_encoder is None:
+        tile_encoder = TileEncoder()
+    return tile_encoder
@@ -0,0 +1,460 @@
+"""
+وضع البث بترميز الفيديو للمحتوى كثير الحركة
+عند تشغيل فيديو في Firefox/Chromium تصبح مربعات PNG/JPEG مكلفة؛ هنا يُرمز العرض بعملية ffmpeg محلية (x264 أو libvpx)
+تقرأ إطارات Xvfb من مرحلة الالتقاط عبر stdin وتخرج MP4 مجزأ (أو WebM) يُرسل على WebSocket كما هو إلى عنصر <video> عبر MediaSource.
+التبديل بين الفيديو والمربعات تلقائي حسب نسبة الشاشة المتغيرة ومعدل التغير، مع تخلف زمني (hysteresis) يمنع التذبذب
+
+الإعداد:
+    VNC_STREAM_MODE=auto | tiles | video
+    VNC_VIDEO_CODEC=h264 | vp8   VNC_VIDEO_FPS=25   VNC_VIDEO_BITRATE=2M
+"""
+
+import os
+import time
+import shutil
+import struct
+import threading
+import subprocess
+import logging
+from collections import deque
+
+from metrics import timed
+
+logger = logging.getLogger(__name__)
+
+STREAM_MODE = os.environ.get("VNC_STREAM_MODE", "auto")
+VIDEO_CODEC = os.environ.get("VNC_VIDEO_CODEC", "h264")
+VIDEO_FPS = int(os.environ.get("VNC_VIDEO_FPS", "25"))
+VIDEO_BITRATE = os.environ.get("VNC_VIDEO_BITRATE", "2M")
+
+# صيغة بكسلات ffmpeg لكل عمق في ملف الإطار
+FFMPEG_PIXEL_FORMATS = {32: 'bgr0', 16: 'rgb565le'}
+
+# معاملات الترميز ونوع MIME الذي يحتاجه MediaSource في المتصفح
+CODECS = {
+    'h264': {
+        'args': ['-c:v', 'libx264', '-preset', 'ultrafast', '-tune', 'zerolatency', '-pix_fmt', 'yuv420p',
+                 '-f', 'mp4', '-movflags', 'frag_keyframe+empty_moov+default_base_moof'],
+        'mime': 'video/mp4; codecs="avc1.42E01F"',
+        'container': 'mp4',
+    },
+    'vp8': {
+        'args': ['-c:v', 'libvpx', '-deadline', 'realtime', '-cpu-used', '8', '-pix_fmt', 'yuv420p', '-f', 'webm'],
+        'mime': 'video/webm; codecs="vp8"',
+        'container': 'webm',
+    },
+}
+
+# حدود التبديل: الدخول في الفيديو عند تغير جزء كبير من الشاشة بمعدل عالٍ لفترة، والخروج بحدود أدنى لفترة أطول
+SWITCH_SETTINGS = {
+    'window': 2.0,
+    'enter_fraction': 0.08,
+    'enter_rate': 12.0,
+    'enter_after': 1.5,
+    'exit_fraction': 0.05,
+    'exit_rate': 4.0,
+    'exit_after': 3.0,
+}
+
+def ffmpeg_available():
+    return shutil.which("ffmpeg") is not None
+
+def stream_room(display):
+    return f"stream:{display}"
+
+class ModeSelector:
+    """اختيار وضع البث من تاريخ التحديثات: tiles أو video"""
+
+    def __init__(self, settings=None, video_available=True):
+        self.settings = {**SWITCH_SETTINGS, **(settings or {})}
+        self.video_available = video_available
+        self.mode = 'tiles'
+        self._updates = deque()
+        self._candidate_since = None
+        self.switches = 0
+
+    def stats(self, now):
+        """نسبة المساحة المتغيرة لكل تحديث ومعدل التحديثات في النافذة الزمنية"""
+        window = self.settings['window']
+        while self._updates and self._updates[0][0] < now - window:
+            self._updates.popleft()
+        if not self._updates:
+            return 0.0, 0.0
+        fraction = sum(f for _, f in self._updates) / len(self._updates)
+        return fraction, len(self._updates) / window
+
+    def observe(self, now, changed_fraction):
+        """تسجيل تحديث؛ يعيد الوضع الجديد إن تغير وإلا None"""
+        self._updates.append((now, changed_fraction))
+        return self.evaluate(now)
+
+    def evaluate(self, now):
+        """إعادة التقييم (تُستدعى أيضاً دورياً ليخرج من الفيديو عند السكون)"""
+        fraction, rate = self.stats(now)
+        s = self.settings
+        if self.mode == 'tiles':
+            # الحركة يجب أن تكون مستمرة حتى لحظة التقييم، لا مجرد أثر متبقٍ في النافذة
+            active = bool(self._updates) and now - self._updates[-1][0] <= 2.0 / s['enter_rate']
+            wants_switch = (self.video_available and active
+                            and fraction >= s['enter_fraction'] and rate >= s['enter_rate'])
+            delay = s['enter_after']
+        else:
+            wants_switch = fraction < s['exit_fraction'] or rate < s['exit_rate']
+            delay = s['exit_after']
+
+        if not wants_switch:
+            self._candidate_since = None
+            return None
+        if self._candidate_since is None:
+            self._candidate_since = now
+        if now - self._candidate_since < delay:
+            return None
+        self.mode = 'video' if self.mode == 'tiles' else 'tiles'
+        self._candidate_since = None
+        self.switches += 1
+        return self.mode
+
+def split_boxes(buffer):
+    """فصل صناديق MP4 المكتملة من بداية المخزن: ([(النوع، البايتات)], الباقي)"""
+    boxes = []
+    offset = 0
+    while len(buffer) - offset >= 8:
+        size, kind = struct.unpack_from(">I4s", buffer, offset)
+        header = 8
+        if size == 1:
+            if len(buffer) - offset < 16:
+                break
+            size = struct.unpack_from(">Q", buffer, offset + 8)[0]
+            header = 16
+        if size < header or len(buffer) - offset < size:
+            break
+        boxes.append((kind.decode('latin-1'), bytes(buffer[offset:offset + size])))
+        offset += size
+    return boxes, buffer[offset:]
+
+# معرفات EBML التي يحتاجها تقطيع WebM: الجزء يُدخل فيه، والعناقيد هي مقاطع الوسائط
+EBML_SEGMENT = 0x18538067
+EBML_CLUSTER = 0x1F43B675
+# عناصر المستوى الأول (وترويسة EBML) التي تنهي عنقوداً مجهول الحجم
+EBML_TOP_LEVEL = {0x1A45DFA3, EBML_SEGMENT, EBML_CLUSTER, 0x114D9B74, 0x1549A966, 0x1654AE6B,
+                  0x1C53BB6B, 0x1254C367, 0x1043A770, 0x1941A469}
+
+def _ebml_vint(buffer, offset, max_length):
+    """قراءة عدد EBML متغير الطول: (القيمة بعلامتها، القيمة دونها، الطول) أو None إن لم يكتمل"""
+    if offset >= len(buffer):
+        return None
+    first = buffer[offset]
+    length = 9 - first.bit_length() if first else 0
+    if not 1 <= length <= max_length:
+        raise ValueError(f"عدد EBML غير صالح عند {offset}")
+    if offset + length > len(buffer):
+        return None
+    raw = int.from_bytes(buffer[offset:offset + length], 'big')
+    return raw, raw & ((1 << (7 * length)) - 1), length
+
+def _ebml_header(buffer, offset):
+    """ترويسة عنصر: (المعرف، الحجم أو None إن كان مجهولاً، طول الترويسة) أو None إن لم تكتمل"""
+    element_id = _ebml_vint(buffer, offset, 4)
+    if element_id is None:
+        return None
+    size = _ebml_vint(buffer, offset + element_id[2], 8)
+    if size is None:
+        return None
+    unknown = size[1] == (1 << (7 * size[2])) - 1
+    return element_id[0], None if unknown else size[1], element_id[2] + size[2]
+
+def _unknown_size_end(buffer, offset):
+    """نهاية عنصر مجهول الحجم: أول عنصر من المستوى الأول بعد أبنائه المكتملة (None إن لم يصل بعد)"""
+    while True:
+        header = _ebml_header(buffer, offset)
+        if header is None:
+            return None
+        element_id, size, length = header
+        if element_id in EBML_TOP_LEVEL:
+            return offset
+        if size is None or offset + length + size > len(buffer):
+            return None
+        offset += length + size
+
+def split_webm(buffer):
+    """فصل عناصر WebM المكتملة من بداية المخزن: ([(النوع، البايتات)], الباقي)
+    ترويسة الجزء تُفصل وحدها ويُدخل فيه؛ النوع 'cluster' للعناقيد و'header' لما عداها"""
+    elements = []
+    offset = 0
+    while True:
+        header = _ebml_header(buffer, offset)
+        if header is None:
+            break
+        element_id, size, length = header
+        if element_id == EBML_SEGMENT:
+            elements.append(('header', bytes(buffer[offset:offset + length])))
+            offset += length
+            continue
+        if size is None:
+            end = _unknown_size_end(buffer, offset + length)
+            if end is None:
+                break
+        else:
+            end = offset + length + size
+            if end > len(buffer):
+                break
+        elements.append(('cluster' if element_id == EBML_CLUSTER else 'header', bytes(buffer[offset:end])))
+        offset = end
+    return elements, buffer[offset:]
+
+class VideoEncoder:
+    """عملية ffmpeg واحدة لعرض: إطارات خام بمعدل ثابت إلى الداخل، ومقاطع فيديو إلى الخارج"""
+
+    def __init__(self, stage, codec=VIDEO_CODEC, fps=VIDEO_FPS, bitrate=VIDEO_BITRATE, on_segment=None):
+        self.stage = stage
+        self.codec = codec if codec in CODECS else 'h264'
+        self.fps = fps
+        self.bitrate = bitrate
+        self.on_segment = on_segment
+        self.init_segment = None
+        self.process = None
+        self.frames_written = 0
+        self.bytes_out = 0
+        self._running = False
+
+    @property
+    def mime(self):
+        return CODECS[self.codec]['mime']
+
+    def command(self):
+        framebuffer = self.stage.framebuffer
+        pixel_format = FFMPEG_PIXEL_FORMATS.get(framebuffer.bits_per_pixel)
+        if pixel_format is None:
+            raise ValueError(f"عمق بكسل غير مدعوم للفيديو: {framebuffer.bits_per_pixel}")
+        width = framebuffer.stride // framebuffer.bytes_per_pixel
+        return [
+            'ffmpeg', '-hide_banner', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', pixel_format, '-s', f"{width}x{framebuffer.height}",
+            '-r', str(self.fps), '-i', 'pipe:0',
+            # قص حشو الصفوف وضمان أبعاد زوجية لـ yuv420p
+            '-vf', f"crop={framebuffer.width - framebuffer.width % 2}:{framebuffer.height - framebuffer.height % 2}:0:0",
+            '-b:v', self.bitrate, '-g', str(self.fps * 2),
+            *CODECS[self.codec]['args'], 'pipe:1'
+        ]
+
+    def start(self):
+        """تشغيل ffmpeg وخيوط الكتابة والقراءة"""
+        from process_groups import get_process_group
+        group = get_process_group(f"video:{self.stage.display}")
+        self.process = group.spawn(self.command(), stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self._running = True
+        threading.Thread(target=self._write_frames, daemon=True, name=f"video-in{self.stage.display}").start()
+        threading.Thread(target=self._read_segments, daemon=True, name=f"video-out{self.stage.display}").start()
+        logger.info(f"🎬 بث فيديو {self.codec} للعرض {self.stage.display} بمعدل {self.fps} إطار/ث")
+
+    def stop(self):
+        self._running = False
+        if self.process and self.process.poll() is None:
+            try:
+                self.process.stdin.close()
+            except OSError:
+                pass
+            from process_groups import get_process_group
+            get_process_group(f"video:{self.stage.display}").stop(grace_period=1)
+
+    def _write_frames(self):
+        """إطار كل 1/fps (يُكرر الأخير إن لم يتغير شيء؛ x264 يرمزه بتكلفة شبه معدومة)"""
+        interval = 1.0 / self.fps
+        next_frame = time.monotonic()
+        while self._running:
+            frame = self.stage.raw_frame()
+            try:
+                with timed('video_feed'):
+                    self.process.stdin.write(frame)
+                self.frames_written += 1
+            except (BrokenPipeError, OSError, ValueError):
+                break
+            next_frame += interval
+            time.sleep(max(0.0, next_frame - time.monotonic()))
+
+    def _read_segments(self):
+        """قراءة خرج ffmpeg: صندوقا ftyp+moov مقطع التهيئة، وكل moof+mdat مقطع وسائط مستقل
+        (في WebM: ما قبل أول عنقود مقطع التهيئة، وكل عنقود مقطع وسائط)"""
+        container = CODECS[self.codec]['container']
+        buffer = b""
+        pending = []
+        while self._running:
+            chunk = self.process.stdout.read1(65536)
+            if not chunk:
+                break
+            self.bytes_out += len(chunk)
+            if container != 'mp4':
+                elements, buffer = split_webm(buffer + chunk)
+                for kind, data in elements:
+                    if kind != 'cluster':
+                        # عناصر بعد العناقيد (مثل Cues عند الإنهاء) لا تلزم البث الحي
+                        if self.init_segment is None:
+                            pending.append(data)
+                        continue
+                    if self.init_segment is None:
+                        self.init_segment = b"".join(pending)
+                        pending = []
+                        if self.on_segment:
+                            self.on_segment(self.init_segment, init=True)
+                    if self.on_segment:
+                        self.on_segment(data)
+                continue
+            boxes, buffer = split_boxes(buffer + chunk)
+            for kind, data in boxes:
+                pending.append(data)
+                if kind == 'moov':
+                    self.init_segment = b"".join(pending)
+                    pending = []
+                    if self.on_segment:
+                        self.on_segment(self.init_segment, init=True)
+                elif kind == 'mdat':
+                    if self.on_segment:
+                        self.on_segment(b"".join(pending))
+                    pending = []
+        if self._running:
+            logger.warning(f"⚠️ توقف ffmpeg للعرض {self.stage.display}")
+
+class StreamController:
+    """إدارة وضع البث لعرض واحد: يراقب تحديثات الالتقاط ويبدل بين المربعات والفيديو"""
+
+    def __init__(self, stage, socketio=None, mode=STREAM_MODE):
+        self.stage = stage
+        self.socketio = socketio
+        self.forced = mode if mode in ('tiles', 'video') else None
+        self.selector = ModeSelector(video_available=ffmpeg_available())
+        self.encoder = None
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        if self.forced:
+            self.selector.mode = self.forced
+        stage.subscribe(self._on_update)
+        threading.Thread(target=self._idle_check, daemon=True, name=f"stream-mode{stage.display}").start()
+        if self.mode == 'video':
+            self._start_video()
+
+    @property
+    def mode(self):
+        return self.selector.mode
+
+    def _on_update(self, stage, version, update):
+        if self.forced:
+            return
+        area = stage.width * stage.height
+        changed = sum(w * h for _, _, w, h in update['rects']) / area if area else 0.0
+        with self._lock:
+            switched = self.selector.observe(time.monotonic(), changed)
+        if switched:
+            self._switch(switched)
+
+    def _idle_check(self):
+        """الخروج من الفيديو عند توقف التحديثات تماماً (لا تصل استدعاءات عند السكون)"""
+        while not self._closed.wait(1):
+            if self.forced or self.mode != 'video':
+                continue
+            with self._lock:
+                switched = self.selector.evaluate(time.monotonic())
+            if switched:
+                self._switch(switched)
+
+    def _on_retire(self, stage):
+        """انتهى العرض: إيقاف الترميز وخيط الفحص وإخراج المتحكم من السجل (يُبنى غيره مع المرحلة الجديدة)"""
+        self._closed.set()
+        stage.unsubscribe(self._on_update)
+        if self.encoder:
+            self.encoder.stop()
+            self.encoder = None
+        with _controllers_lock:
+            if _controllers.get(stage.display) is self:
+                del _controllers[stage.display]
+
+    def _switch(self, mode):
+        logger.info(f"🔀 وضع البث للعرض {self.stage.display}: {mode}")
+        if mode == 'video':
+            self._start_video()
+        else:
+            if self.encoder:
+                self.encoder.stop()
+                self.encoder = None
+        self._emit('stream_mode', self.mode_message())
+
+    def _start_video(self):
+        try:
+            self.encoder = VideoEncoder(self.stage, on_segment=self._on_segment)
+            self.encoder.start()
+        except Exception as e:
+            logger.error(f"خطأ في تشغيل ترميز الفيديو: {e}")
+            self.encoder = None
+            self.selector.mode = 'tiles'
+            self.selector.video_available = False
+
+    def _on_segment(self, data, init=False):
+        self._emit('video_init' if init else 'video_segment', data)
+
+    def _emit(self, event, data, to=None):
+        if self.socketio is not None:
+            self.socketio.emit(event, data, to=to or stream_room(self.stage.display))
+
+    def mode_message(self):
+        message = {'display': self.stage.display, 'mode': self.mode, 'version': self.stage.version}
+        if self.mode == 'video' and self.encoder:
+            message['mime'] = self.encoder.mime
+        return message
+
+    def subscribe(self, sid):
+        """انضمام عارض: الوضع الحالي ومقطع التهيئة إن كان البث فيديو"""
+        from flask_socketio import join_room
+        join_room(stream_room(self.stage.display), sid=sid)
+        self._emit('stream_mode', self.mode_message(), to=sid)
+        if self.mode == 'video' and self.encoder and self.encoder.init_segment:
+            self._emit('video_init', self.encoder.init_segment, to=sid)
+
+    def get_status(self):
+        fraction, rate = self.selector.stats(time.monotonic())
+        return {
+            'display': self.stage.display,
+            'mode': self.mode,
+            'forced': self.forced,
+            'video_available': self.selector.video_available,
+            'changed_fraction': round(fraction, 3),
+            'update_rate': round(rate, 1),
+            'switches': self.selector.switches,
+            'frames_encoded': self.encoder.frames_written if self.encoder else 0,
+        }
+
+# متحكمات البث مفهرسة برقم العرض
+_controllers = {}
+_controllers_lock = threading.Lock()
+
+def get_stream_controller(display, socketio=None):
+    """الحصول على متحكم البث لعرض (None إن لم يكن العرض معروفاً أو إطاره متاحاً)"""
+    from screen_capture import get_capture_stage, is_known_display
+    if not is_known_display(display):
+        return None
+    created = None
+    with _controllers_lock:
+        controller = _controllers.get(display)
+        if controller is None or controller.stage.retired:
+            stage = get_capture_stage(display)
+            if not stage.start():
+                return None
+            controller = created = _controllers[display] = StreamController(stage, socketio)
+    if created is not None:
+        # خارج قفل المتحكمات: يُستدعى فوراً إن كانت المرحلة قد انتهت للتو
+        created.stage.on_retire(created._on_retire)
+    if socketio is not None and controller.socketio is None:
+        controller.socketio = socketio
+    return controller
+
+def register_stream_events(socketio):
+    """تسجيل أحداث وضع البث"""
+    from flask import request
+
+    @socketio.on('stream_subscribe')
+    def handle_stream_subscribe(data=None):
+        from cursor_channel import default_display
+        display = (data or {}).get('display') or default_display()
+        controller = get_stream_controller(display, socketio)
+        if controller is None:
+            socketio.emit('stream_mode', {'display': display, 'mode': 'unavailable'}, to=request.sid)
+            return
+        controller.subscribe(request.sid)
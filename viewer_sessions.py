@@ -0,0 +1,153 @@
+"""
+جلسات العارض القابلة للاستئناف
+لكل جلسة عارض (معرف محفوظ في sessionStorage) سجل قصير بالإصدارات التي أُرسلت وبصمات مربعاتها؛
+العميل العائد (تحديث الصفحة، انقطاع الشبكة) يرسل آخر إصدار أكده فيستلم المربعات التي تغيرت منذه فقط،
+وإعادة الاتصال السريعة دون تغيير في الشاشة تكلف رسالة فارغة تقريباً
+"""
+
+import os
+import time
+import secrets
+import threading
+import logging
+from collections import OrderedDict
+
+from import_profiler import lazy_import
+
+np = lazy_import('numpy')
+
+logger = logging.getLogger(__name__)
+
+# عدد الإصدارات المحفوظة لكل جلسة، ومدة بقاء الجلسة دون نشاط، وأقصى عدد للجلسات
+RESUME_HISTORY = int(os.environ.get("VNC_RESUME_HISTORY", "8"))
+RESUME_TTL = float(os.environ.get("VNC_RESUME_TTL", "600"))
+MAX_SESSIONS = int(os.environ.get("VNC_RESUME_MAX_SESSIONS", "256"))
+
+class ViewerSession:
+    """الإصدارات المرسلة لعارض واحد: {الإصدار: (الأبعاد، بصمات المربعات)}"""
+
+    def __init__(self, session_id, display):
+        self.id = session_id
+        self.display = display
+        self.history = OrderedDict()
+        self.last_seen = time.monotonic()
+        self.full_frames = 0
+        self.delta_frames = 0
+
+    def remember(self, version, size, hashes, acked=None):
+        """تسجيل إصدار أُرسل؛ ما قبل الإصدار المؤكد لم يعد لازماً"""
+        if acked is not None:
+            for old in [v for v in self.history if v < acked]:
+                del self.history[old]
+        self.history[version] = (size, hashes)
+        self.history.move_to_end(version)
+        while len(self.history) > RESUME_HISTORY:
+            self.history.popitem(last=False)
+
+    def changed_tiles(self, since, size, hashes):
+        """مواقع المربعات المتغيرة منذ الإصدار المؤكد (None إن لزم إطار كامل)"""
+        known = self.history.get(since)
+        if known is None or known[0] != size:
+            return None
+        old = known[1]
+        return [position for position, digest in hashes.items() if old.get(position) != digest]
+
+class SessionStore:
+    """جلسات العارض النشطة مع بصمات آخر إطار لكل عرض (مشتركة بين الجلسات)"""
+
+    def __init__(self):
+        self.sessions = OrderedDict()
+        self._frame_hashes = {}
+        self._lock = threading.Lock()
+
+    def get(self, session_id, display):
+        """الجلسة بمعرفها، أو جلسة جديدة إن لم تكن معروفة (انتهت أو أُعيد تشغيل الخادم)"""
+        now = time.monotonic()
+        with self._lock:
+            for old_id in [sid for sid, s in self.sessions.items() if now - s.last_seen > RESUME_TTL]:
+                del self.sessions[old_id]
+            session = self.sessions.get(session_id)
+            if session is None or session.display != display:
+                session = ViewerSession(session_id or secrets.token_urlsafe(12), display)
+                self.sessions[session.id] = session
+            session.last_seen = now
+            self.sessions.move_to_end(session.id)
+            while len(self.sessions) > MAX_SESSIONS:
+                self.sessions.popitem(last=False)
+        return session
+
+    def frame_hashes(self, display, version, rgb):
+        """بصمات مربعات الإطار {(x, y): بصمة}، تُحسب مرة واحدة لكل إصدار"""
+        from pixel_formats import iter_tiles, tile_hash
+
+        cached = self._frame_hashes.get(display)
+        if version is not None and cached and cached[0] == version:
+            return cached[1]
+        height, width = rgb.shape[:2]
+        hashes = {(x, y): tile_hash(rgb[y:y + h, x:x + w]) for x, y, w, h in iter_tiles(width, height)}
+        self._frame_hashes[display] = (version, hashes)
+        return hashes
+
+    def get_status(self):
+        return {
+            'sessions': len(self.sessions),
+            'full_frames': sum(s.full_frames for s in self.sessions.values()),
+            'delta_frames': sum(s.delta_frames for s in self.sessions.values()),
+        }
+
+session_store = SessionStore()
+
+def tile_update(display, pixels, version, fmt, session_id=None, since=None):
+    """(الوصف، المربعات) لعارض: المتغيرة منذ since إن كانت في سجل جلسته، وإلا الإطار كاملاً"""
+    from pixel_formats import FORMAT_TILE, convert_frame
+
+    session = session_store.get(session_id, display)
+    height, width = pixels.shape[:2]
+    hashes = session_store.frame_hashes(display, version, pixels)
+    version = version or 0
+
+    changed = session.changed_tiles(since, (width, height), hashes) if since is not None else None
+    if changed is None:
+        tiles = convert_frame(pixels, fmt, hashes=hashes)
+        session.full_frames += 1
+    else:
+        rects = [(x, y, FORMAT_TILE, FORMAT_TILE) for x, y in changed]
+        tiles = convert_frame(pixels, fmt, rects=rects, hashes=hashes) if rects else []
+        session.delta_frames += 1
+    session.remember(version, (width, height), hashes, acked=since)
+
+    meta = {
+        'session': session.id,
+        'version': version,
+        'since': since if changed is not None else None,
+        'full': changed is None,
+        'width': width,
+        'height': height,
+        'format': fmt,
+    }
+    return meta, tiles
+
+def tiles_response():
+    """استجابة /api/vnc/tiles المشتركة بين تطبيق النظام وخادم واجهة الويب"""
+    from flask import Response, jsonify, request
+    from screen_capture import find_active_display, get_capture_stage, is_known_display
+    from pixel_formats import client_formats, negotiate_format, pack_tiles
+
+    display = request.args.get('display') or find_active_display()
+    if request.args.get('display') and not is_known_display(display):
+        return jsonify({'success': False, 'error': f'عرض غير معروف: {display}'}), 404
+    stage = get_capture_stage(display) if display else None
+    if stage and stage.start():
+        version, pixels = stage.snapshot()
+    else:
+        from web_vnc import _demo_screenshot
+        display, version, pixels = None, None, np.asarray(_demo_screenshot().convert('RGB'))
+
+    # الصيغة: من الطلب، أو ما تفاوض عليه العميل عبر set_pixel_format، مع احترام Save-Data
+    requested = request.args.get('format') or client_formats.get(request.args.get('sid'))
+    fmt = negotiate_format(requested, request.headers.get('Save-Data') == 'on')
+    meta, tiles = tile_update(display, pixels, version, fmt,
+                              session_id=request.args.get('session'),
+                              since=request.args.get('since', type=int))
+    return Response(pack_tiles(meta, tiles), mimetype='application/octet-stream',
+                    headers={'Cache-Control': 'no-store'})
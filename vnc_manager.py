@@ -6,12 +6,14 @@ import os
 import socket
 import time
 import threading
-import psutil
 import subprocess
 from pathlib import Path
 import logging
 from datetime import datetime
 from flask import current_app
+from display_pool import get_display_pool
+from metrics import timed
+from session_registry import session_registry
 
 logger = logging.getLogger(__name__)
 
@@ -27,6 +29,12 @@ class VNCManager:
         self.vnc_dir = Path.home() / ".vnc"
         self.vnc_dir.mkdir(exist_ok=True)
         
+        # sockets الخوادم المحاكية مفهرسة برقم العرض
+        self._active_sockets = {}
+        
+        # الشاشات المستعارة من المجمع مفهرسة برقم العرض
+        self._leases = {}
+        
         # تهيئة كلمة المرور (بدون قاعدة بيانات في البداية)
         self._setup_vnc_password()
     
@@ -80,12 +88,21 @@ class VNCManager:
     def start_vnc_server(self, display=None, resolution=None):
         """بدء خادم VNC المحاكي"""
         try:
+            lease = None
+            pool = get_display_pool()
+            if display is None and pool.is_available():
+                # تخصيص شاشة حقيقية مسخنة من المجمع
+                lease = pool.acquire(owner="vnc-manager")
+                display = lease.number
+                resolution = resolution or lease.resolution
             display = display or self.base_display
             resolution = resolution or self.screen_resolution
             port = self.base_port + display
             
-            # إيقاف أي خادم موجود
-            self.stop_vnc_server()
+            # إيقاف الخادم الموجود على نفس العرض فقط
+            self.stop_vnc_server(display=display)
+            if lease:
+                self._leases[display] = lease
             
             # بدء خادم VNC المحاكي
             vnc_thread = threading.Thread(
@@ -100,8 +117,13 @@ class VNCManager:
             
             # فحص الحالة
             if self._check_port_open(port):
-                # تسجيل الجلسة
-                session = self._create_session_record(display, port, resolution)
+                # تسجيل الجلسة في السجل الحي (تُكتب لقاعدة البيانات لاحقاً)
+                session = session_registry.register(display, port, resolution, self.color_depth)
+                
+                # تسجيل الجلسة على القرص إن كان مفعلاً
+                from session_recorder import RECORD_SESSIONS, start_recording
+                if RECORD_SESSIONS:
+                    start_recording(f":{display}")
                 
                 logger.info(f"✅ تم بدء خادم VNC المحاكي على المنفذ {port}")
                 self._safe_log('INFO', 'VNC', f'تم بدء خادم VNC بنجاح - المنفذ: {port}')
@@ -119,6 +141,9 @@ class VNCManager:
             else:
                 logger.error("فشل في بدء خادم VNC")
                 self._safe_log('ERROR', 'VNC', 'فشل في بدء خادم VNC')
+                if lease:
+                    self._leases.pop(display, None)
+                    lease.release()
                 return {
                     'success': False,
                     'message': 'فشل في بدء خادم VNC'
@@ -146,8 +171,7 @@ class VNCManager:
             logger.info(f"خادم VNC محاكي يعمل على المنفذ {port}")
             
             # حفظ socket للإغلاق لاحقاً
-            self._active_sockets = getattr(self, '_active_sockets', [])
-            self._active_sockets.append(server_socket)
+            self._active_sockets[display] = server_socket
             
             while True:
                 try:
@@ -168,6 +192,7 @@ class VNCManager:
                     client_socket.close()
                     
                     # تسجيل الاتصال
+                    session_registry.touch(display, port)
                     self._log_connection(addr, 'connect', True)
                     
                 except Exception as e:
@@ -200,47 +225,36 @@ class VNCManager:
         except Exception as e:
             logger.error(f"خطأ في تسجيل الاتصال: {e}")
     
-    def stop_vnc_server(self):
-        """إيقاف خادم VNC"""
+    def stop_vnc_server(self, display=None):
+        """إيقاف خادم VNC (عرض محدد أو جميع العروض)"""
         try:
             stopped_count = 0
+            if display is not None:
+                displays = [display]
+            else:
+                displays = set(self._active_sockets)
+                displays.update(session.display_number for session in session_registry.active_sessions())
             
             # إغلاق sockets النشطة
-            if hasattr(self, '_active_sockets'):
-                for sock in self._active_sockets:
+            for target in displays:
+                sock = self._active_sockets.pop(target, None)
+                if sock:
                     try:
                         sock.close()
                         stopped_count += 1
                     except:
                         pass
-                self._active_sockets = []
-            
-            # إيقاف أي عمليات Python مرتبطة بـ VNC
-            for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-                try:
-                    if (proc.info['name'] == 'python3' or proc.info['name'] == 'python') and \
-                       proc.info['cmdline'] and any('vnc' in str(cmd).lower() for cmd in proc.info['cmdline']):
-                        proc.terminate()
-                        stopped_count += 1
-                        
-                        # انتظار أو إجبار الإيقاف
-                        try:
-                            proc.wait(timeout=3)
-                        except psutil.TimeoutExpired:
-                            proc.kill()
-                            
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    continue
             
-            # تحديث حالة الجلسات
-            try:
-                if current_app:
-                    with current_app.app_context():
-                        from models import VNCSession, db
-                        VNCSession.query.update({'is_active': False})
-                        db.session.commit()
-            except:
-                pass  # في حالة عدم وجود app context
+            # تحديث حالة الجلسات في السجل الحي فقط (بدون فحص جدول العمليات)
+            from session_recorder import stop_recording
+            for target in displays:
+                session_registry.unregister(target)
+                stop_recording(f":{target}")
+                
+                # إعادة الشاشة المستعارة للمجمع
+                lease = self._leases.pop(target, None)
+                if lease:
+                    lease.release()
             
             logger.info(f"✅ تم إيقاف خادم VNC: {stopped_count} عملية")
             self._safe_log('INFO', 'VNC', f'تم إيقاف خادم VNC: {stopped_count} عملية')
@@ -259,19 +273,20 @@ class VNCManager:
                 'message': f'خطأ في إيقاف خادم VNC: {str(e)}'
             }
     
+    @timed('get_vnc_status')
     def get_vnc_status(self):
         """الحصول على حالة خادم VNC"""
         try:
             active_sessions = []
             
-            for display in range(1, 10):  # فحص المنافذ 1-10
-                port = self.base_port + display
-                if self._check_port_open(port):
+            # السجل الحي هو المصدر الموثوق للجلسات المدارة من هذه العملية
+            for session in session_registry.active_sessions():
+                if self._check_port_open(session.port):
                     session_info = {
-                        'display': display,
-                        'port': port,
+                        'display': session.display_number,
+                        'port': session.port,
                         'active': True,
-                        'connections': self._count_connections(port)
+                        'connections': self._count_connections(session.port)
                     }
                     active_sessions.append(session_info)
             
@@ -280,7 +295,8 @@ class VNCManager:
                 'active_sessions': active_sessions,
                 'total_sessions': len(active_sessions),
                 'base_port': self.base_port,
-                'password_protected': bool(self.vnc_password)
+                'password_protected': bool(self.vnc_password),
+                'display_pool': get_display_pool().get_status()
             }
             
         except Exception as e:
@@ -292,6 +308,7 @@ class VNCManager:
                 'error': str(e)
             }
     
+    @timed('check_port_open')
     def _check_port_open(self, port, host='127.0.0.1'):
         """فحص إذا كان المنفذ مفتوح"""
         try:
@@ -305,6 +322,7 @@ class VNCManager:
     def _count_connections(self, port):
         """عد الاتصالات النشطة"""
         try:
+            import psutil
             connections = psutil.net_connections()
             count = 0
             for conn in connections:
@@ -313,37 +331,6 @@ class VNCManager:
             return count
         except:
             return 0
-    
-    def _create_session_record(self, display, port, resolution):
-        """إنشاء سجل جلسة في قاعدة البيانات"""
-        try:
-            if current_app:
-                with current_app.app_context():
-                    from models import VNCSession, db
-                    session = VNCSession(
-                        session_name=f"جلسة VNC {display}",
-                        display_number=display,
-                        port=port,
-                        screen_resolution=resolution,
-                        color_depth=self.color_depth,
-                        is_active=True,
-                        desktop_environment='LXDE'
-                    )
-                    
-                    db.session.add(session)
-                    db.session.commit()
-                    
-                    return session
-            else:
-                # إنشاء كائن وهمي في حالة عدم وجود Flask context
-                class MockSession:
-                    def __init__(self):
-                        self.id = f"mock_{display}_{port}"
-                return MockSession()
-            
-        except Exception as e:
-            logger.error(f"خطأ في إنشاء سجل الجلسة: {e}")
-            return None
 
 # المتغير العام - سيتم تهيئته عند الحاجة
 vnc_manager = None
@@ -368,66 +355,34 @@ def get_vnc_status():
     """الحصول على حالة VNC"""
     return get_vnc_manager().get_vnc_status()
 
-def get_system_info():
-    """الحصول على معلومات النظام"""
-    try:
-        cpu_percent = psutil.cpu_percent(interval=1)
-        memory = psutil.virtual_memory()
-        disk = psutil.disk_usage('/')
-        
-        return {
-            'cpu_percent': cpu_percent,
-            'memory_total': memory.total,
-            'memory_used': memory.used,
-            'memory_percent': memory.percent,
-            'disk_total': disk.total,
-            'disk_used': disk.used,
-            'disk_percent': (disk.used / disk.total) * 100
-        }
-    except Exception as e:
-        logger.error(f"خطأ في الحصول على معلومات النظام: {e}")
-        return {
-            'cpu_percent': 0,
-            'memory_total': 0,
-            'memory_used': 0,
-            'memory_percent': 0,
-            'disk_total': 0,
-            'disk_used': 0,
-            'disk_percent': 0
-        }
-
-def get_detailed_status():
-    """الحصول على حالة مفصلة للنظام"""
-    return {
-        'vnc': get_vnc_status(),
-        'system': get_system_info(),
-        'timestamp': datetime.now().isoformat()
-    }
-
 def get_vnc_config():
     """الحصول على إعدادات VNC"""
     manager = get_vnc_manager()
     return {
-        'base_display': manager.base_display,
-        'base_port': manager.base_port,
-        'screen_resolution': manager.screen_resolution,
+        'password': manager.vnc_password,
+        'resolution': manager.screen_resolution,
         'color_depth': manager.color_depth,
-        'vnc_password': '***' if manager.vnc_password else None
+        'base_port': manager.base_port
     }
 
-def get_vnc_config():
-    """الحصول على إعدادات VNC"""
-    return {
-        'password': vnc_manager.vnc_password,
-        'resolution': vnc_manager.screen_resolution,
-        'color_depth': vnc_manager.color_depth,
-        'base_port': vnc_manager.base_port
-    }
+@timed('get_system_info')
+def _processor_name():
+    """اسم المعالج من /proc/cpuinfo (platform.processor يشغل uname كعملية فرعية، وهذا يفشل في خيط مجمع gevent)"""
+    import platform
+    try:
+        with open('/proc/cpuinfo') as f:
+            for line in f:
+                if line.startswith('model name'):
+                    return line.split(':', 1)[1].strip()
+    except OSError:
+        pass
+    return platform.machine()
 
 def get_system_info():
     """الحصول على معلومات النظام"""
     try:
         import platform
+        import psutil
         
         # معلومات المعالج والذاكرة
         cpu_percent = psutil.cpu_percent(interval=1)
@@ -442,7 +397,7 @@ def get_system_info():
                 'platform': platform.system(),
                 'release': platform.release(),
                 'machine': platform.machine(),
-                'processor': platform.processor()
+                'processor': _processor_name()
             },
             'performance': {
                 'cpu_percent': cpu_percent,
@@ -8,17 +8,23 @@ import os
 import sys
 import subprocess
 import time
-import signal
 import logging
 from pathlib import Path
 
+from display_pool import get_display_pool
+from performance_profiles import x11vnc_flags, xvfb_flags
+from process_groups import get_process_group, wait_for_display, wait_for_port
+from session_persistence import DesktopSession
+from shutdown_coordinator import log_shutdown_report
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class VNCManager:
-    def __init__(self):
-        self.display = ":1"
-        self.vnc_port = 5900
+    def __init__(self, display=None, vnc_port=None):
+        # بدون عرض محدد تُستعار شاشة مسخنة من المجمع
+        self.display = display
+        self.vnc_port = vnc_port
         self.vnc_password = "vnc123456"
         self.screen_resolution = "1024x768"
         self.color_depth = 24
@@ -28,6 +34,15 @@ class VNCManager:
         self.x11vnc_pid = None
         self.desktop_pid = None
         
+        # مجموعة العمليات الخاصة بهذه الحزمة
+        self.pooled = display is None
+        self.lease = None
+        self.group = None if self.pooled else get_process_group(f"vnc-native{self.display}")
+        self.x11vnc_process = None
+        
+        # ملفات التعريف والتخطيط الدائمة للجلسة (لكل عرض؛ المعار يُعرف عند الاستلام)
+        self.session = None if self.pooled else self._session_for(self.display)
+        
         # Create VNC directory
         self.vnc_dir = Path.home() / ".vnc"
         self.vnc_dir.mkdir(exist_ok=True)
@@ -46,23 +61,47 @@ class VNCManager:
             logger.error(f"❌ خطأ في إعداد كلمة مرور VNC: {e}")
             return False
     
+    def _session_for(self, display):
+        """جلسة دائمة خاصة بالعرض حتى لا تتشارك الشاشات المعارة ملف تعريف المتصفح نفسه"""
+        return DesktopSession(f"vnc-native-{display.lstrip(':')}")
+    
+    def _spawn(self, cmd, **kwargs):
+        """تشغيل عملية ضمن حزمة هذا المدير"""
+        if self.lease:
+            return self.lease.spawn(cmd, **kwargs)
+        return self.group.spawn(cmd, **kwargs)
+    
     def start_xvfb(self):
         """تشغيل الشاشة الوهمية Xvfb"""
         try:
+            if self.pooled:
+                # شاشة مسخنة من المجمع بدلاً من تشغيل بارد
+                self.lease = get_display_pool().acquire(owner="vnc-native")
+                self.display = self.lease.display
+                self.group = self.lease.group
+                self.xvfb_pid = self.lease.xvfb_pid
+                self.desktop_pid = self.lease.wm_pid
+                self.session = self._session_for(self.display)
+                os.environ["DISPLAY"] = self.display
+                logger.info(f"✅ تم استلام العرض {self.display} من مجمع الشاشات")
+                return True
+            
             cmd = [
                 "Xvfb", self.display,
                 "-screen", "0", f"{self.screen_resolution}x{self.color_depth}",
-                "-ac", "+extension", "GLX"
+                "-ac", "+extension", "GLX", *xvfb_flags(self.display)
             ]
             
-            process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            process = self._spawn(cmd)
             self.xvfb_pid = process.pid
             
             # تعيين متغير DISPLAY
             os.environ["DISPLAY"] = self.display
             
             # انتظار بدء التشغيل
-            time.sleep(2)
+            if not wait_for_display(self.display, process=process):
+                logger.error(f"❌ لم يصبح العرض {self.display} جاهزاً")
+                return False
             
             logger.info(f"✅ تم تشغيل Xvfb على العرض {self.display}")
             return True
@@ -74,9 +113,11 @@ class VNCManager:
     def start_x11vnc(self):
         """تشغيل خادم VNC"""
         try:
-            # إيقاف أي خدمة VNC موجودة على نفس المنفذ
-            subprocess.run(["pkill", "-f", "x11vnc"], capture_output=True)
-            time.sleep(1)
+            # إيقاف خادم x11vnc السابق لهذه الحزمة فقط
+            self.group.stop_process(self.x11vnc_process)
+            
+            if self.vnc_port is None:
+                self.vnc_port = 5899 + int(self.display.lstrip(':'))
             
             cmd = [
                 "x11vnc",
@@ -85,26 +126,24 @@ class VNCManager:
                 "-passwd", self.vnc_password,
                 "-forever",
                 "-shared",
-                "-noxdamage",
-                "-noxfixes", 
-                "-noscr",
+                # التقاط معتمد على XDamage حسب ملف الأداء بدلاً من استطلاع الشاشة كاملة
+                *x11vnc_flags(),
                 "-quiet",
-                "-bg"
+                # استئناف الجلسة المعلقة فور اتصال عميل
+                "-afteraccept", self.session.resume_hook()
             ]
             
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            
-            # انتظار قصير للتأكد من بدء التشغيل
-            time.sleep(2)
-            
-            # التحقق من تشغيل VNC بواسطة فحص العملية
-            check_result = subprocess.run(["pgrep", "-f", "x11vnc"], capture_output=True)
+            # بدون -bg حتى تبقى العملية داخل مجموعة الحزمة
+            process = self._spawn(cmd)
+            self.x11vnc_process = process
+            self.x11vnc_pid = process.pid
             
-            if check_result.returncode == 0:
+            # انتظار فتح المنفذ
+            if wait_for_port(self.vnc_port, process=process):
                 logger.info(f"✅ تم تشغيل x11vnc على المنفذ {self.vnc_port}")
                 return True
             else:
-                logger.error(f"❌ خطأ في تشغيل x11vnc: {result.stderr}")
+                logger.error(f"❌ خطأ في تشغيل x11vnc: رمز الخروج {process.poll()}")
                 return False
                 
         except Exception as e:
@@ -113,6 +152,9 @@ class VNCManager:
     
     def start_desktop(self):
         """تشغيل سطح المكتب (إذا كان متاحاً)"""
+        if self.lease and self.lease.wm_process:
+            # مدير النوافذ يعمل مسبقاً على الشاشة المسخنة
+            return True
         try:
             # جرب تشغيل أي بيئة سطح مكتب متاحة
             desktop_commands = [
@@ -124,10 +166,8 @@ class VNCManager:
             
             for cmd in desktop_commands:
                 try:
-                    process = subprocess.Popen(
+                    process = self._spawn(
                         cmd,
-                        stdout=subprocess.DEVNULL,
-                        stderr=subprocess.DEVNULL,
                         env=dict(os.environ, DISPLAY=self.display)
                     )
                     self.desktop_pid = process.pid
@@ -165,19 +205,8 @@ class VNCManager:
                 ["chromium-browser", "--no-sandbox", "--disable-gpu"]
             ]
             
-            for app_cmd in apps_to_try:
-                try:
-                    subprocess.Popen(
-                        app_cmd,
-                        stdout=subprocess.DEVNULL,
-                        stderr=subprocess.DEVNULL,
-                        env=dict(os.environ, DISPLAY=self.display)
-                    )
-                    logger.info(f"✅ تم تشغيل {app_cmd[0]}")
-                except FileNotFoundError:
-                    continue
-                except Exception:
-                    continue
+            # التخطيط المحفوظ يحل محل القائمة ويعيد فتح نفس التطبيقات فقط
+            self.session.launch(apps_to_try, self._spawn, self.display)
             
             return True
             
@@ -266,21 +295,32 @@ class VNCManager:
         logger.info("✅ تم تشغيل نظام VNC بنجاح!")
         return True
     
-    def stop_all(self):
-        """إيقاف جميع الخدمات"""
+    def stop_all(self, grace_period=None):
+        """إيقاف جميع الخدمات بالتوازي"""
         logger.info("🛑 إيقاف خدمات VNC...")
         
-        # إيقاف العمليات
-        for pid in [self.desktop_pid, self.x11vnc_pid, self.xvfb_pid]:
-            if pid:
-                try:
-                    os.kill(pid, signal.SIGTERM)
-                    time.sleep(1)
-                    os.kill(pid, signal.SIGKILL)
-                except OSError:
-                    pass
+        # حفظ التخطيط ومواقع النوافذ لاستعادتها عند التشغيل التالي
+        if self.display and self.session and self.session.apps:
+            self.session.resume()
+            self.session.snapshot(self.display)
+        
+        if self.lease:
+            # إعادة الشاشة للمجمع بعد إيقاف عمليات الجلسة
+            report = self.lease.release()
+            self.lease = None
+            self.display = None
+            self.vnc_port = None
+        elif self.group:
+            # إيقاف مجموعة العمليات الخاصة بهذه الحزمة فقط (SIGKILL للمتأخرين بعد المهلة)
+            report = self.group.stop(grace_period)
+        else:
+            return None
+        log_shutdown_report(report)
+        if self.session:
+            self.session.forget_processes()
         
         logger.info("✅ تم إيقاف خدمات VNC")
+        return report
 
 def main():
     """البرنامج الرئيسي"""
@@ -288,8 +328,8 @@ def main():
     
     try:
         if vnc.start_all():
-            logger.info("VNC Server يعمل على المنفذ 5900")
-            logger.info("يمكنك الاتصال باستخدام VNC viewer على localhost:5900")
+            logger.info(f"VNC Server يعمل على المنفذ {vnc.vnc_port} (العرض {vnc.display})")
+            logger.info(f"يمكنك الاتصال باستخدام VNC viewer على localhost:{vnc.vnc_port}")
             
             # إبقاء البرنامج يعمل
             while True:
@@ -10,7 +10,10 @@ import logging
 import subprocess
 import time
 from pathlib import Path
-from flask import Flask, render_template_string
+from flask import Flask
+
+from async_runtime import serve_app
+from static_assets import register_static_assets
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -99,6 +102,10 @@ class NoVNCServer:
         self.novnc_path = Path("/tmp/noVNC")
         self.websockify_pid = None
         
+        # ترجمة القالب مرة واحدة بدلاً من render_template_string في كل طلب
+        self.template = self.app.jinja_env.from_string(NOVNC_TEMPLATE)
+        register_static_assets(self.app)
+        
         self.setup_routes()
     
     def setup_routes(self):
@@ -110,8 +117,7 @@ class NoVNCServer:
             vnc_ready = self.is_vnc_ready()
             status = "متصل ✅" if vnc_ready else "غير متصل ❌"
             
-            return render_template_string(
-                NOVNC_TEMPLATE,
+            return self.template.render(
                 vnc_ready=vnc_ready,
                 status=status
             )
@@ -230,11 +236,7 @@ class NoVNCServer:
         """تشغيل الخادم"""
         if self.start_services():
             logger.info(f"🌐 تشغيل خادم الويب على المنفذ {self.http_port}")
-            self.app.run(
-                host="0.0.0.0",
-                port=self.http_port,
-                debug=False
-            )
+            serve_app(self.app, "0.0.0.0", self.http_port)
         else:
             logger.error("❌ فشل في تشغيل الخدمات")
             sys.exit(1)
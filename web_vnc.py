@@ -7,14 +7,20 @@ import time
 import subprocess
 from flask import Blueprint, render_template, jsonify, request
 
+from import_profiler import lazy_import
+
+# Pillow يُحمل عند أول لقطة شاشة فقط
+Image = lazy_import('PIL.Image')
+ImageDraw = lazy_import('PIL.ImageDraw')
+
 logger = logging.getLogger(__name__)
 
 vnc_web = Blueprint('vnc_web', __name__)
 
 @vnc_web.route('/vnc')
 def vnc_viewer():
-    """واجهة عارض VNC عبر الويب"""
-    return render_template('vnc_viewer.html')
+    """واجهة عارض VNC عبر الويب (display اختياري لعرض محدد من لوحة التحكم)"""
+    return render_template('vnc_viewer.html', display=request.args.get('display'))
 
 @vnc_web.route('/vnc/status')
 def vnc_status():
@@ -40,52 +46,76 @@ def vnc_status():
         logger.error(f"خطأ في فحص حالة VNC: {e}")
         return jsonify({'error': str(e)}), 500
 
+def _demo_screenshot():
+    """صورة تجريبية عند عدم وجود إطار Xvfb قابل للقراءة"""
+    img = Image.new('RGB', (1024, 768), color='lightblue')
+    draw = ImageDraw.Draw(img)
+    
+    # رسم سطح مكتب بسيط
+    draw.rectangle((10, 10, 1014, 50), fill='darkblue')
+    draw.text((20, 25), "VNC Desktop - نظام سطح المكتب الافتراضي", fill='white')
+    
+    # رسم نافذة
+    draw.rectangle((100, 100, 600, 400), outline='gray', width=2)
+    draw.rectangle((100, 100, 600, 130), fill='lightgray')
+    draw.text((110, 110), "Terminal - المحطة الطرفية", fill='black')
+    
+    # رسم محتوى النافذة
+    draw.rectangle((110, 140, 590, 390), fill='black')
+    terminal_text = [
+        "user@vnc-desktop:~$ ls -la",
+        "total 12",
+        "drwxr-xr-x 1 user user  4096 Jan 1 12:00 .",
+        "drwxr-xr-x 1 root root  4096 Jan 1 12:00 ..",
+        "-rw-r--r-- 1 user user   220 Jan 1 12:00 .bash_logout",
+        "-rw-r--r-- 1 user user  3771 Jan 1 12:00 .bashrc",
+        "-rw-r--r-- 1 user user   807 Jan 1 12:00 .profile",
+        "user@vnc-desktop:~$ _"
+    ]
+    
+    for i, line in enumerate(terminal_text):
+        draw.text((120, 150 + i * 15), line, fill='lime')
+    return img
+
+# آخر لقطة مرمزة لكل عرض: (إصدار الإطار، نص base64) - لا يعاد الترميز ما لم يتغير شيء
+_encoded_frames = {}
+
 @vnc_web.route('/api/vnc/screenshot')
 def vnc_screenshot():
     """لقطة شاشة من VNC"""
     try:
-        # محاكاة لقطة شاشة
         import base64
         from io import BytesIO
-        from PIL import Image, ImageDraw
-        
-        # إنشاء صورة تجريبية
-        img = Image.new('RGB', (1024, 768), color='lightblue')
-        draw = ImageDraw.Draw(img)
-        
-        # رسم سطح مكتب بسيط
-        draw.rectangle((10, 10, 1014, 50), fill='darkblue')
-        draw.text((20, 25), "VNC Desktop - نظام سطح المكتب الافتراضي", fill='white')
-        
-        # رسم نافذة
-        draw.rectangle((100, 100, 600, 400), outline='gray', width=2)
-        draw.rectangle((100, 100, 600, 130), fill='lightgray')
-        draw.text((110, 110), "Terminal - المحطة الطرفية", fill='black')
-        
-        # رسم محتوى النافذة
-        draw.rectangle((110, 140, 590, 390), fill='black')
-        terminal_text = [
-            "user@vnc-desktop:~$ ls -la",
-            "total 12",
-            "drwxr-xr-x 1 user user  4096 Jan 1 12:00 .",
-            "drwxr-xr-x 1 root root  4096 Jan 1 12:00 ..",
-            "-rw-r--r-- 1 user user   220 Jan 1 12:00 .bash_logout",
-            "-rw-r--r-- 1 user user  3771 Jan 1 12:00 .bashrc",
-            "-rw-r--r-- 1 user user   807 Jan 1 12:00 .profile",
-            "user@vnc-desktop:~$ _"
-        ]
-        
-        for i, line in enumerate(terminal_text):
-            draw.text((120, 150 + i * 15), line, fill='lime')
-        
-        # تحويل إلى base64
-        buffer = BytesIO()
-        img.save(buffer, format='PNG')
-        img_str = base64.b64encode(buffer.getvalue()).decode()
-        
+        from screen_capture import find_active_display, get_capture_stage, is_known_display
+
+        display = request.args.get('display') or find_active_display()
+        # لا تُنشأ مراحل التقاط إلا لعروض يكتب Xvfb إطارها فعلاً
+        if request.args.get('display') and not is_known_display(display):
+            return jsonify({'success': False, 'error': f'عرض غير معروف: {display}'}), 404
+        stage = get_capture_stage(display) if display else None
+        version = None
+        if stage and stage.start():
+            version = stage.version
+            cached = _encoded_frames.get(display)
+            if cached and cached[0] == version:
+                img_str = cached[1]
+            else:
+                # الإطار الحقيقي يُرمز على كل الأنوية عبر خدمة الترميز
+                from tile_encoder import get_tile_encoder
+                version, pixels = stage.snapshot()
+                img_str = base64.b64encode(get_tile_encoder().encode_png(pixels)).decode()
+                _encoded_frames[display] = (version, img_str)
+        else:
+            # تحويل الصورة التجريبية إلى base64
+            buffer = BytesIO()
+            _demo_screenshot().save(buffer, format='PNG')
+            img_str = base64.b64encode(buffer.getvalue()).decode()
+
         return jsonify({
             'success': True,
             'screenshot': f'data:image/png;base64,{img_str}',
+            'display': display if version is not None else None,
+            'version': version,
             'timestamp': int(time.time())
         })
         
@@ -96,6 +126,19 @@ def vnc_screenshot():
             'error': str(e)
         }), 500
 
+@vnc_web.route('/api/vnc/tiles')
+def vnc_tiles():
+    """مربعات الإطار بصيغة البكسل المتفق عليها (رسالة ثنائية VT01)؛ session وsince لاستئناف جلسة العارض"""
+    try:
+        from viewer_sessions import tiles_response
+        return tiles_response()
+    except Exception as e:
+        logger.error(f"خطأ في مربعات الإطار: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @vnc_web.route('/api/vnc/input', methods=['POST'])
 def vnc_input():
     """إدخال لوحة المفاتيح والماوس"""
@@ -112,7 +155,17 @@ def vnc_input():
             y = data.get('y', 0)
             button = data.get('button', 'left')
             action = data.get('action', 'click')  # click, move, drag
-            logger.info(f"إدخال ماوس: {action} في ({x}, {y}) بالزر {button}")
+            # الموقع يذهب إلى قناة المؤشر ولا يمس الإطار
+            from cursor_channel import default_display, get_cursor_tracker
+            from flask_app import socketio
+            display = data.get('display') or default_display()
+            tracker = get_cursor_tracker(display, socketio)
+            if tracker is None and data.get('display'):
+                return jsonify({'success': False, 'error': f'عرض غير معروف: {display}'}), 404
+            if tracker is not None:
+                tracker.update_position(x, y)
+            if action != 'move':
+                logger.info(f"إدخال ماوس: {action} في ({x}, {y}) بالزر {button}")
         
         return jsonify({
             'success': True,
@@ -126,6 +179,25 @@ def vnc_input():
             'error': str(e)
         }), 500
 
+@vnc_web.route('/api/vnc/stream')
+def vnc_stream_status():
+    """وضع البث الحالي (مربعات أو فيديو) وإحصاءات التبديل"""
+    try:
+        from cursor_channel import default_display
+        from screen_capture import is_known_display
+        from video_stream import get_stream_controller
+
+        display = request.args.get('display') or default_display()
+        if request.args.get('display') and not is_known_display(display):
+            return jsonify({'success': False, 'error': f'عرض غير معروف: {display}'}), 404
+        controller = get_stream_controller(display)
+        if controller is None:
+            return jsonify({'success': False, 'display': display, 'mode': 'unavailable'})
+        return jsonify({'success': True, **controller.get_status()})
+    except Exception as e:
+        logger.error(f"خطأ في حالة البث: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 # تسجيل Blueprint
 def register_vnc_web(app):
     """تسجيل blueprint VNC Web"""